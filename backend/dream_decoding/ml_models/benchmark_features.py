@@ -0,0 +1,82 @@
+import time
+import argparse
+import tracemalloc
+import h5py
+import numpy as np
+
+from eeg_features import SpectralFeatureEngine, StatisticalFeatureEngine, legacy_band_powers, legacy_statistics
+
+def load_epochs(features_file=None, n_epochs=200, n_channels=19, n_times=3000, seed=0):
+    """Epochs from a *_features.h5 file (tiled up to n_epochs), or synthetic noise + band oscillations"""
+    if features_file:
+        with h5py.File(features_file, 'r') as f:
+            data = f['raw_signals'][:].astype(np.float64)
+        return np.resize(data, (max(n_epochs, len(data)),) + data.shape[1:])
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_times) / 100.0
+    data = rng.standard_normal((n_epochs, n_channels, n_times))
+    for freq in (2, 6, 10, 20, 35):
+        amplitude = rng.uniform(0.5, 3.0, (n_epochs, n_channels, 1))
+        phase = rng.uniform(0, 2 * np.pi, (n_epochs, n_channels, 1))
+        data += amplitude * np.sin(2 * np.pi * freq * t + phase)
+    return data * 1e-5
+
+def _timed(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def compare_spectral(data, fs=100):
+    """Spectral engine variants vs the legacy per-band Butterworth passes: agreement, time, peak memory"""
+    legacy, legacy_time, legacy_peak = _timed(lambda: legacy_band_powers(data, fs))
+    print(f"🌊 Band powers on {data.shape} @ {fs} Hz")
+    print(f"   legacy sosfilt x{len(legacy)}: {legacy_time * 1000:7.0f} ms | peak {legacy_peak / 1e6:6.1f} MB")
+
+    results = {}
+    for method in ('periodogram', 'welch'):
+        for weighting in ('butter', 'rect'):
+            engine = SpectralFeatureEngine(fs, method=method, weighting=weighting)
+            ours, elapsed, peak = _timed(lambda: engine.compute(data))
+            errors = [np.median(np.abs(ours[name] / legacy[name] - 1)) for name in legacy]
+            results[(method, weighting)] = max(errors)
+            print(f"   {method:>11}/{weighting:<6}: {elapsed * 1000:7.0f} ms | peak {peak / 1e6:6.1f} MB | "
+                  f"{legacy_time / elapsed:4.1f}x faster | worst median relative error {max(errors):.3f}")
+    return results
+
+def compare_statistical(data):
+    """Single-pass statistical kernel vs the legacy separate reductions"""
+    legacy, legacy_time, legacy_peak = _timed(lambda: legacy_statistics(data))
+    print(f"📈 Statistical features on {data.shape}")
+    print(f"   legacy 5 passes: {legacy_time * 1000:7.0f} ms | peak {legacy_peak / 1e6:6.1f} MB")
+
+    worst = 0.0
+    for extras in (False, True):
+        engine = StatisticalFeatureEngine(extras=extras)
+        ours, elapsed, peak = _timed(lambda: engine.compute(data))
+        error = max(np.abs(ours[name] - legacy[name]).max() / (np.abs(legacy[name]).max() or 1.0)
+                    for name in legacy)
+        worst = max(worst, error)
+        print(f"   kernel ({len(ours):>2} features): {elapsed * 1000:7.0f} ms | peak {peak / 1e6:6.1f} MB | "
+              f"{legacy_time / elapsed:4.1f}x faster | max relative error {error:.1e}")
+    return worst
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Spectral / statistical feature engines vs the legacy feature code")
+    parser.add_argument('features_file', nargs='?', default=None,
+                        help="A *_features.h5 file to take raw_signals from (default: synthetic)")
+    parser.add_argument('--epochs', type=int, default=200)
+    parser.add_argument('--tolerance', type=float, default=0.02,
+                        help="Max median relative error of the default engine vs legacy")
+    args = parser.parse_args()
+
+    data = load_epochs(args.features_file, args.epochs)
+    results = compare_spectral(data)
+    statistical_error = compare_statistical(data)
+    if results[('periodogram', 'butter')] > args.tolerance or statistical_error > 1e-5:
+        print(f"❌ Feature engines differ from the legacy computation")
+        raise SystemExit(1)
+    print("✅ Feature engines match the legacy features")
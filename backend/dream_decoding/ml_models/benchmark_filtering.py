@@ -0,0 +1,178 @@
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import mne
+
+from eeg_filters import BlockPreprocessingEngine, iter_raw_blocks
+from edf_reader import EDFBlockReader
+from flexible_eeg_preprocessing import FlexibleEEGPreprocessor
+from streaming_inference import StreamingDreamDecoder
+
+def _engine_output(engine, blocks):
+    return np.concatenate(list(engine.run(blocks)), axis=1)
+
+def compare_with_mne(edf_path, block_seconds=10, target_fs=100, n_channels=19):
+    """
+    IIR block engine vs MNE on one EDF recording. The reference is MNE applying the same SOS
+    cascade with method='iir', phase='zero' and resample(method='polyphase'); the legacy
+    FIR + FFT-resample pipeline is reported for information (different filter design).
+    Edges (one lookahead + 1 s) are excluded from the interior error: MNE reflect-pads there.
+    """
+    lazy = mne.io.read_raw_edf(edf_path, preload=False, verbose=False)
+    lazy.pick(lazy.ch_names[:n_channels])
+    sfreq = lazy.info['sfreq']
+    engine = BlockPreprocessingEngine(sfreq, len(lazy.ch_names), target_fs, design='iir')
+
+    start = time.perf_counter()
+    ours = _engine_output(engine, iter_raw_blocks(lazy, int(block_seconds * sfreq)))
+    engine_time = time.perf_counter() - start
+
+    raw = mne.io.read_raw_edf(edf_path, preload=True, verbose=False)
+    raw.pick(raw.ch_names[:n_channels])
+    start = time.perf_counter()
+    reference = raw.copy().filter(0.5, 40, method='iir', iir_params={'sos': engine.sos},
+                                  phase='zero', verbose=False)
+    reference.resample(target_fs, method='polyphase', verbose=False)
+    reference_time = time.perf_counter() - start
+    reference = reference.get_data()
+
+    start = time.perf_counter()
+    legacy = raw.copy().filter(0.5, 40, verbose=False).notch_filter(50, verbose=False)
+    legacy.resample(target_fs, verbose=False)
+    legacy_time = time.perf_counter() - start
+    legacy = legacy.get_data()
+
+    edge = int((engine.filter.lookahead / sfreq + 1) * target_fs)
+    scale = reference.std()
+    interior_error = np.abs(ours - reference)[:, edge:-edge].max() / scale
+    rms_error = np.sqrt(np.mean((ours - reference) ** 2)) / scale
+    legacy_corr = np.corrcoef(ours[:, edge:-edge].ravel(), legacy[:, edge:-edge].ravel())[0, 1]
+
+    print(f"🔬 {edf_path}: {len(lazy.ch_names)} ch @ {sfreq} Hz -> {target_fs} Hz, {lazy.n_times / sfreq:.0f}s")
+    print(f"   Output shape: {ours.shape} (MNE {reference.shape})")
+    print(f"   vs MNE iir/zero + polyphase: interior max error {interior_error:.2e}, "
+          f"RMS error {rms_error:.2e} (relative to signal std)")
+    print(f"   vs legacy MNE FIR + FFT resample: correlation {legacy_corr:.3f}")
+    print(f"   Time: engine {engine_time * 1000:.0f} ms (incl. lazy EDF reads) | "
+          f"MNE iir {reference_time * 1000:.0f} ms | MNE legacy {legacy_time * 1000:.0f} ms")
+    return {'interior_error': interior_error, 'rms_error': rms_error, 'legacy_corr': legacy_corr}
+
+# Block engine (default FIR design) vs the legacy MNE path, relative to the legacy signal std
+LEGACY_MIN_CORRELATION = 0.9999
+LEGACY_MAX_RMS_ERROR = 0.01
+
+def check_legacy_parity(edf_path, min_corr=LEGACY_MIN_CORRELATION, max_rms=LEGACY_MAX_RMS_ERROR):
+    """
+    raw_signals epochs from FlexibleEEGPreprocessor's 'blocks' engine vs its legacy 'mne'
+    engine (raw.filter / notch_filter / FFT resample). Passes when the correlation is at
+    least min_corr and the RMS error at most max_rms of the legacy std.
+    """
+    legacy = FlexibleEEGPreprocessor(filter_engine='mne')
+    reference = np.concatenate(list(legacy.iter_epoch_batches(edf_path)))
+    blocks = FlexibleEEGPreprocessor(filter_engine='blocks')
+    ours = np.concatenate(list(blocks.iter_epoch_batches(edf_path)))
+    return _report_parity('Legacy parity', ours, reference, min_corr, max_rms)
+
+def check_streaming_parity(edf_path, chunk_seconds=1.0, min_corr=LEGACY_MIN_CORRELATION,
+                           max_rms=LEGACY_MAX_RMS_ERROR):
+    """
+    Windows StreamingDreamDecoder would decode, replaying the recording in chunk_seconds
+    chunks, vs the epochs of offline preprocessing (iter_epoch_batches), with the
+    check_legacy_parity tolerances.
+    """
+    preprocessor = FlexibleEEGPreprocessor()
+    reference = np.concatenate(list(preprocessor.iter_epoch_batches(edf_path)))
+
+    class WindowCapture:
+        """Stands in for EEGDreamInference: keeps the windows instead of decoding them"""
+        def __init__(self):
+            self.windows = []
+
+        def predict_batch(self, windows):
+            self.windows.extend(np.array(window) for window in windows)
+            return [{} for _ in windows]
+
+    capture = WindowCapture()
+    with EDFBlockReader(edf_path) as reader:
+        decoder = StreamingDreamDecoder(capture, reader.sfreq, len(reader.ch_names), preprocessor.epoch_length,
+                                        preprocessor.overlap, preprocessor.fs, max_pending=8)
+        for block in reader.blocks(chunk_seconds):
+            decoder.push(block)
+    decoder.flush()
+    if decoder.windows_skipped:
+        print(f"❌ Streaming parity: {decoder.windows_skipped} windows skipped")
+        return False
+    ours = np.stack(capture.windows) if capture.windows else np.zeros((0,) + reference.shape[1:])
+    return _report_parity(f'Streaming parity ({chunk_seconds}s chunks)', ours, reference, min_corr, max_rms)
+
+def _report_parity(label, ours, reference, min_corr, max_rms):
+    """Correlation / RMS error (relative to the reference std) gate between two epoch arrays"""
+    if ours.shape != reference.shape:
+        print(f"❌ {label}: epoch shapes differ, {ours.shape} vs reference {reference.shape}")
+        return False
+
+    scale = reference.std()
+    corr = np.corrcoef(ours.ravel(), reference.ravel())[0, 1]
+    rms_error = np.sqrt(np.mean((ours - reference) ** 2)) / scale
+    max_error = np.abs(ours - reference).max() / scale
+    ok = corr >= min_corr and rms_error <= max_rms
+    print(f"{'✅' if ok else '❌'} {label} on {ours.shape} epochs: correlation {corr:.7f} "
+          f"(min {min_corr}), RMS error {rms_error:.2e} (max {max_rms:.0e}), max error {max_error:.2e}")
+    return ok
+
+def _synthetic_blocks(n_channels, n_samples, block_samples, seed=0):
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_samples, block_samples):
+        yield rng.standard_normal((n_channels, min(block_samples, n_samples - start))) * 1e-5
+
+def _peak_memory(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed
+
+def benchmark_memory(durations_min=(10, 60), sfreq=160, n_channels=19, target_fs=100, block_seconds=10):
+    """Peak traced memory of the block engine (outputs consumed, not kept) vs whole-array MNE filtering"""
+    block_samples = int(block_seconds * sfreq)
+    print(f"\n🧮 Peak memory ({n_channels} ch @ {sfreq} Hz, {block_seconds}s blocks):")
+    for minutes in durations_min:
+        n_samples = int(minutes * 60 * sfreq)
+
+        def run_engine():
+            engine = BlockPreprocessingEngine(sfreq, n_channels, target_fs)
+            for _ in engine.run(_synthetic_blocks(n_channels, n_samples, block_samples)):
+                pass
+
+        def run_mne():
+            data = np.concatenate(list(_synthetic_blocks(n_channels, n_samples, block_samples)), axis=1)
+            data = mne.filter.filter_data(data, sfreq, 0.5, 40, verbose=False)
+            data = mne.filter.notch_filter(data, sfreq, 50, verbose=False)
+            mne.filter.resample(data, up=target_fs / sfreq, verbose=False)
+
+        engine_peak, engine_time = _peak_memory(run_engine)
+        mne_peak, mne_time = _peak_memory(run_mne)
+        print(f"   {minutes:>4} min: engine {engine_peak / 1e6:7.1f} MB ({engine_time:.2f}s) | "
+              f"MNE whole recording {mne_peak / 1e6:7.1f} MB ({mne_time:.2f}s)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Block filter engine vs MNE and the legacy path: accuracy, speed and memory")
+    parser.add_argument('edf', nargs='?', default=None, help="EDF recording for the accuracy comparison")
+    parser.add_argument('--block-seconds', type=float, default=10)
+    parser.add_argument('--chunk-seconds', type=float, default=1.0,
+                        help="Chunk size of the streaming replay in the parity check")
+    parser.add_argument('--durations', type=float, nargs='+', default=[10, 60],
+                        help="Synthetic recording lengths (minutes) for the memory benchmark")
+    args = parser.parse_args()
+
+    parity_ok = True
+    if args.edf:
+        compare_with_mne(args.edf, args.block_seconds)
+        parity_ok = check_legacy_parity(args.edf)
+        parity_ok = check_streaming_parity(args.edf, args.chunk_seconds) and parity_ok
+    benchmark_memory(args.durations, block_seconds=args.block_seconds)
+    if not parity_ok:
+        raise SystemExit(1)
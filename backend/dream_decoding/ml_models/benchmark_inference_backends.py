@@ -0,0 +1,139 @@
+import os
+import time
+import argparse
+import numpy as np
+import torch
+
+from eeg_normalization import normalize_epochs
+from eeg_to_text_model import END_TOKEN
+from inference_eeg_text import EEGDreamInference
+from inference_backends import ort
+from model_export import export_torchscript, export_onnx
+
+def synthetic_epochs(n_epochs, channels=19, timepoints=3000, seed=0):
+    """Raw-scale random EEG epochs; EEGDreamInference normalizes them like real data"""
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal((n_epochs, channels, timepoints)) * 1e-5).astype(np.float32)
+
+def export_artifacts(checkpoint_path, export_dir):
+    """Write every artifact the backends need next to each other; returns {name: (backend, path)}"""
+    os.makedirs(export_dir, exist_ok=True)
+    artifacts = {'eager': ('eager', checkpoint_path)}
+
+    fp32_path = os.path.join(export_dir, 'eeg_text_fp32.pt')
+    int8_path = os.path.join(export_dir, 'eeg_text_int8.pt')
+    export_torchscript(checkpoint_path, fp32_path, quantize=False)
+    export_torchscript(checkpoint_path, int8_path, quantize=True)
+    artifacts['torchscript'] = ('torchscript', fp32_path)
+    artifacts['torchscript-int8'] = ('torchscript', int8_path)
+
+    if ort is not None:
+        onnx_dir = os.path.join(export_dir, 'onnx')
+        export_onnx(checkpoint_path, onnx_dir)
+        artifacts['onnx'] = ('onnx', onnx_dir)
+    else:
+        print("⚠️ onnxruntime not installed, skipping the onnx backend")
+    return artifacts
+
+def load_engines(artifacts, num_threads=None):
+    return {
+        name: EEGDreamInference(path, device=torch.device('cpu'), backend=backend, num_threads=num_threads)
+        for name, (backend, path) in artifacts.items()
+    }
+
+def check_backend_parity(engines, epochs, atol=1e-3, top_k=2, min_topk_agreement=0.99):
+    """
+    Compare every backend against eager on the same epochs.
+    fp32 backends must match the encoder state and teacher-forced logits within atol and
+    reproduce the greedy tokens exactly. Quantized ones are scored per token with teacher
+    forcing, so one near-tie flipping early cannot derail the rest of the sequence (free-running
+    greedy agreement fell to 0.89 on a trained checkpoint): eager's token must be within their
+    top_k logits at min_topk_agreement of the steps up to END.
+    """
+    reference = engines['eager']
+    eeg = torch.from_numpy(normalize_epochs(epochs))
+
+    with torch.inference_mode():
+        ref_hidden = reference.model.encode(eeg)
+        ref_tokens, _ = reference.model.generate(eeg)
+        ref_logits = reference.model.score_tokens(ref_hidden, ref_tokens)
+    # Steps up to and including each sequence's END token; the rest is padding
+    ended = (ref_tokens == END_TOKEN).long()
+    valid = (ended.cumsum(dim=1) - ended) == 0
+
+    all_passed = True
+    print(f"🔬 Backend parity vs eager ({len(epochs)} epochs):")
+    for name, engine in engines.items():
+        if name == 'eager':
+            continue
+        quantized = engine.model.metadata.get('quantized', False)
+        with torch.inference_mode():
+            hidden = engine.model.encode(eeg)
+            tokens, _ = engine.model.generate(eeg)
+            logits = engine.model.score_tokens(hidden, ref_tokens)
+
+        hidden_diff = max((a - b).abs().max().item() for a, b in zip(hidden, ref_hidden))
+        logits_diff = (logits - ref_logits).abs().max().item()
+        steps = min(tokens.size(1), ref_tokens.size(1))
+        agreement = (tokens[:, :steps] == ref_tokens[:, :steps]).float().mean().item()
+        in_top_k = (logits.topk(min(top_k, logits.size(-1)), dim=-1).indices == ref_tokens.unsqueeze(-1)).any(-1)
+        topk_agreement = in_top_k[valid].float().mean().item()
+
+        if quantized:
+            passed = topk_agreement >= min_topk_agreement
+        else:
+            passed = hidden_diff <= atol and logits_diff <= atol and agreement == 1.0
+        all_passed &= passed
+        print(f"   {'✅' if passed else '❌'} {name:<17} state diff {hidden_diff:.2e} | logits diff {logits_diff:.2e}"
+              f" | token agreement {agreement:.3f} | top-{top_k} per token {topk_agreement:.3f}"
+              f"{' (int8)' if quantized else ''}")
+    return all_passed
+
+def benchmark_backends(engines, epochs, batch_sizes=(1, 16, 64), repeats=5):
+    """End-to-end predict_batch latency and throughput per backend and batch size"""
+    results = []
+    for name, engine in engines.items():
+        for batch_size in batch_sizes:
+            batch = epochs[:batch_size]
+            engine.predict_batch(batch)  # Warm-up (allocations, TorchScript profiling runs)
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                engine.predict_batch(batch)
+                times.append(time.perf_counter() - start)
+            latency = float(np.median(times))
+            results.append({
+                'backend': name,
+                'batch_size': len(batch),
+                'latency_ms': latency * 1000,
+                'epochs_per_sec': len(batch) / latency,
+            })
+
+    print(f"\n⏱️ Inference backend benchmark (median of {repeats}, {torch.get_num_threads()} threads):")
+    print(f"   {'backend':<17} {'batch':>5} {'latency ms':>11} {'epochs/s':>10}")
+    for r in results:
+        print(f"   {r['backend']:<17} {r['batch_size']:>5} {r['latency_ms']:>11.1f} {r['epochs_per_sec']:>10.1f}")
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Parity check and benchmark of EEGDreamInference backends")
+    parser.add_argument('--checkpoint', default='models/eeg_text_best.pth')
+    parser.add_argument('--export-dir', default='models/serving',
+                        help="Where the TorchScript/ONNX artifacts are (re)exported")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=None,
+                        help="Threads for torch and ONNX Runtime")
+    parser.add_argument('--parity-only', action='store_true')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    engines = load_engines(export_artifacts(args.checkpoint, args.export_dir), args.threads)
+    epochs = synthetic_epochs(max(args.batch_sizes))
+
+    passed = check_backend_parity(engines, epochs[:16])
+    if not args.parity_only:
+        benchmark_backends(engines, epochs, args.batch_sizes, args.repeats)
+    raise SystemExit(0 if passed else 1)
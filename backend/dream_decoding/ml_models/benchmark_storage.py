@@ -0,0 +1,83 @@
+import os
+import time
+import argparse
+import tempfile
+import h5py
+import numpy as np
+
+from hdf5_storage import StorageLayout, hdf5plugin
+
+def candidate_layouts():
+    """Layouts compared by default (blosc / zstd only when hdf5plugin is installed)"""
+    layouts = [
+        StorageLayout('gzip', 6, shuffle=False, chunking='auto'),  # Previous default
+        StorageLayout('gzip', 6, shuffle=False),
+        StorageLayout(),  # Current default
+        StorageLayout('lzf', shuffle=False),
+        StorageLayout('lzf'),
+        StorageLayout('none', shuffle=False),
+    ]
+    if hdf5plugin is not None:
+        layouts += [StorageLayout('blosc'), StorageLayout('zstd')]
+    return layouts
+
+def load_raw_signals(paths, max_epochs=None):
+    """Concatenate raw_signals from *_features.h5 files (or every such file in a directory)"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.h5'))
+        else:
+            files.append(path)
+    parts = []
+    for file_path in files:
+        with h5py.File(file_path, 'r') as f:
+            parts.append(f['raw_signals'][:])
+    data = np.concatenate(parts)
+    return data[:max_epochs] if max_epochs else data
+
+def benchmark_layout(layout, data, path, n_random=200, seed=0):
+    """Write time, file size, full read time and random single-epoch read time for one layout"""
+    start = time.perf_counter()
+    with h5py.File(path, 'w') as f:
+        f.create_dataset('raw_signals', data=data, **layout.dataset_kwargs(data.shape, data.dtype))
+    write_time = time.perf_counter() - start
+    size = os.path.getsize(path)
+
+    start = time.perf_counter()
+    with h5py.File(path, 'r') as f:
+        read_back = f['raw_signals'][:]
+    read_time = time.perf_counter() - start
+    if not np.array_equal(read_back, data):
+        raise AssertionError(f"{layout}: data changed after a round trip")
+
+    # Lazy EEGTextDataset access pattern: one epoch at a time, shuffled
+    epochs = np.random.default_rng(seed).integers(0, len(data), n_random)
+    with h5py.File(path, 'r') as f:
+        dataset = f['raw_signals']
+        start = time.perf_counter()
+        for epoch in epochs:
+            dataset[epoch]
+        epoch_time = (time.perf_counter() - start) / n_random
+    return {'write_s': write_time, 'read_s': read_time, 'epoch_ms': epoch_time * 1000, 'size': size}
+
+def benchmark_storage(data, layouts=None):
+    layouts = candidate_layouts() if layouts is None else layouts
+    print(f"💾 raw_signals {data.shape} {data.dtype} ({data.nbytes / 1e6:.0f} MB in memory)")
+    print(f"   {'layout':<26}{'write':>9}{'read':>9}{'1 epoch':>10}{'size':>10}{'ratio':>7}")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for i, layout in enumerate(layouts):
+            result = benchmark_layout(layout, data, os.path.join(tmp_dir, f'layout_{i}.h5'))
+            results[repr(layout)] = result
+            print(f"   {repr(layout):<26}{result['write_s'] * 1000:7.0f}ms{result['read_s'] * 1000:7.0f}ms"
+                  f"{result['epoch_ms']:8.2f}ms{result['size'] / 1e6:8.1f}MB{data.nbytes / result['size']:6.2f}x")
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="HDF5 layouts for feature files: write/read time and size")
+    parser.add_argument('features', nargs='+', help="*_features.h5 files or directories of them")
+    parser.add_argument('--max-epochs', type=int, default=None)
+    args = parser.parse_args()
+
+    benchmark_storage(load_raw_signals(args.features, args.max_epochs))
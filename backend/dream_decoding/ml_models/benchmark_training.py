@@ -0,0 +1,82 @@
+import time
+import math
+import argparse
+import torch
+from torch.utils.data import TensorDataset
+
+from eeg_to_text_model import EEGToTextModel
+from train_eeg_text import EEGTextTrainer
+
+# Training modes compared by the benchmark: (name, EEGTextTrainer kwargs)
+TRAINING_MODES = [
+    ('fp32', {}),
+    ('bf16', {'precision': 'bf16'}),
+    ('fp32 + accum x4', {'accumulation_steps': 4}),
+    ('fp32 + compile', {'compile_model': True}),
+    ('bf16 + compile', {'precision': 'bf16', 'compile_model': True}),
+]
+
+def synthetic_dataset(num_samples, vocab_size, max_seq_len=20, channels=19, timepoints=3000, seed=0):
+    """Random normalized EEG with random token targets (same shapes as EEGTextDataset)"""
+    generator = torch.Generator().manual_seed(seed)
+    eeg = torch.randn(num_samples, channels, timepoints, generator=generator)
+    tokens = torch.randint(3, vocab_size, (num_samples, max_seq_len), generator=generator)
+    return TensorDataset(eeg, tokens)
+
+def benchmark_training_modes(modes=None, num_samples=256, batch_size=16, vocab_size=100,
+                             epochs=2, device=None):
+    """
+    Train each mode on the same synthetic data and report samples/sec.
+    The first epoch is a warm-up (compilation, allocator) and is not timed.
+    """
+    modes = modes or TRAINING_MODES
+    device = device or torch.device('cpu')
+    dataset = synthetic_dataset(num_samples, vocab_size)
+    results = []
+
+    for name, kwargs in modes:
+        print(f"\n⏱️ Benchmarking mode: {name}")
+        torch.manual_seed(0)
+        model = EEGToTextModel(vocab_size=vocab_size)
+        try:
+            trainer = EEGTextTrainer(model, dataset, batch_size=batch_size, device=device, **kwargs)
+            trainer.train_epoch()  # Warm-up
+
+            start = time.perf_counter()
+            for _ in range(epochs):
+                loss = trainer.train_epoch()
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            print(f"   ❌ Mode failed: {e}")
+            results.append({'mode': name, 'samples_per_sec': None, 'loss': None, 'stable': False})
+            continue
+
+        samples_per_sec = epochs * num_samples / elapsed
+        results.append({
+            'mode': name,
+            'samples_per_sec': samples_per_sec,
+            'loss': loss,
+            'stable': math.isfinite(loss),
+        })
+
+    print(f"\n📊 Training mode benchmark ({num_samples} samples, batch {batch_size}, {device}):")
+    for r in results:
+        if r['samples_per_sec'] is None:
+            print(f"   {r['mode']:<18} failed")
+        else:
+            status = "✅" if r['stable'] else "⚠️ non-finite loss"
+            print(f"   {r['mode']:<18} {r['samples_per_sec']:8.1f} samples/s | loss {r['loss']:.4f} {status}")
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark EEGTextTrainer training modes")
+    parser.add_argument('--samples', type=int, default=256)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--vocab-size', type=int, default=100)
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--modes', nargs='*', default=None,
+                        help=f"Subset of: {', '.join(name for name, _ in TRAINING_MODES)}")
+    args = parser.parse_args()
+
+    modes = [m for m in TRAINING_MODES if args.modes is None or m[0] in args.modes]
+    benchmark_training_modes(modes, args.samples, args.batch_size, args.vocab_size, args.epochs)
@@ -0,0 +1,106 @@
+import os
+import re
+import glob
+import random
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+
+def to_cpu_snapshot(obj):
+    """Deep-copy every tensor in a (nested) state dict to CPU so training can keep mutating the originals"""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {k: to_cpu_snapshot(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu_snapshot(v) for v in obj)
+    return obj
+
+def capture_rng_state():
+    """RNG state of torch, CUDA, numpy and python random, using only checkpoint-safe types"""
+    np_state = np.random.get_state()
+    state = {
+        'torch': torch.get_rng_state(),
+        'numpy': (np_state[0], torch.from_numpy(np_state[1].astype(np.int64)),
+                  np_state[2], np_state[3], np_state[4]),
+        'python': random.getstate(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+def restore_rng_state(state):
+    torch.set_rng_state(state['torch'])
+    name, keys, pos, has_gauss, cached = state['numpy']
+    np.random.set_state((name, keys.numpy().astype(np.uint32), pos, has_gauss, cached))
+    random.setstate(state['python'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+def atomic_torch_save(obj, filepath):
+    """torch.save to a temp file in the same directory, then rename into place"""
+    os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    try:
+        torch.save(obj, tmp_path)
+        os.replace(tmp_path, filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+class CheckpointManager:
+    """
+    Writes checkpoints on a background thread from CPU snapshots.
+    Rolling checkpoints (checkpoint_epoch_XXXX.pth) keep only the newest keep_last files.
+    """
+
+    PATTERN = re.compile(r'checkpoint_epoch_(\d+)\.pth$')
+
+    def __init__(self, checkpoint_dir='models/checkpoints', keep_last=3):
+        self.checkpoint_dir = checkpoint_dir
+        self.keep_last = max(1, keep_last)
+        # A single writer thread keeps saves (and pruning) in submission order
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = []
+
+    def save_async(self, state, filepath):
+        """Snapshot state now (on the caller's thread), serialize it in the background"""
+        snapshot = to_cpu_snapshot(state)
+        
+        # Surface errors from earlier background saves on the training thread
+        for done in [f for f in self._pending if f.done()]:
+            done.result()
+        self._pending = [f for f in self._pending if not f.done()]
+        future = self._executor.submit(atomic_torch_save, snapshot, filepath)
+        self._pending.append(future)
+        return future
+
+    def save_rolling(self, state, epoch):
+        """Save the epoch checkpoint and prune old ones once it is written"""
+        filepath = os.path.join(self.checkpoint_dir, f'checkpoint_epoch_{epoch:04d}.pth')
+        future = self.save_async(state, filepath)
+        self._pending.append(self._executor.submit(self._prune))
+        return future
+
+    def _prune(self):
+        for filepath in self.list_checkpoints()[:-self.keep_last]:
+            os.remove(filepath)
+
+    def list_checkpoints(self):
+        """Rolling checkpoints, oldest first"""
+        files = glob.glob(os.path.join(self.checkpoint_dir, 'checkpoint_epoch_*.pth'))
+        return sorted(f for f in files if self.PATTERN.search(f))
+
+    def latest(self):
+        checkpoints = self.list_checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def wait(self):
+        """Block until every pending save has finished (re-raises save errors)"""
+        for future in self._pending:
+            future.result()
+        self._pending = []
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown()
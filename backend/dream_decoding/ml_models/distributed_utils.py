@@ -0,0 +1,71 @@
+import os
+import builtins
+import torch
+import torch.distributed as dist
+
+def is_distributed():
+    return dist.is_available() and dist.is_initialized()
+
+def get_rank():
+    return dist.get_rank() if is_distributed() else 0
+
+def get_world_size():
+    return dist.get_world_size() if is_distributed() else 1
+
+def is_main_process():
+    return get_rank() == 0
+
+def launched_with_torchrun():
+    """torchrun (or torch.distributed.run) sets these for every worker"""
+    return 'RANK' in os.environ and 'WORLD_SIZE' in os.environ
+
+def setup_for_distributed(is_master):
+    """Silence print() on every rank but rank 0; print(..., force=True) still goes through"""
+    builtin_print = builtins.print
+
+    def print(*args, **kwargs):
+        force = kwargs.pop('force', False)
+        if is_master or force:
+            if not is_master:
+                args = (f"[rank {get_rank()}]",) + args
+            builtin_print(*args, **kwargs)
+
+    builtins.print = print
+
+def setup_distributed(backend='gloo'):
+    """
+    Join the process group described by the torchrun environment variables.
+    Returns (rank, world_size, device). CPU threads are split evenly between
+    the processes on a node so they don't oversubscribe the cores.
+    """
+    dist.init_process_group(backend=backend)
+    rank = dist.get_rank()
+    world_size = dist.get_world_size()
+    local_rank = int(os.environ.get('LOCAL_RANK', 0))
+    local_world_size = int(os.environ.get('LOCAL_WORLD_SIZE', world_size))
+
+    if torch.cuda.is_available():
+        device = torch.device('cuda', local_rank)
+        torch.cuda.set_device(device)
+    else:
+        device = torch.device('cpu')
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_world_size))
+
+    setup_for_distributed(rank == 0)
+    print(f"🌐 Distributed: {world_size} processes ({backend}), device {device}, "
+          f"{torch.get_num_threads()} threads per process")
+    return rank, world_size, device
+
+def cleanup_distributed():
+    if is_distributed():
+        dist.destroy_process_group()
+
+def all_reduce_sum(tensor):
+    """Sum a tensor over all ranks (in place); no-op when not distributed"""
+    if is_distributed():
+        dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor
+
+def barrier():
+    if is_distributed():
+        dist.barrier()
@@ -0,0 +1,85 @@
+import re
+import json
+from collections import Counter
+import numpy as np
+
+# Word tokens; numbers are split into single digits so ids never need a token per number
+TOKEN_PATTERN = re.compile(r"[a-z]+|\d")
+
+class DreamTokenizer:
+    """
+    Word-level vocabulary built from the dataset labels.
+    Ids 0-3 are reserved: <pad> (also the decoder's start input), <start>, <end>, <unk>,
+    matching PAD_TOKEN / END_TOKEN in eeg_to_text_model.
+    """
+
+    PAD, START, END, UNK = 0, 1, 2, 3
+    SPECIAL_TOKENS = ['<pad>', '<start>', '<end>', '<unk>']
+
+    def __init__(self, words=()):
+        self.id_to_token = list(self.SPECIAL_TOKENS) + [w for w in words if w not in self.SPECIAL_TOKENS]
+        self.token_to_id = {token: i for i, token in enumerate(self.id_to_token)}
+
+    @classmethod
+    def build(cls, texts, min_freq=1, max_size=None):
+        """Build a vocabulary from label texts, most frequent words first"""
+        counts = Counter(token for text in texts for token in cls.tokenize(text))
+        words = [w for w, c in sorted(counts.items(), key=lambda kv: (-kv[1], kv[0])) if c >= min_freq]
+        if max_size is not None:
+            words = words[:max(0, max_size - len(cls.SPECIAL_TOKENS))]
+        return cls(words)
+
+    @staticmethod
+    def tokenize(text):
+        return TOKEN_PATTERN.findall(text.lower())
+
+    def __len__(self):
+        return len(self.id_to_token)
+
+    def encode(self, text, max_len):
+        """Token ids + <end>, truncated and padded with <pad> to max_len"""
+        ids = [self.token_to_id.get(token, self.UNK) for token in self.tokenize(text)]
+        ids = ids[:max_len - 1] + [self.END]
+        return ids + [self.PAD] * (max_len - len(ids))
+
+    def encode_batch(self, texts, max_len):
+        """Pre-tokenize many texts into one padded int64 array [len(texts), max_len]"""
+        out = np.full((len(texts), max_len), self.PAD, dtype=np.int64)
+        for i, text in enumerate(texts):
+            out[i] = self.encode(text, max_len)
+        return out
+
+    def decode(self, ids):
+        """Ids back to text, stopping at <pad>/<end>; consecutive digits are re-joined"""
+        words = []
+        for token_id in ids:
+            token_id = int(token_id)
+            if token_id in (self.PAD, self.END):
+                break
+            if token_id == self.START:
+                continue
+            token = self.id_to_token[token_id] if token_id < len(self.id_to_token) else '<unk>'
+            if token.isdigit() and words and words[-1].isdigit():
+                words[-1] += token
+            else:
+                words.append(token)
+        return " ".join(words)
+
+    def to_dict(self):
+        return {'tokens': self.id_to_token}
+
+    @classmethod
+    def from_dict(cls, data):
+        tokens = data['tokens']
+        if tokens[:len(cls.SPECIAL_TOKENS)] != cls.SPECIAL_TOKENS:
+            raise ValueError("Vocabulary does not start with the reserved special tokens")
+        return cls(tokens[len(cls.SPECIAL_TOKENS):])
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
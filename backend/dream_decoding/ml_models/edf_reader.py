@@ -0,0 +1,121 @@
+from collections import Counter
+import numpy as np
+
+try:
+    import pyedflib
+except ImportError:  # Fall back to MNE without preload
+    pyedflib = None
+
+# Channel-name markers used to keep EEG channels (drops EOG, EMG, ...)
+EEG_MARKERS = ['EEG', 'F', 'C', 'P', 'O']
+
+# Physical dimensions in EDF headers -> volts (MNE's unit)
+UNIT_SCALE = {'v': 1.0, 'mv': 1e-3, 'uv': 1e-6, 'µv': 1e-6, 'μv': 1e-6, 'nv': 1e-9}
+
+def select_eeg_channels(ch_names, max_channels=19):
+    """Indices of the EEG channels to keep: name markers first, else the first max_channels"""
+    eeg = [i for i, ch in enumerate(ch_names) if any(marker in ch.upper() for marker in EEG_MARKERS)]
+    return eeg[:max_channels] if eeg else list(range(min(len(ch_names), max_channels)))
+
+class EDFBlockReader:
+    """
+    Reads the selected EEG channels of an EDF file in blocks, without loading the recording.
+    Uses pyedflib when installed, otherwise MNE with preload=False. Samples are in volts.
+    Channels recorded at a different rate than the majority of the selection are dropped.
+    """
+
+    def __init__(self, file_path, max_channels=19, backend='auto'):
+        if backend == 'auto':
+            backend = 'pyedflib' if pyedflib is not None else 'mne'
+        self.file_path = file_path
+        self.backend = backend
+
+        if backend == 'pyedflib':
+            if pyedflib is None:
+                raise ImportError("The 'pyedflib' EDF backend needs pyedflib (pip install pyedflib)")
+            self._edf = pyedflib.EdfReader(file_path)
+            all_names = self._edf.getSignalLabels()
+            rates = self._edf.getSampleFrequencies()
+            lengths = self._edf.getNSamples()
+        elif backend == 'mne':
+            import mne
+            self._raw = mne.io.read_raw_edf(file_path, preload=False, verbose=False)
+            all_names = self._raw.ch_names
+            rates = [self._raw.info['sfreq']] * len(all_names)
+            lengths = [self._raw.n_times] * len(all_names)
+        else:
+            raise ValueError(f"Unknown EDF backend: {backend}")
+
+        selected = select_eeg_channels(all_names, max_channels)
+        self.sfreq = float(Counter(rates[i] for i in selected).most_common(1)[0][0])
+        self.picks = [i for i in selected if rates[i] == self.sfreq]
+        self.ch_names = [all_names[i] for i in self.picks]
+        self.n_times = int(min(lengths[i] for i in self.picks))
+        self.duration = self.n_times / self.sfreq
+        self.n_channels_total = len(all_names)
+
+        if backend == 'pyedflib':
+            self._scale = np.array([
+                UNIT_SCALE.get(self._edf.getPhysicalDimension(i).strip().lower(), 1.0) for i in self.picks
+            ])[:, np.newaxis]
+
+    def read(self, start, stop, out=None):
+        """Samples [start, stop) of the selected channels as a (channels, samples) float64 array"""
+        stop = min(stop, self.n_times)
+        if self.backend == 'mne':
+            return self._raw.get_data(picks=self.picks, start=start, stop=stop)
+        if out is None:
+            out = np.empty((len(self.picks), stop - start))
+        for row, channel in enumerate(self.picks):
+            out[row] = self._edf.readSignal(channel, start, stop - start)
+        out *= self._scale
+        return out
+
+    def blocks(self, block_seconds=60, start=0, stop=None):
+        """Yield consecutive (channels, samples) blocks covering [start, stop) samples"""
+        stop = self.n_times if stop is None else min(stop, self.n_times)
+        block_samples = max(1, int(block_seconds * self.sfreq))
+        for block_start in range(start, stop, block_samples):
+            yield self.read(block_start, min(block_start + block_samples, stop))
+
+    def close(self):
+        if self.backend == 'pyedflib':
+            self._edf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class EpochAssembler:
+    """
+    Cuts a continuous stream of (channels, samples) blocks into fixed-length epochs
+    with a fixed step, like mne.make_fixed_length_events + Epochs (incomplete tail dropped).
+    """
+
+    def __init__(self, n_channels, epoch_samples, step_samples):
+        self.epoch_samples = epoch_samples
+        self.step_samples = step_samples
+        self._buffer = np.zeros((n_channels, 0))
+        self._buffer_start = 0  # Stream index of _buffer[:, 0]
+        self._next_onset = 0
+
+    def push(self, block):
+        """Returns the epochs completed by this block as (n_epochs, channels, epoch_samples)"""
+        self._buffer = np.concatenate([self._buffer, block], axis=1)
+        buffer_end = self._buffer_start + self._buffer.shape[1]
+
+        onsets = []
+        while self._next_onset + self.epoch_samples <= buffer_end:
+            onsets.append(self._next_onset - self._buffer_start)
+            self._next_onset += self.step_samples
+        epochs = np.stack([self._buffer[:, o:o + self.epoch_samples] for o in onsets]) if onsets else \
+            np.zeros((0, self._buffer.shape[0], self.epoch_samples))
+
+        # Keep only what the next epoch still needs
+        drop = min(self._next_onset - self._buffer_start, self._buffer.shape[1])
+        if drop > 0:
+            self._buffer = self._buffer[:, drop:]
+            self._buffer_start += drop
+        return epochs
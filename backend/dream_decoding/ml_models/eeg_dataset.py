@@ -1,9 +1,20 @@
 import os
+import json
 import h5py
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, Subset
 import numpy as np
 
+try:
+    import hdf5plugin  # Reads feature files written with the blosc / zstd codecs (hdf5_storage)
+except ImportError:
+    hdf5plugin = None
+
+from eeg_normalization import normalize_epochs
+
+# Offset index written by eeg_shards.export_shards
+SHARD_INDEX_FILE = 'index.json'
+
 class EEGTextDataset(Dataset):
     """
     FIXED: PyTorch Dataset for loading processed EEG features
@@ -11,10 +22,22 @@ class EEGTextDataset(Dataset):
     """
 
     def __init__(self, features_dir='data/processed/comprehensive_features',
-                 max_channels=19, max_timepoints=3000):
+                 max_channels=19, max_timepoints=3000, lazy=False, shards_dir=None):
         self.features_dir = features_dir
         self.max_channels = max_channels
         self.max_timepoints = max_timepoints
+        self.lazy = lazy  # Read and normalize epochs on demand instead of up front
+        self.shards_dir = shards_dir  # Read pre-normalized epochs from packed shards
+        
+        # Compact (file, epoch) index shared by all modes
+        self.index = np.empty((0, 2), dtype=np.int32)
+        self.token_ids = None  # Pre-tokenized labels, set by attach_tokenizer
+        self._handles = {}
+        self._handles_pid = None
+        
+        if shards_dir is not None:
+            self._load_shards()
+            return
         
         # Get feature files
         if os.path.exists(features_dir):
@@ -24,17 +47,100 @@ class EEGTextDataset(Dataset):
             
         print(f"📊 Found {len(self.feature_files)} feature files")
         
-        if self.feature_files:
+        if self.feature_files and lazy:
+            self._build_index()
+        elif self.feature_files:
             self._load_all_samples()
         else:
             self.samples = []
             print("⚠️ No feature files found. Dataset is empty.")
 
+    def _build_index(self):
+        """Index every (file, epoch) pair from dataset shapes only, without reading signals"""
+        self.samples = []
+        parts = []
+        
+        for file_idx, feature_file in enumerate(self.feature_files):
+            file_path = os.path.join(self.features_dir, feature_file)
+            
+            try:
+                with h5py.File(file_path, 'r') as f:
+                    n_epochs = f['raw_signals'].shape[0]
+            except Exception as e:
+                print(f"⚠️ Error indexing {feature_file}: {e}")
+                continue
+            
+            part = np.empty((n_epochs, 2), dtype=np.int32)
+            part[:, 0] = file_idx
+            part[:, 1] = np.arange(n_epochs)
+            parts.append(part)
+        
+        if parts:
+            self.index = np.concatenate(parts)
+        print(f"🧠 Indexed {len(self.index)} EEG samples (lazy loading)")
+
+    def _load_shards(self):
+        """Memory-map exported training shards and their offset index"""
+        with open(os.path.join(self.shards_dir, SHARD_INDEX_FILE), 'r') as f:
+            shard_index = json.load(f)
+        
+        if (shard_index['max_channels'], shard_index['max_timepoints']) != (self.max_channels, self.max_timepoints):
+            raise ValueError(
+                f"Shards in {self.shards_dir} hold "
+                f"{shard_index['max_channels']}x{shard_index['max_timepoints']} epochs, "
+                f"expected {self.max_channels}x{self.max_timepoints}"
+            )
+        
+        self.feature_files = shard_index['files']
+        self.samples = []
+        self.shards = [
+            np.load(os.path.join(self.shards_dir, shard['path']), mmap_mode='r')
+            for shard in shard_index['shards']
+        ]
+        self.shard_offsets = np.array([shard['offset'] for shard in shard_index['shards']], dtype=np.int64)
+        self.labels = shard_index['samples']['label']
+        
+        if shard_index['num_samples']:
+            self.index = np.stack([
+                np.asarray(shard_index['samples']['file'], dtype=np.int32),
+                np.asarray(shard_index['samples']['epoch'], dtype=np.int32),
+            ], axis=1)
+        print(f"📦 Mapped {len(self.index)} EEG samples from {len(self.shards)} shards")
+
+    def _get_handle(self, file_idx):
+        """Open HDF5 files once per worker process and keep them open"""
+        # Handles must not be shared across fork; reopen in each DataLoader worker
+        if self._handles_pid != os.getpid():
+            self._handles = {}
+            self._handles_pid = os.getpid()
+        
+        handle = self._handles.get(file_idx)
+        if handle is None:
+            file_path = os.path.join(self.features_dir, self.feature_files[file_idx])
+            handle = h5py.File(file_path, 'r')
+            self._handles[file_idx] = handle
+        return handle
+
+    def close(self):
+        """Close any HDF5 handles opened by lazy loading"""
+        if self._handles_pid == os.getpid():
+            for handle in self._handles.values():
+                handle.close()
+        self._handles = {}
+
+    def __getstate__(self):
+        # Open h5py handles cannot be pickled (spawned DataLoader workers)
+        state = self.__dict__.copy()
+        state['_handles'] = {}
+        state['_handles_pid'] = None
+        return state
+
     def _load_all_samples(self):
         """Load all EEG samples into memory for fast training"""
         self.samples = []
+        index = []
         
-        for feature_file in self.feature_files:
+        for file_idx, feature_file in enumerate(self.feature_files):
             file_path = os.path.join(self.features_dir, feature_file)
             
             try:
@@ -42,12 +148,12 @@ class EEGTextDataset(Dataset):
                     # Load raw EEG signals
                     raw_signals = f['raw_signals'][:]  # Shape: (epochs, channels, timepoints)
                     
+                    # Normalize all epochs of the file in one vectorized pass
+                    normalized = normalize_epochs(raw_signals, self.max_channels, self.max_timepoints)
+                    
                     # Process each epoch as a separate sample
                     for epoch_idx in range(raw_signals.shape[0]):
-                        sample = raw_signals[epoch_idx]  # Shape: (channels, timepoints)
-                        
-                        # Normalize sample to fixed size
-                        sample = self._normalize_sample(sample)
+                        sample = normalized[epoch_idx]  # Shape: (channels, timepoints)
                         
                         # Create dummy text label
                         dummy_text = f"Sleep brain activity pattern {len(self.samples)}"
@@ -58,45 +164,90 @@ class EEGTextDataset(Dataset):
                             'file': feature_file,
                             'epoch': epoch_idx
                         })
+                        index.append((file_idx, epoch_idx))
                         
             except Exception as e:
                 print(f"⚠️ Error loading {feature_file}: {e}")
                 continue
         
+        if index:
+            self.index = np.asarray(index, dtype=np.int32)
         print(f"🧠 Loaded {len(self.samples)} EEG samples total")
 
     def _normalize_sample(self, sample):
-        """FIXED: Normalize EEG sample to fixed dimensions"""
-        channels, timepoints = sample.shape
-        
-        # FIXED: Proper comparison operators (not HTML entities)
-        # Pad or crop channels
-        if channels < self.max_channels:
-            padded = np.zeros((self.max_channels, timepoints), dtype=np.float32)
-            padded[:channels] = sample
-            sample = padded
-        elif channels > self.max_channels:
-            sample = sample[:self.max_channels]
-        
-        # Pad or crop timepoints  
-        if timepoints < self.max_timepoints:
-            padded = np.zeros((self.max_channels, self.max_timepoints), dtype=np.float32)
-            padded[:, :timepoints] = sample
-            sample = padded
-        elif timepoints > self.max_timepoints:
-            sample = sample[:, :self.max_timepoints]
-        
-        # Z-score normalization
-        sample = (sample - sample.mean()) / (sample.std() + 1e-8)
-        return sample.astype(np.float32)
+        """Normalize EEG sample to fixed dimensions (see eeg_normalization.normalize_epochs)"""
+        return normalize_epochs(sample, self.max_channels, self.max_timepoints)
+
+    def label(self, idx):
+        """Text label of a sample, without loading its EEG"""
+        if self.shards_dir is not None:
+            return self.labels[idx]
+        if self.lazy:
+            return f"Sleep brain activity pattern {idx}"
+        return self.samples[idx]['text']
+
+    def texts(self):
+        """All text labels, in sample order"""
+        return [self.label(idx) for idx in range(len(self))]
+
+    def attach_tokenizer(self, tokenizer, max_seq_len=20):
+        """Tokenize every label once; __getitem__ then returns token ids instead of text"""
+        self.token_ids = tokenizer.encode_batch(self.texts(), max_seq_len)
+        print(f"🔤 Pre-tokenized {len(self.token_ids)} labels (vocab size: {len(tokenizer)})")
 
     def __len__(self):
-        return len(self.samples)
+        return len(self.index)
 
     def __getitem__(self, idx):
-        sample = self.samples[idx]
-        eeg_tensor = torch.tensor(sample['eeg'])
-        return eeg_tensor, sample['text']
+        if self.shards_dir is not None:
+            shard_idx = np.searchsorted(self.shard_offsets, idx, side='right') - 1
+            eeg_tensor = torch.from_numpy(np.array(self.shards[shard_idx][idx - self.shard_offsets[shard_idx]]))
+        elif self.lazy:
+            file_idx, epoch_idx = self.index[idx]
+            sample = self._get_handle(file_idx)['raw_signals'][epoch_idx]
+            eeg_tensor = torch.from_numpy(self._normalize_sample(sample))
+        else:
+            # Zero-copy view of the cached sample; collate_eeg_batch does the only copy
+            eeg_tensor = torch.from_numpy(self.samples[idx]['eeg'])
+        
+        if self.token_ids is not None:
+            return eeg_tensor, torch.from_numpy(self.token_ids[idx])
+        return eeg_tensor, self.label(idx)
+
+def collate_eeg_batch(batch):
+    """
+    Stack (eeg, label) items with a single copy per batch.
+    Inside DataLoader workers the batch is built directly in shared memory so it
+    is not copied again on its way to the training process.
+    """
+    eegs, labels = zip(*batch)
+    out = torch.empty((len(eegs),) + tuple(eegs[0].shape), dtype=eegs[0].dtype)
+    if torch.utils.data.get_worker_info() is not None:
+        out.share_memory_()
+    torch.stack(eegs, out=out)
+    
+    if isinstance(labels[0], torch.Tensor):
+        return out, torch.stack(labels)
+    return out, list(labels)
+
+def split_by_recording(dataset, val_fraction=0.2, seed=0):
+    """
+    Split into (train, val) Subsets holding out whole recordings, so epochs of one
+    recording never end up on both sides. Returns val=None if there is only one recording.
+    """
+    file_ids = dataset.index[:, 0]
+    recordings = np.unique(file_ids)
+    if len(recordings) < 2 or val_fraction <= 0:
+        return Subset(dataset, np.arange(len(dataset))), None
+    
+    rng = np.random.default_rng(seed)
+    n_val = min(len(recordings) - 1, max(1, int(round(len(recordings) * val_fraction))))
+    val_recordings = rng.choice(recordings, size=n_val, replace=False)
+    is_val = np.isin(file_ids, val_recordings)
+    
+    print(f"✂️ Split by recording: {len(recordings) - n_val} train / {n_val} val recordings "
+          f"({int((~is_val).sum())} / {int(is_val.sum())} samples)")
+    return Subset(dataset, np.flatnonzero(~is_val)), Subset(dataset, np.flatnonzero(is_val))
 
 # Test the dataset
 if __name__ == "__main__":
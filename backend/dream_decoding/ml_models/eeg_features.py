@@ -0,0 +1,266 @@
+from functools import lru_cache
+import numpy as np
+from scipy import signal
+
+# Frequency bands important for sleep/dreams
+BANDS = {
+    'delta': (0.5, 4),    # Deep sleep
+    'theta': (4, 8),      # REM sleep, drowsiness
+    'alpha': (8, 13),     # Relaxed wakefulness
+    'beta': (13, 30),     # Alert wakefulness
+    'gamma': (30, 40)     # High-frequency activity
+}
+
+@lru_cache(maxsize=32)
+def band_sos(fs, low, high, order=4):
+    """Cached Butterworth bandpass design (the legacy per-band filter)"""
+    return signal.butter(order, [low, high], btype='band', fs=fs, output='sos')
+
+@lru_cache(maxsize=32)
+def band_weights(fs, n_fft, bands, weighting='butter', order=4):
+    """
+    (n_freqs, n_bands) matrix turning an rfft power spectrum into band powers in one matmul.
+    'butter' weights each bin by the legacy Butterworth |H(f)|^2, so band power matches
+    mean(sosfilt(x)**2); 'rect' integrates the bins inside [low, high).
+    """
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / fs)
+    weights = np.empty((len(freqs), len(bands)))
+    for i, (low, high) in enumerate(bands):
+        if weighting == 'butter':
+            _, h = signal.sosfreqz(band_sos(fs, low, high, order), worN=freqs, fs=fs)
+            weights[:, i] = np.abs(h) ** 2
+        elif weighting == 'rect':
+            weights[:, i] = (freqs >= low) & (freqs < high)
+        else:
+            raise ValueError(f"Unknown band weighting: {weighting}")
+    weights.setflags(write=False)
+    return weights
+
+def power_spectrum(data, fs, method='periodogram', nperseg=None):
+    """
+    One-sided power per rfft bin along the last axis, scaled so bins sum to mean(x**2)
+    (periodogram) or the Welch-averaged equivalent. Returns (n_fft, power).
+    """
+    n = data.shape[-1]
+    if method == 'periodogram':
+        power = np.abs(np.fft.rfft(data, axis=-1)) ** 2 / n ** 2
+        power[..., 1:n - n // 2] *= 2  # Fold negative frequencies (not DC / Nyquist)
+        return n, power
+    if method == 'welch':
+        nperseg = min(n, nperseg or int(4 * fs))
+        _, density = signal.welch(data, fs, nperseg=nperseg, axis=-1)
+        return nperseg, density * (fs / nperseg)  # PSD x bin width
+    raise ValueError(f"Unknown spectral method: {method}")
+
+class SpectralFeatureEngine:
+    """
+    Band powers for all bands from one batched power spectrum per epoch, instead of
+    one full-signal Butterworth pass per band. Works over chunks of epochs so
+    temporaries stay small; relative power and spectral entropy are optional extras.
+    """
+
+    def __init__(self, fs, bands=None, method='periodogram', weighting='butter', nperseg=None,
+                 relative=False, entropy=False, chunk_epochs=64):
+        self.fs = fs
+        self.bands = dict(BANDS if bands is None else bands)
+        self.method = method
+        self.weighting = weighting
+        self.nperseg = nperseg
+        self.relative = relative
+        self.entropy = entropy
+        self.chunk_epochs = chunk_epochs
+        # Range used for total power and entropy
+        self.low = min(low for low, _ in self.bands.values())
+        self.high = max(high for _, high in self.bands.values())
+
+    def feature_names(self):
+        names = [f'{band}_power' for band in self.bands]
+        if self.relative:
+            names += [f'{band}_relative_power' for band in self.bands]
+        if self.entropy:
+            names.append('spectral_entropy')
+        return names
+
+    def _chunk_features(self, chunk):
+        n_fft, power = power_spectrum(chunk, self.fs, self.method, self.nperseg)
+        weights = band_weights(float(self.fs), n_fft, tuple(self.bands.values()), self.weighting)
+        band_power = power @ weights  # (epochs, channels, bands)
+        out = {f'{band}_power': band_power[..., i] for i, band in enumerate(self.bands)}
+
+        if self.relative or self.entropy:
+            freqs = np.fft.rfftfreq(n_fft, 1.0 / self.fs)
+            in_range = power[..., (freqs >= self.low) & (freqs < self.high)]
+            total = in_range.sum(axis=-1)
+            safe_total = np.where(total > 0, total, 1.0)
+            if self.relative:
+                for i, band in enumerate(self.bands):
+                    out[f'{band}_relative_power'] = band_power[..., i] / safe_total
+            if self.entropy:
+                # Shannon entropy of the normalized spectrum, scaled to [0, 1]
+                p = in_range / safe_total[..., np.newaxis]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    h = -np.sum(np.where(p > 0, p * np.log(p), 0.0), axis=-1)
+                out['spectral_entropy'] = h / np.log(max(2, in_range.shape[-1]))
+        return out
+
+    def compute(self, data):
+        """(epochs, channels, time) -> dict of float32 (epochs, channels) features"""
+        return compute_in_chunks(self._chunk_features, self.feature_names(), data, self.chunk_epochs)
+
+class StatisticalFeatureEngine:
+    """
+    Mean, std, max, min and RMS (plus optional skewness, kurtosis, zero-crossings and
+    Hjorth mobility / complexity) in one pass over the data: each small chunk of epochs
+    is centred once and every feature is reduced from it while it is still in cache.
+    """
+
+    BASE = ['mean', 'std', 'max', 'min', 'rms']
+    EXTRAS = ['skewness', 'kurtosis', 'zero_crossings', 'hjorth_mobility', 'hjorth_complexity']
+
+    def __init__(self, extras=False, chunk_epochs=4):
+        self.extras = extras
+        self.chunk_epochs = chunk_epochs  # 4 x 19 x 3000 float64 ~ 1.8 MB, stays in cache
+        self._work = None
+
+    def feature_names(self):
+        return self.BASE + (self.EXTRAS if self.extras else [])
+
+    def _buffers(self, shape):
+        """Work arrays reused across chunks, so each chunk is processed without fresh allocations"""
+        if self._work is None or self._work['centred'].shape[1:] != shape[1:]:
+            full = (self.chunk_epochs,) + tuple(shape[1:])
+            self._work = {
+                'centred': np.empty(full),
+                'squared': np.empty(full),
+                'diff': np.empty(full[:-1] + (full[-1] - 1,)),
+                'positive': np.empty(full, dtype=bool),
+                'crossing': np.empty(full[:-1] + (full[-1] - 1,), dtype=bool),
+            }
+        return {name: buffer[:shape[0]] for name, buffer in self._work.items()}
+
+    def _chunk_features(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float64)
+        work = self._buffers(chunk.shape)
+        n = chunk.shape[-1]
+        mean = chunk.mean(axis=-1)
+        centred = np.subtract(chunk, mean[..., np.newaxis], out=work['centred'])
+        var = np.einsum('...t,...t->...', centred, centred) / n
+        out = {
+            'mean': mean,
+            'std': np.sqrt(var),
+            'max': chunk.max(axis=-1),
+            'min': chunk.min(axis=-1),
+            'rms': np.sqrt(var + mean ** 2),  # mean(x^2) without squaring the data
+        }
+        if not self.extras:
+            return out
+
+        safe_var = np.where(var > 0, var, 1.0)
+        squared = np.multiply(centred, centred, out=work['squared'])
+        out['skewness'] = np.einsum('...t,...t->...', squared, centred) / n / safe_var ** 1.5
+        out['kurtosis'] = np.einsum('...t,...t->...', squared, squared) / n / safe_var ** 2 - 3.0  # Excess
+        positive = np.greater(centred, 0, out=work['positive'])
+        crossing = np.not_equal(positive[..., 1:], positive[..., :-1], out=work['crossing'])
+        out['zero_crossings'] = np.count_nonzero(crossing, axis=-1)
+
+        # Hjorth: mobility = sqrt(var(x') / var(x)), complexity = mobility(x') / mobility(x);
+        # the mean of a difference telescopes to (last - first) / length
+        diff = np.subtract(centred[..., 1:], centred[..., :-1], out=work['diff'])
+        diff_mean = (centred[..., -1] - centred[..., 0]) / (n - 1)
+        diff_var = np.einsum('...t,...t->...', diff, diff) / (n - 1) - diff_mean ** 2
+        diff2 = np.subtract(diff[..., 1:], diff[..., :-1], out=work['squared'][..., :n - 2])
+        diff2_mean = (diff[..., -1] - diff[..., 0]) / (n - 2)
+        diff2_var = np.einsum('...t,...t->...', diff2, diff2) / (n - 2) - diff2_mean ** 2
+        mobility = np.sqrt(diff_var / safe_var)
+        out['hjorth_mobility'] = mobility
+        out['hjorth_complexity'] = np.sqrt(diff2_var / np.where(diff_var > 0, diff_var, 1.0)) / \
+            np.where(mobility > 0, mobility, 1.0)
+        return out
+
+    def compute(self, data):
+        """(epochs, channels, time) -> dict of float32 (epochs, channels) features"""
+        return compute_in_chunks(self._chunk_features, self.feature_names(), data, self.chunk_epochs)
+
+def compute_in_chunks(chunk_features, names, data, chunk_epochs):
+    """Run a per-chunk feature function over epochs, filling float32 (epochs, channels) outputs"""
+    data = np.asarray(data)
+    out = {name: np.empty(data.shape[:-1], dtype=np.float32) for name in names}
+    for start in range(0, data.shape[0], chunk_epochs):
+        stop = start + chunk_epochs
+        for name, values in chunk_features(data[start:stop]).items():
+            out[name][start:stop] = values
+    return out
+
+def legacy_band_powers(data, fs, bands=None):
+    """The original per-band sosfilt + mean square computation, kept for validation"""
+    bands = BANDS if bands is None else bands
+    return {
+        f'{band}_power': np.mean(signal.sosfilt(band_sos(fs, low, high), data, axis=-1) ** 2,
+                                 axis=-1).astype(np.float32)
+        for band, (low, high) in bands.items()
+    }
+
+def legacy_statistics(data):
+    """The original separate-pass statistical features, kept for validation"""
+    return {
+        'mean': np.mean(data, axis=-1).astype(np.float32),
+        'std': np.std(data, axis=-1).astype(np.float32),
+        'max': np.max(data, axis=-1).astype(np.float32),
+        'min': np.min(data, axis=-1).astype(np.float32),
+        'rms': np.sqrt(np.mean(data**2, axis=-1)).astype(np.float32)
+    }
+
+# name -> (factory(fs, **options) -> compute(data), options the output depends on)
+FEATURE_EXTRACTORS = {}
+
+# What EEGTextDataset / EEGDreamInference read
+DEFAULT_FEATURES = ['raw_signals']
+
+def register_feature_extractor(name, options=()):
+    """Register a feature extractor factory under `name` (an HDF5 dataset or group of that name)"""
+    def decorator(factory):
+        FEATURE_EXTRACTORS[name] = (factory, tuple(options))
+        return factory
+    return decorator
+
+def to_float32(data):
+    return np.asarray(data, dtype=np.float32)  # Use float32 for memory
+
+@register_feature_extractor('raw_signals')
+def raw_signals_extractor(fs):
+    """Epoch signals as-is (for deep learning models)"""
+    return to_float32
+
+@register_feature_extractor('spectral', options=('spectral_method', 'spectral_extras'))
+def spectral_extractor(fs, spectral_method='periodogram', spectral_extras=False):
+    """Band powers (frequency bands important for sleep/dreams)"""
+    return SpectralFeatureEngine(fs, method=spectral_method, relative=spectral_extras,
+                                 entropy=spectral_extras).compute
+
+@register_feature_extractor('statistical', options=('statistical_extras',))
+def statistical_extractor(fs, statistical_extras=False):
+    """Moments, extrema and RMS"""
+    return StatisticalFeatureEngine(extras=statistical_extras).compute
+
+def resolve_feature_names(names):
+    """Validate extractor names; None -> DEFAULT_FEATURES, 'all' -> every registered extractor"""
+    if names is None:
+        return list(DEFAULT_FEATURES)
+    if 'all' in names:
+        return list(FEATURE_EXTRACTORS)
+    unknown = [name for name in names if name not in FEATURE_EXTRACTORS]
+    if unknown:
+        raise ValueError(f"Unknown feature extractors {unknown}; available: {list(FEATURE_EXTRACTORS)}")
+    return list(dict.fromkeys(names))
+
+def build_feature_extractors(names, fs, **options):
+    """{name: compute(data)} for the selected extractors, each given only the options it uses"""
+    return {
+        name: FEATURE_EXTRACTORS[name][0](fs, **{key: options[key] for key in FEATURE_EXTRACTORS[name][1]
+                                                 if key in options})
+        for name in names
+    }
+
+def feature_params(names, **options):
+    """{name: options it depends on}, recorded in the cache manifest per stored feature"""
+    return {name: {key: options.get(key) for key in FEATURE_EXTRACTORS[name][1]} for name in names}
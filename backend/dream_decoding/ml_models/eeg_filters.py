@@ -0,0 +1,326 @@
+from fractions import Fraction
+from functools import lru_cache
+import numpy as np
+from scipy import signal
+
+# Same cut-offs as FlexibleEEGPreprocessor.load_and_preprocess
+BANDPASS = (0.5, 40.0)
+NOTCH_FREQ = 50.0
+
+def design_preprocessing_sos(fs, l_freq=BANDPASS[0], h_freq=BANDPASS[1], notch_freq=NOTCH_FREQ,
+                             order=4, notch_q=30.0):
+    """Butterworth bandpass + IIR notch as one SOS cascade (notch skipped above Nyquist)"""
+    sections = [signal.butter(order, [l_freq, h_freq], btype='band', fs=fs, output='sos')]
+    if notch_freq is not None and notch_freq < fs / 2:
+        b, a = signal.iirnotch(notch_freq, notch_q, fs=fs)
+        sections.append(signal.tf2sos(b, a))
+    return np.vstack(sections)
+
+class StreamingSOSFilter:
+    """
+    Causal SOS filter over consecutive chunks of (channels, samples); the sosfilt
+    zi state carries over so chunked output equals filtering the whole signal at once.
+    """
+
+    def __init__(self, sos, n_channels):
+        self.sos = sos
+        self.n_channels = n_channels
+        self._zi_unit = signal.sosfilt_zi(sos)  # (sections, 2) steady state for a unit step
+        self.zi = None
+
+    def reset(self):
+        self.zi = None
+
+    def process(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if self.zi is None:
+            # Start from the steady state of the first sample to avoid a DC step transient
+            self.zi = self._zi_unit[:, np.newaxis, :] * chunk[np.newaxis, :, 0, np.newaxis]
+        out, self.zi = signal.sosfilt(self.sos, chunk, axis=-1, zi=self.zi)
+        return out
+
+    def flush(self):
+        return np.zeros((self.n_channels, 0))
+
+def ringing_samples(sos, tol=1e-6, max_samples=1 << 20):
+    """Samples until the cascade's impulse response has decayed below tol * its peak"""
+    n = 1024
+    while True:
+        impulse = np.zeros(n)
+        impulse[0] = 1.0
+        response = np.abs(signal.sosfilt(sos, impulse))
+        above = np.flatnonzero(response > tol * response.max())
+        if above[-1] < n // 2 or n >= max_samples:
+            return int(above[-1]) + 1
+        n *= 2
+
+class ZeroPhaseSOSFilter:
+    """
+    Forward-backward (zero-phase, like sosfiltfilt) SOS filtering over consecutive blocks.
+    The forward pass carries its zi state; the backward pass runs over each block plus
+    `lookahead` samples of the next ones, enough for its start-up transient to decay,
+    so output lags input by `lookahead` samples and flush() returns the tail.
+    """
+
+    def __init__(self, sos, n_channels, lookahead=None):
+        self.sos = sos
+        self.n_channels = n_channels
+        self.lookahead = ringing_samples(sos) if lookahead is None else lookahead
+        self._zi_unit = signal.sosfilt_zi(sos)
+        self.forward = StreamingSOSFilter(sos, n_channels)
+        self.reset()
+
+    def reset(self):
+        self.forward.reset()
+        self._pending = np.zeros((self.n_channels, 0))  # Forward-filtered, not yet emitted
+
+    def _backward(self, n_emit):
+        # Backward pass from the newest sample, starting in steady state like sosfiltfilt
+        reversed_pending = self._pending[:, ::-1]
+        zi = self._zi_unit[:, np.newaxis, :] * reversed_pending[np.newaxis, :, 0, np.newaxis]
+        backward, _ = signal.sosfilt(self.sos, reversed_pending, axis=-1, zi=zi)
+        out = backward[:, ::-1][:, :n_emit]
+        self._pending = self._pending[:, n_emit:]
+        return np.ascontiguousarray(out)
+
+    def process(self, chunk):
+        self._pending = np.concatenate([self._pending, self.forward.process(chunk)], axis=1)
+        n_emit = self._pending.shape[1] - self.lookahead
+        if n_emit <= 0:
+            return np.zeros((self.n_channels, 0))
+        return self._backward(n_emit)
+
+    def flush(self):
+        if self._pending.shape[1] == 0:
+            return np.zeros((self.n_channels, 0))
+        return self._backward(self._pending.shape[1])
+
+@lru_cache(maxsize=8)
+def legacy_fir_kernel(fs, l_freq=BANDPASS[0], h_freq=BANDPASS[1], notch_freq=NOTCH_FREQ):
+    """
+    The linear-phase FIR that the legacy MNE path applies (raw.filter defaults, then
+    raw.notch_filter), as one kernel: the impulse response of those exact calls.
+    """
+    import mne
+
+    half = int(20 * fs)  # Far beyond MNE's 'auto' filter lengths (3.3 / transition band)
+    impulse = np.zeros((1, 2 * half + 1))
+    impulse[0, half] = 1.0
+    response = mne.filter.filter_data(impulse, fs, l_freq, h_freq, verbose=False)
+    if notch_freq is not None and notch_freq < fs / 2:
+        response = mne.filter.notch_filter(response, fs, notch_freq, verbose=False)
+    response = response[0]
+    support = np.flatnonzero(np.abs(response) > 1e-12 * np.abs(response).max())
+    reach = max(half - support[0], support[-1] - half)
+    kernel = response[half - reach:half + reach + 1]
+    kernel.setflags(write=False)
+    return kernel
+
+class ZeroPhaseFIRFilter:
+    """
+    Zero-phase (centred, linear-phase) FIR filtering over consecutive blocks, like MNE's
+    FIR filter: edges are padded by odd reflection ('reflect_limited'), the FIR delay of
+    half the kernel is removed, and flush() returns the tail. Input is held back until a
+    kernel's worth has arrived, so the start padding does not depend on the chunk size.
+    """
+
+    def __init__(self, h, n_channels):
+        self.h = np.asarray(h, dtype=np.float64)
+        self.n_channels = n_channels
+        self.delay = (len(self.h) - 1) // 2
+        self.reset()
+
+    def reset(self):
+        self._history = None  # Last len(h) - 1 inputs (padding before the first block)
+        self._pending = []  # Input received before the start padding could be built
+        self._to_skip = self.delay
+
+    def _start(self):
+        """Odd reflection about the first sample, zeros beyond the available signal"""
+        chunk = np.concatenate(self._pending, axis=1)
+        self._pending = []
+        pad = len(self.h) - 1
+        reach = min(pad, chunk.shape[1] - 1)
+        self._history = np.zeros((self.n_channels, pad))
+        if reach:
+            self._history[:, pad - reach:] = 2 * chunk[:, :1] - chunk[:, reach:0:-1]
+        return self._convolve(chunk)
+
+    def _convolve(self, chunk):
+        extended = np.concatenate([self._history, chunk], axis=1)
+        out = signal.oaconvolve(extended, self.h[np.newaxis], mode='valid', axes=-1)
+        self._history = extended[:, extended.shape[1] - (len(self.h) - 1):]
+        skip = min(self._to_skip, out.shape[1])
+        self._to_skip -= skip
+        return out[:, skip:]
+
+    def process(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if chunk.shape[1] == 0:
+            return np.zeros((self.n_channels, 0))
+        if self._history is None:
+            self._pending.append(chunk)
+            if sum(part.shape[1] for part in self._pending) < len(self.h):
+                return np.zeros((self.n_channels, 0))
+            return self._start()
+        return self._convolve(chunk)
+
+    def flush(self):
+        if self._history is None:
+            if not self._pending:
+                return np.zeros((self.n_channels, 0))
+            head = self._start()  # Recording shorter than the kernel
+            return np.concatenate([head, self.flush()], axis=1)
+        # Odd reflection about the last sample supplies the remaining `delay` outputs
+        recent = self._history
+        reach = min(self.delay, recent.shape[1] - 1)
+        pad = np.zeros((self.n_channels, self.delay))
+        pad[:, :reach] = 2 * recent[:, -1:] - recent[:, -2:-reach - 2:-1]
+        return self._convolve(pad)
+
+class StreamingResampler:
+    """
+    Polyphase (upfirdn) resampler over consecutive chunks. Keeps just enough input
+    history, aligned to the decimation phase, to produce every output sample exactly
+    once; output is delayed by the FIR group delay (`delay` input samples).
+    zero_phase=True drops that delay instead, matching scipy.signal.resample_poly
+    (zero padding) once flush() has returned the tail.
+    """
+
+    def __init__(self, fs_in, fs_out, n_channels, taps_per_phase=10, zero_phase=False):
+        ratio = Fraction(fs_out / fs_in).limit_denominator(1000)
+        self.up, self.down = ratio.numerator, ratio.denominator
+        self.n_channels = n_channels
+        self.passthrough = self.up == self.down
+
+        if self.passthrough:
+            self.h = np.ones(1)
+        else:
+            max_rate = max(self.up, self.down)
+            num_taps = 2 * taps_per_phase * max_rate + 1
+            self.h = signal.firwin(num_taps, 1.0 / max_rate, window=('kaiser', 5.0)) * self.up
+        self.delay = (len(self.h) - 1) / 2 / self.up
+
+        # Like resample_poly: pre-pad h so the group delay is a whole number of outputs, then skip them
+        self.zero_phase = zero_phase and not self.passthrough
+        self._skip = 0
+        if self.zero_phase:
+            half_len = (len(self.h) - 1) // 2
+            n_pre_pad = self.down - half_len % self.down
+            self.h = np.concatenate([np.zeros(n_pre_pad), self.h])
+            self._skip = (half_len + n_pre_pad) // self.down
+            self.delay = 0.0
+        self.reset()
+
+    def reset(self):
+        self._history = np.zeros((self.n_channels, 0))
+        self._history_start = 0  # Global input index of _history[:, 0]
+        self._n_in = 0
+        self._n_out = 0
+        self._n_real = 0  # Input samples excluding flush() padding
+
+    def process(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if self.passthrough:
+            return chunk
+        self._n_real += chunk.shape[1]
+        return self._process(chunk)
+
+    def flush(self):
+        """Zero-pad the input so every output of the data seen so far is produced (zero_phase only)"""
+        if not self.zero_phase:
+            return np.zeros((self.n_channels, 0))
+        n_total = -(-self._n_real * self.up // self.down) + self._skip  # ceil(n * up / down) outputs + skipped
+        last_input = ((n_total - 1) * self.down) // self.up
+        pad = max(0, last_input + 1 - self._n_in)
+        out = self._process(np.zeros((self.n_channels, pad)))
+        return out[:, :out.shape[1] - max(0, self._n_out - n_total)]
+
+    def _process(self, chunk):
+        self._history = np.concatenate([self._history, chunk], axis=1)
+        self._n_in += chunk.shape[1]
+
+        # Outputs m whose last input sample floor(m * down / up) has arrived (the FIR is causal)
+        n_ready = (self._n_in * self.up - 1) // self.down + 1
+        if n_ready <= self._n_out:
+            return np.zeros((self.n_channels, 0))
+
+        # upfirdn over the history; its output j is global output (start * up / down) + j
+        y = signal.upfirdn(self.h, self._history, self.up, self.down, axis=1)
+        first = self._history_start * self.up // self.down
+        out = y[:, max(self._n_out, self._skip) - first:n_ready - first]
+        self._n_out = n_ready
+
+        # Drop inputs no future output needs, keeping history aligned to a multiple of `down`
+        needed = max(0, -(-(self._n_out * self.down - len(self.h) + 1) // self.up))
+        keep_from = (needed // self.down) * self.down
+        if keep_from > self._history_start:
+            self._history = self._history[:, keep_from - self._history_start:]
+            self._history_start = keep_from
+        return out
+
+class BlockPreprocessingEngine:
+    """
+    Bandpass + notch + resample of a recording in fixed-size blocks, in one pass.
+    design='fir' (default): the legacy MNE FIR kernel (raw.filter + raw.notch_filter
+    defaults), zero-phase with MNE's edge padding, so filtering matches the legacy path.
+    design='iir': Butterworth + notch SOS, forward-backward with phase='zero' (as MNE's
+    method='iir') or causal with phase='forward' for live streams.
+    Resampling is delay-free polyphase (as resample_poly) unless phase='forward'.
+    Memory is bounded by block size + filter length.
+    """
+
+    def __init__(self, sfreq, n_channels, target_fs=100, l_freq=BANDPASS[0], h_freq=BANDPASS[1],
+                 notch_freq=NOTCH_FREQ, phase='zero', design='fir', taps_per_phase=32):
+        if phase not in ('zero', 'forward'):
+            raise ValueError(f"Unknown filter phase: {phase}")
+        if design not in ('fir', 'iir'):
+            raise ValueError(f"Unknown filter design: {design}")
+        if design == 'fir' and phase != 'zero':
+            raise ValueError("The FIR design is zero-phase only")
+        self.sfreq = sfreq
+        self.n_channels = n_channels
+        self.target_fs = target_fs
+        self.design = design
+        if design == 'fir':
+            self.sos = None
+            self.filter = ZeroPhaseFIRFilter(legacy_fir_kernel(sfreq, l_freq, h_freq, notch_freq), n_channels)
+        else:
+            self.sos = design_preprocessing_sos(sfreq, l_freq, h_freq, notch_freq)
+            if phase == 'zero':
+                self.filter = ZeroPhaseSOSFilter(self.sos, n_channels)
+            else:
+                self.filter = StreamingSOSFilter(self.sos, n_channels)
+        self.resampler = StreamingResampler(sfreq, target_fs, n_channels, taps_per_phase,
+                                            zero_phase=phase == 'zero')
+
+    def reset(self):
+        self.filter.reset()
+        self.resampler.reset()
+
+    def output_length(self, n_samples):
+        """Output samples for an n_samples recording (after flush)"""
+        return -(-n_samples * self.resampler.up // self.resampler.down)
+
+    def process(self, block):
+        return self.resampler.process(self.filter.process(block))
+
+    def flush(self):
+        tail = self.resampler.process(self.filter.flush())
+        return np.concatenate([tail, self.resampler.flush()], axis=1)
+
+    def run(self, blocks):
+        """Yield output blocks for an iterable of (n_channels, samples) input blocks"""
+        for block in blocks:
+            out = self.process(block)
+            if out.shape[1]:
+                yield out
+        tail = self.flush()
+        if tail.shape[1]:
+            yield tail
+
+def iter_raw_blocks(raw, block_samples, picks=None, start=0, stop=None):
+    """Read an MNE Raw (preload=False reads from disk) in (channels, block_samples) blocks"""
+    stop = raw.n_times if stop is None else min(stop, raw.n_times)
+    for block_start in range(start, stop, block_samples):
+        yield raw.get_data(picks=picks, start=block_start, stop=min(block_start + block_samples, stop))
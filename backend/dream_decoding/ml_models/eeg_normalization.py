@@ -0,0 +1,103 @@
+import time
+import argparse
+import numpy as np
+
+def normalize_epochs(epochs, max_channels=19, max_timepoints=3000, out=None,
+                     eps=1e-8, chunk_size=4):
+    """
+    Pad/crop a batch of epochs to (max_channels, max_timepoints) and z-score each epoch.
+    epochs: array of shape (epochs, channels, time) or a single (channels, time) epoch.
+    out: optional preallocated float32 buffer of shape (epochs, max_channels, max_timepoints).
+    Padding is zero-filled before normalization, as in the original per-sample code.
+    Work is done chunk_size epochs at a time so each chunk stays in CPU cache.
+    """
+    epochs = np.asarray(epochs)
+    single = epochs.ndim == 2
+    if single:
+        epochs = epochs[np.newaxis]
+    if epochs.ndim != 3:
+        raise ValueError(f"Expected (epochs, channels, time) array, got shape {epochs.shape}")
+
+    n_epochs, channels, timepoints = epochs.shape
+    shape = (n_epochs, max_channels, max_timepoints)
+    if out is None:
+        out = np.empty(shape, dtype=np.float32)
+    elif out.shape != shape or out.dtype != np.float32:
+        raise ValueError(f"Output buffer must be float32 {shape}, got {out.dtype} {out.shape}")
+
+    ch = min(channels, max_channels)
+    t = min(timepoints, max_timepoints)
+    size = max_channels * max_timepoints
+
+    for start in range(0, n_epochs, chunk_size):
+        stop = min(start + chunk_size, n_epochs)
+        block = out[start:stop]
+
+        # Pad or crop channels and timepoints in one copy
+        block[:, :ch, :t] = epochs[start:stop, :ch, :t]
+        if ch < max_channels:
+            block[:, ch:, :] = 0
+        if t < max_timepoints:
+            block[:, :ch, t:] = 0
+
+        # Z-score in place: subtract the mean, then scale by the RMS of the residual
+        flat = block.reshape(stop - start, size)
+        flat -= flat.mean(axis=1)[:, np.newaxis]
+        std = np.sqrt(np.einsum('ij,ij->i', flat, flat) / size)
+        flat *= (1.0 / (std + eps)).astype(np.float32)[:, np.newaxis]
+
+    return out[0] if single else out
+
+def _normalize_epoch_reference(sample, max_channels=19, max_timepoints=3000):
+    """Original per-sample implementation, kept for the benchmark"""
+    channels, timepoints = sample.shape
+    if channels < max_channels:
+        padded = np.zeros((max_channels, timepoints), dtype=np.float32)
+        padded[:channels] = sample
+        sample = padded
+    elif channels > max_channels:
+        sample = sample[:max_channels]
+    if timepoints < max_timepoints:
+        padded = np.zeros((max_channels, max_timepoints), dtype=np.float32)
+        padded[:, :timepoints] = sample
+        sample = padded
+    elif timepoints > max_timepoints:
+        sample = sample[:, :max_timepoints]
+    sample = (sample - sample.mean()) / (sample.std() + 1e-8)
+    return sample.astype(np.float32)
+
+def benchmark_normalization(n_epochs=256, channels=19, timepoints=3000, repeats=5):
+    """Compare per-epoch cost of the per-sample loop and the batched path"""
+    rng = np.random.default_rng(0)
+    data = (rng.standard_normal((n_epochs, channels, timepoints)) * 1e-5).astype(np.float32)
+    out = np.empty((n_epochs, 19, 3000), dtype=np.float32)
+
+    def best_of(fn):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    loop_time = best_of(lambda: [_normalize_epoch_reference(epoch) for epoch in data])
+    batch_time = best_of(lambda: normalize_epochs(data, out=out))
+
+    reference = np.stack([_normalize_epoch_reference(epoch) for epoch in data])
+    max_diff = float(np.abs(reference - normalize_epochs(data)).max())
+
+    print(f"📏 Normalization benchmark ({n_epochs} epochs of {channels}x{timepoints}):")
+    print(f"   Per-sample loop: {loop_time / n_epochs * 1e6:.1f} µs/epoch")
+    print(f"   Batched:         {batch_time / n_epochs * 1e6:.1f} µs/epoch")
+    print(f"   Speedup:         {loop_time / batch_time:.2f}x")
+    print(f"   Max abs diff:    {max_diff:.2e}")
+    return loop_time / n_epochs, batch_time / n_epochs
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark EEG epoch normalization")
+    parser.add_argument('--epochs', type=int, default=256)
+    parser.add_argument('--channels', type=int, default=19)
+    parser.add_argument('--timepoints', type=int, default=3000)
+    args = parser.parse_args()
+
+    benchmark_normalization(args.epochs, args.channels, args.timepoints)
@@ -0,0 +1,86 @@
+import os
+import json
+import argparse
+import numpy as np
+from numpy.lib.format import open_memmap
+from tqdm import tqdm
+
+from eeg_dataset import EEGTextDataset, SHARD_INDEX_FILE
+
+def export_shards(features_dir='data/processed/comprehensive_features',
+                  shard_dir='data/processed/training_shards',
+                  epochs_per_shard=4096, max_channels=19, max_timepoints=3000):
+    """
+    Pack every normalized epoch into a few large uncompressed .npy shards.
+    Shards are read back with np.load(mmap_mode='r'), so training reads are
+    sequential and need no decompression.
+    """
+    print("📦 Exporting training shards...")
+
+    dataset = EEGTextDataset(features_dir, max_channels=max_channels,
+                             max_timepoints=max_timepoints, lazy=True)
+    n_samples = len(dataset)
+    if n_samples == 0:
+        print("❌ No samples to export. Run preprocessing first!")
+        return None
+
+    os.makedirs(shard_dir, exist_ok=True)
+
+    shards = []
+    labels = []
+    for offset in range(0, n_samples, epochs_per_shard):
+        count = min(epochs_per_shard, n_samples - offset)
+        shard_name = f'shard_{len(shards):05d}.npy'
+        shard_path = os.path.join(shard_dir, shard_name)
+        tmp_path = f"{shard_path}.{os.getpid()}.tmp.npy"
+
+        # Write straight into the memory-mapped shard, one epoch at a time
+        shard = open_memmap(tmp_path, mode='w+', dtype=np.float32,
+                            shape=(count, max_channels, max_timepoints))
+        for i in tqdm(range(count), desc=shard_name):
+            eeg, text = dataset[offset + i]
+            shard[i] = eeg.numpy()
+            labels.append(text)
+        shard.flush()
+        del shard
+        os.replace(tmp_path, shard_path)
+
+        shards.append({'path': shard_name, 'offset': offset, 'count': count})
+
+    dataset.close()
+
+    index = {
+        'format': 1,
+        'dtype': 'float32',
+        'max_channels': max_channels,
+        'max_timepoints': max_timepoints,
+        'num_samples': n_samples,
+        'files': dataset.feature_files,
+        'shards': shards,
+        'samples': {
+            'file': dataset.index[:, 0].tolist(),
+            'epoch': dataset.index[:, 1].tolist(),
+            'label': labels,
+        },
+    }
+
+    # Index is written last, so a shard directory without one is incomplete
+    index_path = os.path.join(shard_dir, SHARD_INDEX_FILE)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+
+    size_mb = n_samples * max_channels * max_timepoints * 4 / (1024 * 1024)
+    print(f"✅ Exported {n_samples} epochs into {len(shards)} shards ({size_mb:.1f}MB)")
+    print(f"   📁 Location: {shard_dir}")
+    return index
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pack processed EEG epochs into training shards")
+    parser.add_argument('--features-dir', default='data/processed/comprehensive_features')
+    parser.add_argument('--shard-dir', default='data/processed/training_shards')
+    parser.add_argument('--epochs-per-shard', type=int, default=4096)
+    args = parser.parse_args()
+
+    export_shards(args.features_dir, args.shard_dir, args.epochs_per_shard)
@@ -1,14 +1,26 @@
+from typing import Optional, Tuple
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+# Special tokens: the decoder is primed with token 0, which is also the padding id
+PAD_TOKEN = 0
+START_TOKEN = 0
+END_TOKEN = 2
+
 class EEGToTextModel(nn.Module):
     def __init__(self, input_channels=19, input_length=3000,
                  hidden_dim=128, vocab_size=5000, max_seq_len=20):
         super().__init__()
+        # Constructor arguments, stored in checkpoints so the model can be rebuilt
+        self.config = {
+            'input_channels': input_channels, 'input_length': input_length,
+            'hidden_dim': hidden_dim, 'vocab_size': vocab_size, 'max_seq_len': max_seq_len,
+        }
         self.max_seq_len = max_seq_len
         self.hidden_dim = hidden_dim
         self.vocab_size = vocab_size
+        self.start_token = START_TOKEN  # Attribute so TorchScript can see it (model_export)
 
         # EEG feature extractor (same as now) ...
         self.eeg_encoder = nn.Sequential(
@@ -40,23 +52,168 @@ class EEGToTextModel(nn.Module):
 
         self.output_projection = nn.Linear(hidden_dim, vocab_size)
 
-    def forward(self, eeg, target_length=20):
+    @torch.jit.export
+    def encode(self, eeg) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Encode EEG into the initial decoder state (h0, c0)"""
         features = self.eeg_encoder(eeg).squeeze(-1)   # [batch, 128]
-        batch_size = features.size(0)
-
+        
         # Initialize hidden states with EEG features
         h0 = features.unsqueeze(0).repeat(2, 1, 1)
         c0 = torch.zeros_like(h0)
+        return h0, c0
+
+    @torch.jit.export
+    def _decode_step(self, input_token, hidden: Tuple[torch.Tensor, torch.Tensor]):
+        """One LSTM step reusing the carried (h, c) state as the decoding cache"""
+        token_emb = self.embedding(input_token)          # [batch, 1, hidden]
+        lstm_out, hidden = self.text_decoder(token_emb, hidden)
+        return self.output_projection(lstm_out.squeeze(1)), hidden
 
-        outputs = []
-        input_token = torch.zeros(batch_size, 1, dtype=torch.long, device=eeg.device)  # <START>
+    def forward(self, eeg, target_length: int = 20, targets: Optional[torch.Tensor] = None,
+                sampling_ratio: float = 0.0):
+        """
+        Without targets: autoregressive greedy decoding for target_length steps.
+        With targets [batch, seq_len]: teacher forcing, the whole sequence goes through
+        text_decoder in one call. sampling_ratio > 0 enables scheduled sampling: that
+        fraction of input tokens is replaced by the model's own predictions from a
+        first no-grad teacher-forced pass (keeps the fused full-sequence kernel).
+        """
+        hidden = self.encode(eeg)
+        batch_size = eeg.size(0)
+
+        if targets is not None:
+            if sampling_ratio > 0:
+                with torch.no_grad():
+                    predicted = self.score_tokens(hidden, targets).argmax(dim=-1)
+                use_prediction = torch.rand(targets.shape, device=targets.device) < sampling_ratio
+                targets = torch.where(use_prediction, predicted, targets)
+            return self.score_tokens(hidden, targets)  # [batch, seq_len, vocab_size]
+
+        # Logits are written into one preallocated tensor instead of append + cat
+        outputs = torch.empty(batch_size, target_length, self.vocab_size,
+                              dtype=hidden[0].dtype, device=eeg.device)
+        input_token = torch.full((batch_size, 1), self.start_token, dtype=torch.long, device=eeg.device)
 
-        hidden = (h0, c0)
         for step in range(target_length):
-            token_emb = self.embedding(input_token).squeeze(1)
-            lstm_out, hidden = self.text_decoder(token_emb.unsqueeze(1), hidden)
-            logits = self.output_projection(lstm_out.squeeze(1))
-            outputs.append(logits.unsqueeze(1))
+            logits, hidden = self._decode_step(input_token, hidden)
+            outputs[:, step] = logits
             input_token = logits.argmax(dim=-1, keepdim=True)
 
-        return torch.cat(outputs, dim=1)  # [batch, seq_len, vocab_size]
+        return outputs  # [batch, seq_len, vocab_size]
+
+    @torch.no_grad()
+    def generate(self, eeg, max_length=None, strategy='greedy', beam_size=4, top_k=10,
+                 temperature=1.0, length_penalty=1.0, generator=None,
+                 tokens_out=None, logits_out=None):
+        """
+        Decode token sequences, stopping as soon as every sequence has emitted END_TOKEN.
+        strategy: 'greedy', 'top_k' (sampling; top_k above the vocabulary size samples from all of it) or 'beam'.
+        tokens_out / logits_out: optional reusable buffers of shape
+        [>=batch, >=max_length] and [>=batch, >=max_length, vocab_size].
+        Returns (tokens [batch, steps], logits [batch, steps, vocab]); positions after
+        END_TOKEN are PAD_TOKEN.
+        """
+        max_length = max_length or self.max_seq_len
+        hidden = self.encode(eeg)
+        batch_size = eeg.size(0)
+
+        tokens = self._buffer(tokens_out, (batch_size, max_length), torch.long, eeg.device)
+        logits_buf = self._buffer(logits_out, (batch_size, max_length, self.vocab_size),
+                                  hidden[0].dtype, eeg.device)
+
+        if strategy == 'beam':
+            steps = self._beam_search(hidden, tokens, max_length, beam_size, length_penalty)
+            # One teacher-forced pass recovers the logits of the chosen sequences
+            logits_buf[:, :steps] = self.score_tokens(hidden, tokens[:, :steps])
+            return tokens[:, :steps], logits_buf[:, :steps]
+        if strategy not in ('greedy', 'top_k'):
+            raise ValueError(f"Unknown decoding strategy: {strategy}")
+        if strategy == 'top_k' and top_k < 1:
+            raise ValueError(f"top_k must be at least 1, got {top_k}")
+
+        input_token = torch.full((batch_size, 1), START_TOKEN, dtype=torch.long, device=eeg.device)
+        finished = torch.zeros(batch_size, dtype=torch.bool, device=eeg.device)
+
+        steps = 0
+        for step in range(max_length):
+            logits, hidden = self._decode_step(input_token, hidden)
+            logits_buf[:, step] = logits
+            steps = step + 1
+
+            if strategy == 'greedy':
+                next_token = logits.argmax(dim=-1)
+            else:
+                top_logits, top_idx = torch.topk(logits / temperature, min(top_k, logits.size(-1)), dim=-1)
+                choice = torch.multinomial(torch.softmax(top_logits, dim=-1), 1, generator=generator)
+                next_token = top_idx.gather(-1, choice).squeeze(-1)
+
+            tokens[:, step] = next_token.masked_fill(finished, PAD_TOKEN)
+            finished |= next_token == END_TOKEN
+            if finished.all():
+                break
+            input_token = next_token.unsqueeze(1)
+
+        return tokens[:, :steps], logits_buf[:, :steps]
+
+    @torch.jit.export
+    def score_tokens(self, hidden: Tuple[torch.Tensor, torch.Tensor], tokens):
+        """Teacher-forced logits for given token sequences in a single LSTM call"""
+        start = torch.full((tokens.size(0), 1), self.start_token, dtype=torch.long, device=tokens.device)
+        inputs = torch.cat([start, tokens[:, :-1]], dim=1)
+        lstm_out, _ = self.text_decoder(self.embedding(inputs), hidden)
+        return self.output_projection(lstm_out)
+
+    def _beam_search(self, hidden, tokens, max_length, beam_size, length_penalty):
+        """Beam search over the LSTM decoder, writes the best beams into tokens"""
+        batch_size = tokens.size(0)
+        device = tokens.device
+        h, c = (state.repeat_interleave(beam_size, dim=1) for state in hidden)
+
+        scores = torch.full((batch_size, beam_size), float('-inf'), device=device)
+        scores[:, 0] = 0.0  # All beams start identical; keep only one alive at step 0
+        beams = torch.zeros(batch_size, beam_size, max_length, dtype=torch.long, device=device)
+        finished = torch.zeros(batch_size, beam_size, dtype=torch.bool, device=device)
+        lengths = torch.zeros(batch_size, beam_size, device=device)
+
+        # Finished beams may only extend with PAD at no cost
+        pad_only = torch.full((self.vocab_size,), float('-inf'), device=device)
+        pad_only[PAD_TOKEN] = 0.0
+
+        batch_offset = torch.arange(batch_size, device=device).unsqueeze(1) * beam_size
+        input_token = torch.full((batch_size * beam_size, 1), START_TOKEN, dtype=torch.long, device=device)
+
+        steps = 0
+        for step in range(max_length):
+            logits, (h, c) = self._decode_step(input_token, (h, c))
+            log_probs = torch.log_softmax(logits, dim=-1).view(batch_size, beam_size, -1)
+            log_probs = torch.where(finished.unsqueeze(-1), pad_only, log_probs)
+
+            candidates = (scores.unsqueeze(-1) + log_probs).view(batch_size, -1)
+            scores, flat_idx = candidates.topk(beam_size, dim=-1)
+            beam_idx = flat_idx // self.vocab_size
+            next_token = flat_idx % self.vocab_size
+
+            beams = beams.gather(1, beam_idx.unsqueeze(-1).expand(-1, -1, max_length))
+            beams[:, :, step] = next_token
+            lengths = lengths.gather(1, beam_idx) + (~finished.gather(1, beam_idx)).float()
+            finished = finished.gather(1, beam_idx) | (next_token == END_TOKEN)
+
+            reorder = (beam_idx + batch_offset).view(-1)
+            h, c = h[:, reorder], c[:, reorder]
+            input_token = next_token.view(-1, 1)
+            steps = step + 1
+            if finished.all():
+                break
+
+        best = (scores / lengths.clamp(min=1) ** length_penalty).argmax(dim=-1)
+        tokens[:, :steps] = beams[torch.arange(batch_size, device=device), best, :steps]
+        return steps
+
+    @staticmethod
+    def _buffer(out, shape, dtype, device):
+        """Return a view of a caller-provided buffer, or allocate one"""
+        if out is None:
+            return torch.empty(shape, dtype=dtype, device=device)
+        if out.dim() != len(shape) or any(o < s for o, s in zip(out.shape, shape)):
+            raise ValueError(f"Buffer of shape {tuple(out.shape)} is too small for {shape}")
+        return out[tuple(slice(0, s) for s in shape)]
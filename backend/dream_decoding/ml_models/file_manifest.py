@@ -0,0 +1,32 @@
+import os
+import json
+import hashlib
+
+def file_sha256(file_path, chunk_size=1 << 20):
+    """Stream a file through SHA-256 without reading it into memory"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(manifest_path):
+    """Load a JSON manifest as a dict (empty if missing or unreadable)"""
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if not isinstance(manifest, dict):
+            raise ValueError("not a JSON object")
+        return manifest
+    except (OSError, ValueError) as e:
+        print(f"   ⚠️ Ignoring unreadable manifest {manifest_path}: {e}")
+        return {}
+
+def save_manifest(manifest, manifest_path):
+    """Atomically write a JSON manifest (temp file + rename)"""
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
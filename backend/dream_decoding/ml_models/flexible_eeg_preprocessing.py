@@ -1,23 +1,96 @@
 import os
+import sys
+import shutil
+import argparse
+import contextlib
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import mne
 import numpy as np
 import h5py
-from scipy import signal
 import warnings
 from tqdm import tqdm
+
+from eeg_filters import BlockPreprocessingEngine
+from edf_reader import EDFBlockReader, EpochAssembler, select_eeg_channels
+from hdf5_storage import StorageLayout, CODECS, CHUNKINGS
+from file_manifest import file_sha256, load_manifest, save_manifest
+from eeg_features import FEATURE_EXTRACTORS, DEFAULT_FEATURES, resolve_feature_names, build_feature_extractors, feature_params
 warnings.filterwarnings('ignore')
 
+# Shared semaphore limiting how many pool workers hold a preloaded recording
+_load_slots = None
+
+def _init_worker(load_slots):
+    """Install the shared load semaphore in a pool worker"""
+    global _load_slots
+    _load_slots = load_slots
+
+def manifest_path_for(output_dir):
+    """Manifest lives next to the output directory, e.g. comprehensive_features_manifest.json"""
+    output_dir = os.path.normpath(output_dir)
+    return os.path.join(os.path.dirname(output_dir), f'{os.path.basename(output_dir)}_manifest.json')
+
 class FlexibleEEGPreprocessor:
     """
     EEG Preprocessing handling partial datasets with missing files.
     Optimized for RTX 4050 with your 33 downloaded files.
     """
 
-    def __init__(self, sampling_rate=100, max_duration=300, epoch_length=30, overlap=0.5):
+    def __init__(self, sampling_rate=100, max_duration=None, epoch_length=30, overlap=0.5,
+                 filter_engine='blocks', block_seconds=60, features=None, spectral_method='periodogram',
+                 spectral_extras=False, statistical_extras=False, storage=None):
         self.fs = sampling_rate
-        self.max_duration = max_duration  # Crop to 5 minutes for memory efficiency
+        # Optional crop in seconds; the block engine streams whole recordings in bounded memory
+        self.max_duration = max_duration
         self.epoch_length = epoch_length  # 30-second epochs
         self.overlap = overlap  # 50% overlap between epochs
+        # 'blocks': the legacy MNE FIR kernel + polyphase resampling over block_seconds blocks
+        # read lazily from the EDF (eeg_filters), within LEGACY_MAX_RMS_ERROR of 'mne'
+        # (benchmark_filtering.check_legacy_parity); 'mne': preload and raw.filter /
+        # notch_filter / resample
+        if filter_engine not in ('blocks', 'mne'):
+            raise ValueError(f"Unknown filter engine: {filter_engine}")
+        self.filter_engine = filter_engine
+        self.block_seconds = block_seconds
+        # Named extractors from the eeg_features registry (default: raw_signals only, which is
+        # all training and inference read); spectral / statistical extras add relative band
+        # power and spectral entropy / skewness, kurtosis, zero-crossings and Hjorth parameters
+        self.features = resolve_feature_names(features)
+        self.feature_options = {
+            'spectral_method': spectral_method,
+            'spectral_extras': spectral_extras,
+            'statistical_extras': statistical_extras,
+        }
+        self.extractors = build_feature_extractors(self.features, self.fs, **self.feature_options)
+        # HDF5 codec / shuffle / chunking (hdf5_storage); does not change the stored values
+        self.storage = StorageLayout() if storage is None else storage
+
+    def cache_params(self):
+        """Parameters that invalidate cached outputs when changed"""
+        return {
+            'sampling_rate': self.fs,
+            'max_duration': self.max_duration,
+            'epoch_length': self.epoch_length,
+            'overlap': self.overlap,
+            'filter_engine': self.filter_engine,
+            # Block engine design; earlier caches came from the Butterworth IIR design
+            'filter_design': 'fir' if self.filter_engine == 'blocks' else None,
+        }
+
+    def feature_params(self, names=None):
+        """Per-feature options recorded in the manifest; a change only recomputes that feature"""
+        return feature_params(self.features if names is None else names, **self.feature_options)
+
+    def _input_fingerprint(self, file_path, cached_entry):
+        """Hash an input file, reusing the cached hash when size and mtime are unchanged"""
+        stat = os.stat(file_path)
+        if (cached_entry and cached_entry.get('size') == stat.st_size
+                and cached_entry.get('mtime_ns') == stat.st_mtime_ns):
+            sha256 = cached_entry['sha256']
+        else:
+            sha256 = file_sha256(file_path)
+        return {'sha256': sha256, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
 
     def analyze_dataset(self, data_dir='data/raw/comprehensive_1gb'):
         """Analyze what files you actually have"""
@@ -52,26 +125,14 @@ class FlexibleEEGPreprocessor:
             print(f"      📊 Original: {original_channels} ch, {original_sfreq}Hz, {original_duration:.1f}s")
             
             # Crop if too long (memory management for RTX 4050)
-            if original_duration > self.max_duration:
+            if self.max_duration is not None and original_duration > self.max_duration:
                 raw.crop(tmax=self.max_duration)
                 print(f"      ✂️ Cropped to {self.max_duration}s for memory efficiency")
             
-            # Select EEG channels only (remove EOG, EMG, etc.)
-            eeg_channels = []
-            for ch in raw.ch_names:
-                ch_upper = ch.upper()
-                if any(marker in ch_upper for marker in ['EEG', 'F', 'C', 'P', 'O']):
-                    eeg_channels.append(ch)
-            
-            if eeg_channels:
-                # Limit to 19 channels max for RTX 4050 memory
-                max_channels = min(len(eeg_channels), 19)
-                raw.pick_channels(eeg_channels[:max_channels])
-                print(f"      🧠 Selected {len(raw.ch_names)} EEG channels")
-            else:
-                print(f"      ⚠️ No clear EEG channels found, using first 19 channels")
-                if raw.info['nchan'] > 19:
-                    raw.pick_channels(raw.ch_names[:19])
+            # Select EEG channels only (remove EOG, EMG, etc.), 19 max for RTX 4050 memory
+            picks = select_eeg_channels(raw.ch_names, 19)
+            raw.pick([raw.ch_names[i] for i in picks])
+            print(f"      🧠 Selected {len(raw.ch_names)} EEG channels")
             
             # Apply filters
             print(f"      🔄 Filtering...")
@@ -108,75 +169,216 @@ class FlexibleEEGPreprocessor:
             print(f"      ❌ Failed to create epochs: {str(e)}")
             return None
 
-    def extract_comprehensive_features(self, epochs):
-        """Extract comprehensive features for dream decoding"""
-        data = epochs.get_data()  # Shape: (n_epochs, n_channels, n_timepoints)
-        print(f"      🔍 Extracting features from shape: {data.shape}")
-        
-        features = {}
-        
-        # 1. Raw signals (for deep learning models)
-        features['raw_signals'] = data.astype(np.float32)  # Use float32 for memory
-        
-        # 2. Spectral features (frequency bands important for sleep/dreams)
-        print(f"      🌊 Computing spectral features...")
-        bands = {
-            'delta': (0.5, 4),    # Deep sleep
-            'theta': (4, 8),      # REM sleep, drowsiness
-            'alpha': (8, 13),     # Relaxed wakefulness
-            'beta': (13, 30),     # Alert wakefulness
-            'gamma': (30, 40)     # High-frequency activity
-        }
+    def extract_comprehensive_features(self, epochs, verbose=True, names=None):
+        """Run the selected feature extractors (MNE Epochs or an epochs array)"""
+        # Shape: (n_epochs, n_channels, n_timepoints)
+        data = epochs.get_data() if hasattr(epochs, 'get_data') else np.asarray(epochs)
+        names = self.features if names is None else names
+        if verbose:
+            print(f"      🔍 Extracting {', '.join(names)} from shape: {data.shape}")
         
-        spectral_features = {}
-        for band_name, (low, high) in bands.items():
-            sos = signal.butter(4, [low, high], btype='band', fs=self.fs, output='sos')
-            filtered = signal.sosfilt(sos, data, axis=-1)
-            power = np.mean(filtered**2, axis=-1).astype(np.float32)
-            spectral_features[f'{band_name}_power'] = power
-        
-        features['spectral'] = spectral_features
-        
-        # 3. Statistical features
-        print(f"      📈 Computing statistical features...")
-        statistical_features = {
-            'mean': np.mean(data, axis=-1).astype(np.float32),
-            'std': np.std(data, axis=-1).astype(np.float32),
-            'max': np.max(data, axis=-1).astype(np.float32),
-            'min': np.min(data, axis=-1).astype(np.float32),
-            'rms': np.sqrt(np.mean(data**2, axis=-1)).astype(np.float32)
-        }
-        features['statistical'] = statistical_features
+        features = {name: self.extractors[name](data) for name in names}
         
-        print(f"      ✅ Extracted all features successfully")
+        if verbose:
+            print(f"      ✅ Extracted all features successfully")
         return features
 
     def save_features(self, features, output_path):
-        """Save features to compressed HDF5 file"""
+        """Save features to an HDF5 file in the storage layout (atomically via temp file + rename)"""
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
         print(f"      💾 Saving to: {os.path.basename(output_path)}")
         
-        with h5py.File(output_path, 'w') as f:
-            for feature_type, feature_data in features.items():
-                if isinstance(feature_data, dict):
-                    # Create group for nested features
-                    group = f.create_group(feature_type)
-                    for sub_feature, sub_data in feature_data.items():
-                        group.create_dataset(
-                            sub_feature, data=sub_data, 
-                            compression='gzip', compression_opts=6
+        # Write next to the target so a killed run never leaves a half-written .h5
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        try:
+            with h5py.File(tmp_path, 'w') as f:
+                for feature_type, feature_data in features.items():
+                    if isinstance(feature_data, dict):
+                        # Create group for nested features
+                        group = f.create_group(feature_type)
+                        for sub_feature, sub_data in feature_data.items():
+                            group.create_dataset(
+                                sub_feature, data=sub_data,
+                                **self.storage.dataset_kwargs(sub_data.shape, sub_data.dtype)
+                            )
+                    else:
+                        # Direct feature array
+                        f.create_dataset(
+                            feature_type, data=feature_data,
+                            **self.storage.dataset_kwargs(feature_data.shape, feature_data.dtype)
                         )
-                else:
-                    # Direct feature array
-                    f.create_dataset(
-                        feature_type, data=feature_data,
-                        compression='gzip', compression_opts=6
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def append_features(self, h5_file, features):
+        """Append a batch of epochs' features to resizable (epoch-major) datasets, creating them on first use"""
+        for feature_type, feature_data in features.items():
+            items = feature_data.items() if isinstance(feature_data, dict) else [(None, feature_data)]
+            for sub_feature, data in items:
+                name = f"{feature_type}/{sub_feature}" if sub_feature else feature_type
+                if name not in h5_file:
+                    h5_file.create_dataset(
+                        name, data=data, **self.storage.dataset_kwargs(data.shape, data.dtype, resizable=True)
                     )
+                else:
+                    dataset = h5_file[name]
+                    n = dataset.shape[0]
+                    dataset.resize(n + len(data), axis=0)
+                    dataset[n:] = data
+
+    def iter_epoch_batches(self, file_path):
+        """
+        Yield (n_epochs, channels, samples) arrays covering a whole recording. The block engine
+        streams from the EDF in bounded memory; the MNE engine yields all epochs at once.
+        """
+        if self.filter_engine == 'mne':
+            load_slot = _load_slots if _load_slots is not None else contextlib.nullcontext()
+            with load_slot:
+                raw = self.load_and_preprocess(file_path)
+                epochs = self.create_epochs(raw) if raw is not None else None
+                if epochs is None:
+                    raise RuntimeError("Preprocessing failed")
+                data = epochs.get_data()
+                del raw, epochs
+            yield data
+            return
+        
+        with EDFBlockReader(file_path) as reader:
+            print(f"      📊 Original: {reader.n_channels_total} ch, {reader.sfreq}Hz, {reader.duration:.1f}s")
+            stop = None
+            if self.max_duration is not None and reader.duration > self.max_duration:
+                stop = int(self.max_duration * reader.sfreq)
+                print(f"      ✂️ Cropped to {self.max_duration}s")
+            print(f"      🧠 Selected {len(reader.ch_names)} EEG channels ({reader.backend})")
+            
+            engine = BlockPreprocessingEngine(reader.sfreq, len(reader.ch_names), self.fs)
+            epoch_samples = int(round(self.epoch_length * self.fs))
+            assembler = EpochAssembler(len(reader.ch_names), epoch_samples,
+                                       max(1, int(round(epoch_samples * (1 - self.overlap)))))
+            
+            for block in engine.run(reader.blocks(self.block_seconds, stop=stop)):
+                epochs = assembler.push(block)
+                if len(epochs):
+                    yield epochs
+
+    def process_file_streaming(self, file_path, output_path):
+        """
+        Whole-recording pipeline in bounded memory: EDF blocks -> filter/resample ->
+        epochs -> features, appended to the HDF5 file as they complete.
+        Returns the epoch count or None on failure.
+        """
+        print(f"   📂 Streaming: {os.path.basename(file_path)}")
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        
+        try:
+            n_epochs = 0
+            with h5py.File(tmp_path, 'w') as f:
+                for epochs in self.iter_epoch_batches(file_path):
+                    self.append_features(f, self.extract_comprehensive_features(epochs, verbose=False))
+                    n_epochs += len(epochs)
+            
+            if n_epochs == 0:
+                print(f"      ❌ Recording too short for one {self.epoch_length}s epoch")
+                return None
+            os.replace(tmp_path, output_path)
+            print(f"      ✅ Streamed {n_epochs} epochs of {self.epoch_length}s to {os.path.basename(output_path)}")
+            return n_epochs
+        
+        except Exception as e:
+            print(f"      ❌ Failed to process {file_path}: {str(e)}")
+            return None
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def add_missing_features(self, file_path, output_path, names, chunk_epochs=256):
+        """
+        Compute only `names` and add them to an existing features file, replacing any stale
+        or partial copies. Epochs come from the stored raw_signals when present, otherwise
+        the recording is re-streamed. A copy is extended and renamed over the original, so a
+        killed run leaves the existing file intact. Returns the epoch count or None on failure.
+        """
+        print(f"   ➕ Adding {', '.join(names)} to {os.path.basename(output_path)}")
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        try:
+            shutil.copyfile(output_path, tmp_path)
+            with h5py.File(tmp_path, 'r+') as f:
+                for name in names:
+                    if name in f:
+                        del f[name]
+                
+                if 'raw_signals' in f:
+                    stored = f['raw_signals']
+                    n_epochs = stored.shape[0]
+                    for start in range(0, n_epochs, chunk_epochs):
+                        epochs = stored[start:start + chunk_epochs].astype(np.float64)
+                        self.append_features(f, self.extract_comprehensive_features(epochs, False, names))
+                else:
+                    n_epochs = 0
+                    for epochs in self.iter_epoch_batches(file_path):
+                        self.append_features(f, self.extract_comprehensive_features(epochs, False, names))
+                        n_epochs += len(epochs)
+            os.replace(tmp_path, output_path)
+            return n_epochs
+        
+        except Exception as e:
+            print(f"      ❌ Failed to add features to {output_path}: {str(e)}")
+            return None
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def update_file(self, file_path, output_path, missing=None):
+        """Full rebuild when missing is None, otherwise add just the missing features"""
+        if missing is None:
+            return self.process_file(file_path, output_path)
+        return self.add_missing_features(file_path, output_path, missing)
+
+    def process_file(self, file_path, output_path):
+        """Run the full pipeline on one EDF file, returns epoch count or None on failure"""
+        if self.filter_engine == 'blocks':
+            return self.process_file_streaming(file_path, output_path)
+        
+        # In pool workers only `max_loads` files may be preloaded at the same time
+        load_slot = _load_slots if _load_slots is not None else contextlib.nullcontext()
+        
+        with load_slot:
+            # Load and preprocess
+            raw = self.load_and_preprocess(file_path)
+            if raw is None:
+                return None
+            
+            # Create epochs
+            epochs = self.create_epochs(raw)
+            if epochs is None:
+                return None
+            
+            # Extract features
+            features = self.extract_comprehensive_features(epochs)
+            n_epochs = len(epochs)
+            
+            # Release the continuous recording before giving up the slot
+            del raw, epochs
+        
+        # Save features
+        self.save_features(features, output_path)
+        return n_epochs
 
     def process_all_files(self, data_dir='data/raw/comprehensive_1gb', 
-                         output_dir='data/processed/comprehensive_features'):
-        """Process all available EEG files"""
+                         output_dir='data/processed/comprehensive_features',
+                         num_workers=1, max_loads=None, force=False):
+        """
+        Process all available EEG files.
+        num_workers > 1 processes files in a process pool; max_loads caps how many
+        workers may hold a preloaded recording at once (defaults to num_workers).
+        Files whose input hash and parameters match the manifest are skipped
+        unless force=True; if only some selected features are missing (or were built
+        with other options) just those are computed and added to the existing file.
+        """
         
         print("🚀 Starting EEG preprocessing for your partial dataset...")
         
@@ -185,7 +387,7 @@ class FlexibleEEGPreprocessor:
         
         if not files:
             print(f"❌ No EDF files found in {data_dir}")
-            return
+            return 0, 0
         
         print(f"\n🔄 Processing {len(files)} EEG files...")
         os.makedirs(output_dir, exist_ok=True)
@@ -194,43 +396,81 @@ class FlexibleEEGPreprocessor:
         total_epochs = 0
         failed_files = []
         
-        for i, filename in enumerate(files, 1):
+        # Check the cache manifest: skip files whose input and parameters are unchanged
+        manifest_path = manifest_path_for(output_dir)
+        manifest = load_manifest(manifest_path)
+        manifest.setdefault('files', {})
+        params = self.cache_params()
+        cache_hits = 0
+        
+        jobs = []
+        extended = 0
+        fingerprints = {}
+        for filename in files:
             file_path = os.path.join(data_dir, filename)
+            base_name = os.path.splitext(filename)[0]
+            output_path = os.path.join(output_dir, f'{base_name}_features.h5')
             
-            print(f"\n📄 [{i}/{len(files)}] Processing: {filename}")
-            
-            # Load and preprocess
-            raw = self.load_and_preprocess(file_path)
-            if raw is None:
-                failed_files.append(filename)
-                continue
+            cached = manifest['files'].get(filename)
+            fingerprint = self._input_fingerprint(file_path, cached)
+            fingerprints[filename] = fingerprint
             
-            # Create epochs
-            epochs = self.create_epochs(raw)
-            if epochs is None:
+            missing = None  # None: rebuild the whole file
+            if (not force and cached
+                    and cached.get('sha256') == fingerprint['sha256']
+                    and cached.get('params') == params
+                    and os.path.exists(output_path)):
+                stored = cached.get('features', {})
+                missing = [name for name, options in self.feature_params().items() if stored.get(name) != options]
+                if not missing:
+                    cache_hits += 1
+                    processed_count += 1
+                    total_epochs += cached['n_epochs']
+                    continue
+                extended += 1
+            jobs.append((filename, file_path, output_path, missing))
+        
+        print(f"   🗂️ Cache: {cache_hits} up to date, {extended} to extend, {len(jobs) - extended} to (re)build")
+        
+        if not jobs:
+            results = []
+        elif num_workers > 1:
+            results = self._process_parallel(jobs, num_workers, max_loads)
+        else:
+            results = self._process_serial(jobs)
+        
+        job_missing = {filename: missing for filename, _, _, missing in jobs}
+        for filename, n_epochs in results:
+            if n_epochs is None:
                 failed_files.append(filename)
+                manifest['files'].pop(filename, None)
+                save_manifest(manifest, manifest_path)
                 continue
-            
-            # Extract features
-            features = self.extract_comprehensive_features(epochs)
-            
-            # Save features
-            base_name = os.path.splitext(filename)[0]
-            output_path = os.path.join(output_dir, f'{base_name}_features.h5')
-            self.save_features(features, output_path)
-            
             processed_count += 1
-            total_epochs += len(epochs)
-            
-            # Clear memory
-            del raw, epochs, features
+            total_epochs += n_epochs
+            missing = job_missing[filename]
+            # Features already in an extended file stay recorded alongside the new ones
+            stored = {} if missing is None else dict(manifest['files'][filename].get('features', {}))
+            stored.update(self.feature_params(missing))
+            manifest['files'][filename] = dict(
+                fingerprints[filename], params=params, n_epochs=n_epochs, features=stored,
+                output=f'{os.path.splitext(filename)[0]}_features.h5'
+            )
+            # Record each finished file right away so a killed run keeps its progress
+            save_manifest(manifest, manifest_path)
+        
+        # Forget files that are no longer in the input directory
+        for filename in set(manifest['files']) - set(files):
+            del manifest['files'][filename]
+        save_manifest(manifest, manifest_path)
         
         # Summary
         print(f"\n🎉 Processing Complete!")
         print(f"   📊 Successfully processed: {processed_count}/{len(files)} files")
+        print(f"   🗂️ Cache hits: {cache_hits} | Cache misses: {len(jobs)}")
         print(f"   🧠 Total epochs generated: {total_epochs}")
         print(f"   💾 Features saved to: {output_dir}")
-        print(f"   📈 Average epochs per file: {total_epochs/processed_count:.1f}")
+        print(f"   📈 Average epochs per file: {total_epochs / max(processed_count, 1):.1f}")
         
         if failed_files:
             print(f"   ⚠️ Failed files ({len(failed_files)}):")
@@ -240,6 +480,43 @@ class FlexibleEEGPreprocessor:
         print(f"\n🎯 Dataset ready for RTX 4050 training!")
         return processed_count, total_epochs
 
+    def _process_serial(self, jobs):
+        """Process files one after another in this process"""
+        for i, (filename, file_path, output_path, missing) in enumerate(jobs, 1):
+            print(f"\n📄 [{i}/{len(jobs)}] Processing: {filename}")
+            yield filename, self.update_file(file_path, output_path, missing)
+
+    def _process_parallel(self, jobs, num_workers, max_loads=None):
+        """Process files independently in a pool of worker processes"""
+        num_workers = min(num_workers, len(jobs))
+        max_loads = max(1, min(max_loads or num_workers, num_workers))
+        print(f"   ⚙️ Using {num_workers} worker processes ({max_loads} concurrent loads)")
+        
+        # Spawned workers: max_tasks_per_child is not supported with fork
+        ctx = mp.get_context('spawn')
+        load_slots = ctx.Semaphore(max_loads)
+        
+        # One task per child so each worker returns its memory to the OS between files
+        # (max_tasks_per_child needs Python 3.11; older versions reuse workers)
+        recycle = {'max_tasks_per_child': 1} if sys.version_info >= (3, 11) else {}
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=ctx,
+                                 initializer=_init_worker, initargs=(load_slots,),
+                                 **recycle) as executor:
+            futures = {
+                executor.submit(self.update_file, file_path, output_path, missing): filename
+                for filename, file_path, output_path, missing in jobs
+            }
+            for i, future in enumerate(as_completed(futures), 1):
+                filename = futures[future]
+                try:
+                    n_epochs = future.result()
+                except Exception as e:
+                    print(f"      ❌ Worker failed on {filename}: {str(e)}")
+                    n_epochs = None
+                status = "✅" if n_epochs is not None else "❌"
+                print(f"\n{status} [{i}/{len(jobs)}] Finished: {filename}")
+                yield filename, n_epochs
+
 def verify_processed_features(feature_dir='data/processed/comprehensive_features'):
     """Verify the processed features"""
     if not os.path.exists(feature_dir):
@@ -280,11 +557,54 @@ def verify_processed_features(feature_dir='data/processed/comprehensive_features
     print(f"   ✅ Ready for model training!")
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Preprocess EDF recordings into HDF5 features")
+    parser.add_argument('--data-dir', default='data/raw/comprehensive_1gb')
+    parser.add_argument('--output-dir', default='data/processed/comprehensive_features')
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes (files are processed independently)")
+    parser.add_argument('--max-loads', type=int, default=None,
+                        help="Max recordings preloaded in memory at once (default: workers)")
+    parser.add_argument('--force', action='store_true',
+                        help="Ignore the cache manifest and reprocess every file")
+    parser.add_argument('--filter-engine', choices=['blocks', 'mne'], default='blocks',
+                        help="Block-wise SOS + polyphase engine, or MNE whole-recording filtering")
+    parser.add_argument('--block-seconds', type=float, default=60,
+                        help="Block size for the block filter engine")
+    parser.add_argument('--features', nargs='+', default=DEFAULT_FEATURES,
+                        choices=list(FEATURE_EXTRACTORS) + ['all'],
+                        help="Feature extractors to run; missing ones are added to existing files")
+    parser.add_argument('--spectral-method', choices=['periodogram', 'welch'], default='periodogram',
+                        help="Power spectrum used for band powers")
+    parser.add_argument('--spectral-extras', action='store_true',
+                        help="Also store relative band power and spectral entropy")
+    parser.add_argument('--statistical-extras', action='store_true',
+                        help="Also store skewness, kurtosis, zero-crossings and Hjorth parameters")
+    parser.add_argument('--codec', choices=CODECS, default='gzip',
+                        help="HDF5 compression (blosc / zstd need hdf5plugin)")
+    parser.add_argument('--compression-level', type=int, default=None,
+                        help="Codec level (default: gzip 1, blosc 5, zstd 3)")
+    parser.add_argument('--shuffle', action=argparse.BooleanOptionalAction, default=True,
+                        help="HDF5 byte-shuffle filter before compression")
+    parser.add_argument('--chunking', choices=CHUNKINGS, default='epoch',
+                        help="One chunk per epoch (fast per-epoch reads) or h5py's automatic chunks")
+    parser.add_argument('--max-duration', type=float, default=None,
+                        help="Crop recordings to this many seconds (default: whole recording)")
+    args = parser.parse_args()
+    
     # Run preprocessing
-    preprocessor = FlexibleEEGPreprocessor()
-    processed, epochs = preprocessor.process_all_files()
+    preprocessor = FlexibleEEGPreprocessor(max_duration=args.max_duration, filter_engine=args.filter_engine,
+                                           block_seconds=args.block_seconds, features=args.features,
+                                           spectral_method=args.spectral_method,
+                                           spectral_extras=args.spectral_extras,
+                                           statistical_extras=args.statistical_extras,
+                                           storage=StorageLayout(args.codec, args.compression_level,
+                                                                 args.shuffle, args.chunking))
+    processed, epochs = preprocessor.process_all_files(
+        args.data_dir, args.output_dir,
+        num_workers=args.workers, max_loads=args.max_loads, force=args.force
+    )
     
     # Verify results
-    verify_processed_features()
+    verify_processed_features(args.output_dir)
     
     print(f"\n🚀 Next step: Start building your EEG-to-text models!")
@@ -0,0 +1,71 @@
+import numpy as np
+
+try:
+    import hdf5plugin  # Registers the Blosc / Zstd HDF5 filters (optional)
+except ImportError:
+    hdf5plugin = None
+
+CODECS = ['none', 'lzf', 'gzip', 'blosc', 'zstd']
+CHUNKINGS = ['epoch', 'auto']
+DEFAULT_LEVELS = {'gzip': 1, 'blosc': 5, 'zstd': 3}
+
+# 'epoch' chunking groups small per-epoch features up to about this many bytes per chunk;
+# a raw (channels, time) epoch is larger and gets a chunk of its own
+TARGET_CHUNK_BYTES = 64 * 1024
+
+class StorageLayout:
+    """
+    How feature datasets are laid out in HDF5: compression codec and level, the shuffle
+    filter, and chunking. 'epoch' chunks are (k, *epoch_shape) so reading one epoch
+    decompresses one chunk; 'auto' leaves the chunk shape to h5py.
+    blosc (lz4, with its own byte shuffle) and zstd need hdf5plugin, for writing and reading.
+    The default (gzip-1 + shuffle, per-epoch chunks) beat the old gzip-6 / automatic chunks on
+    size, write and read time for our float32 epochs (benchmark_storage.py).
+    """
+
+    def __init__(self, codec='gzip', level=None, shuffle=True, chunking='epoch'):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec} (choose from {CODECS})")
+        if chunking not in CHUNKINGS:
+            raise ValueError(f"Unknown chunking: {chunking} (choose from {CHUNKINGS})")
+        if codec in ('blosc', 'zstd') and hdf5plugin is None:
+            raise ImportError(f"The '{codec}' codec needs hdf5plugin (pip install hdf5plugin)")
+        self.codec = codec
+        self.level = DEFAULT_LEVELS.get(codec) if level is None else level
+        self.shuffle = shuffle
+        self.chunking = chunking
+
+    def __repr__(self):
+        codec = self.codec if self.level is None or self.codec == 'lzf' else f"{self.codec}-{self.level}"
+        return f"{codec}{'+shuffle' if self.shuffle else ''}/{self.chunking}"
+
+    def _filters(self):
+        if self.codec == 'none':
+            return {}
+        if self.codec == 'lzf':
+            return {'compression': 'lzf', 'shuffle': self.shuffle}
+        if self.codec == 'gzip':
+            return {'compression': 'gzip', 'compression_opts': self.level, 'shuffle': self.shuffle}
+        if self.codec == 'blosc':
+            shuffle = hdf5plugin.Blosc.SHUFFLE if self.shuffle else hdf5plugin.Blosc.NOSHUFFLE
+            return dict(hdf5plugin.Blosc(cname='lz4', clevel=self.level, shuffle=shuffle))
+        return dict(hdf5plugin.Zstd(clevel=self.level), shuffle=self.shuffle)
+
+    def chunk_shape(self, shape, dtype, resizable=False):
+        """(k, *epoch_shape) with k epochs filling about TARGET_CHUNK_BYTES (at least one)"""
+        epoch_bytes = int(np.prod(shape[1:], dtype=np.int64)) * np.dtype(dtype).itemsize
+        k = max(1, TARGET_CHUNK_BYTES // max(1, epoch_bytes))
+        if not resizable:
+            k = min(k, max(1, shape[0]))
+        return (k,) + tuple(shape[1:])
+
+    def dataset_kwargs(self, shape, dtype, resizable=False):
+        """Keyword arguments for h5py create_dataset; resizable datasets grow along epochs"""
+        kwargs = self._filters()
+        if resizable:
+            kwargs['maxshape'] = (None,) + tuple(shape[1:])
+        if self.chunking == 'epoch' and len(shape) > 0 and shape[0] > 0:
+            kwargs['chunks'] = self.chunk_shape(shape, dtype, resizable)
+        elif kwargs or resizable:
+            kwargs['chunks'] = True  # Filters and resizing need chunked storage
+        return kwargs
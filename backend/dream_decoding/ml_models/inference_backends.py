@@ -0,0 +1,129 @@
+import os
+import json
+import numpy as np
+import torch
+
+from eeg_to_text_model import EEGToTextModel
+from dream_tokenizer import DreamTokenizer
+from model_export import METADATA_FILE, ScriptedEEGToTextModel, is_torchscript_artifact
+
+try:
+    import onnxruntime as ort
+except ImportError:  # Optional: only needed for the 'onnx' backend
+    ort = None
+
+BACKENDS = ['eager', 'torchscript', 'onnx']
+
+def _tokenizer_from(data):
+    return DreamTokenizer.from_dict(data) if data else None
+
+def load_eager(model_path, device, max_channels=19, max_timepoints=3000):
+    """Eager EEGToTextModel from a training checkpoint; returns (model, tokenizer)"""
+    checkpoint = torch.load(model_path, map_location=device)
+
+    # Checkpoints with a vocabulary carry the model config it was sized for
+    if 'tokenizer' in checkpoint:
+        tokenizer = DreamTokenizer.from_dict(checkpoint['tokenizer'])
+        model = EEGToTextModel(**checkpoint['model_config'])
+    else:
+        tokenizer = None
+        model = EEGToTextModel(input_channels=max_channels, input_length=max_timepoints)
+    model.load_state_dict(checkpoint['model_state_dict'])
+    return model.to(device).eval(), tokenizer
+
+def load_torchscript(model_path, device):
+    """TorchScript artifact from model_export.export_torchscript; returns (model, tokenizer)"""
+    model = ScriptedEEGToTextModel.load(model_path, device).eval()
+    return model, _tokenizer_from(model.metadata.get('tokenizer'))
+
+class OnnxEEGToTextModel:
+    """
+    EEGToTextModel.generate on ONNX Runtime sessions (model_export.export_onnx graphs).
+    Tensors cross into numpy at the session boundary; the decoding loop is shared with eager.
+    """
+
+    generate = EEGToTextModel.generate
+    _beam_search = EEGToTextModel._beam_search
+    _buffer = staticmethod(EEGToTextModel._buffer)
+
+    def __init__(self, model_dir, num_threads=None, providers=('CPUExecutionProvider',)):
+        if ort is None:
+            raise ImportError("The 'onnx' backend needs onnxruntime (pip install onnxruntime)")
+        with open(os.path.join(model_dir, METADATA_FILE), 'r') as f:
+            self.metadata = json.load(f)
+        self.config = self.metadata['model_config']
+        self.vocab_size = self.config['vocab_size']
+        self.max_seq_len = self.config['max_seq_len']
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        def session(filename):
+            return ort.InferenceSession(os.path.join(model_dir, filename), options, providers=list(providers))
+
+        self.encoder = session('encoder.onnx')
+        self.decoder_step = session('decoder_step.onnx')
+        self.scorer = session('score_tokens.onnx')
+
+    @staticmethod
+    def _np(tensor):
+        return np.ascontiguousarray(tensor.detach().cpu().numpy())
+
+    def encode(self, eeg):
+        h, c = self.encoder.run(None, {'eeg': self._np(eeg.float())})
+        return torch.from_numpy(h), torch.from_numpy(c)
+
+    def _decode_step(self, input_token, hidden):
+        h, c = hidden
+        logits, h, c = self.decoder_step.run(None, {
+            'input_token': self._np(input_token), 'h': self._np(h), 'c': self._np(c),
+        })
+        return torch.from_numpy(logits), (torch.from_numpy(h), torch.from_numpy(c))
+
+    def score_tokens(self, hidden, tokens):
+        h, c = hidden
+        (logits,) = self.scorer.run(None, {'h': self._np(h), 'c': self._np(c), 'tokens': self._np(tokens)})
+        return torch.from_numpy(logits)
+
+    def to(self, device):
+        if torch.device(device).type != 'cpu':
+            raise ValueError("The 'onnx' backend runs on the CPU execution provider only")
+        return self
+
+    def eval(self):
+        return self
+
+def load_onnx(model_dir, num_threads=None):
+    model = OnnxEEGToTextModel(model_dir, num_threads)
+    return model, _tokenizer_from(model.metadata.get('tokenizer'))
+
+def detect_backend(model_path):
+    """Pick the backend from what model_path is: ONNX export dir, TorchScript artifact or checkpoint"""
+    if os.path.isdir(model_path) and os.path.exists(os.path.join(model_path, 'encoder.onnx')):
+        return 'onnx'
+    if is_torchscript_artifact(model_path):
+        return 'torchscript'
+    return 'eager'
+
+def load_backend(backend, model_path, device, max_channels=19, max_timepoints=3000, num_threads=None):
+    """
+    Load model_path with the given backend ('eager', 'torchscript', 'onnx' or 'auto').
+    Returns (model, tokenizer, backend); model exposes generate(), max_seq_len and vocab_size.
+    num_threads sizes the ONNX Runtime session, or torch's (process-wide) intra-op pool
+    for the eager and TorchScript backends.
+    """
+    if backend == 'auto':
+        backend = detect_backend(model_path)
+    if num_threads is not None and backend in ('eager', 'torchscript'):
+        torch.set_num_threads(num_threads)
+    if backend == 'eager':
+        model, tokenizer = load_eager(model_path, device, max_channels, max_timepoints)
+    elif backend == 'torchscript':
+        model, tokenizer = load_torchscript(model_path, device)
+    elif backend == 'onnx':
+        model, tokenizer = load_onnx(model_path, num_threads)
+    else:
+        raise ValueError(f"Unknown inference backend: {backend} (expected one of {BACKENDS} or 'auto')")
+    return model, tokenizer, backend
@@ -1,10 +1,20 @@
 import torch
 import torch.nn.functional as F
 import numpy as np
-from eeg_to_text_model import EEGToTextModel
+from eeg_to_text_model import END_TOKEN
+from eeg_normalization import normalize_epochs
+from inference_logging import logger, LazyStats, configure_inference_logging
+from inference_backends import BACKENDS, load_backend, detect_backend
+import argparse
+import logging
 import h5py
 import os
 
+try:
+    import hdf5plugin  # Reads feature files written with the blosc / zstd codecs (hdf5_storage)
+except ImportError:
+    hdf5plugin = None
+
 class EEGDreamInference:
     """
     EEG Dream Decoding Inference Engine - CONFIDENCE FIXED VERSION
@@ -12,46 +22,47 @@ class EEGDreamInference:
 
     def __init__(self, model_path='models/eeg_text_best.pth',
                  feature_dir='data/processed/comprehensive_features',
-                 device=None, max_channels=19, max_timepoints=3000):
+                 device=None, max_channels=19, max_timepoints=3000,
+                 decoding='greedy', beam_size=4, top_k=10, temperature=1.0,
+                 backend='auto', num_threads=None, batch_size=64):
         self.device = device if device else torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        self.model = EEGToTextModel(input_channels=max_channels, input_length=max_timepoints)
-        checkpoint = torch.load(model_path, map_location=self.device)
-        self.model.load_state_dict(checkpoint['model_state_dict'])
-        self.model.to(self.device)
-        self.model.eval()
+        
+        # Engine: 'eager' checkpoint, 'torchscript' / 'onnx' exports (model_export.py), or 'auto' by path
+        if backend == 'auto':
+            backend = detect_backend(model_path)
+        if backend == 'onnx':
+            self.device = torch.device('cpu')  # CPU execution provider
+        self.model, self.tokenizer, self.backend = load_backend(
+            backend, model_path, self.device, max_channels, max_timepoints, num_threads
+        )
         self.feature_dir = feature_dir
         self.max_channels = max_channels
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+        # Epochs per forward pass in predict_from_file / batch_inference
+        self.batch_size = batch_size
         self.max_timepoints = max_timepoints
+        
+        # Decoding config passed to EEGToTextModel.generate ('greedy', 'beam' or 'top_k')
+        self.generation = {
+            'strategy': decoding,
+            'beam_size': beam_size,
+            'top_k': top_k,
+            'temperature': temperature,
+        }
+        self._tokens_buffer = None
+        self._logits_buffer = None
 
-        print(f"🧠 Model loaded successfully on {self.device}")
-
-    def _normalize_sample(self, sample):
-        sample = (sample - np.mean(sample)) / (np.std(sample) + 1e-8)
-        return sample.astype(np.float32)
-
-    def _prepare_eeg_tensor(self, sample):
-        if isinstance(sample, tuple):
-            sample = sample[0]
-        if not isinstance(sample, np.ndarray):
-            sample = np.array(sample)
-        ch, t = sample.shape
-        if ch < self.max_channels:
-            padded = np.zeros((self.max_channels, t), dtype=np.float32)
-            padded[:ch,:] = sample
-            sample = padded
-        elif ch > self.max_channels:
-            sample = sample[:self.max_channels,:]
-        if t < self.max_timepoints:
-            padded = np.zeros((self.max_channels, self.max_timepoints), dtype=np.float32)
-            padded[:,:t] = sample
-            sample = padded
-        elif t > self.max_timepoints:
-            sample = sample[:,:self.max_timepoints]
-        sample = self._normalize_sample(sample)
-        return torch.tensor(sample).unsqueeze(0)
+        logger.info("🧠 Model loaded successfully on %s (%s backend)", self.device, self.backend,
+                    extra={'event': 'model_loaded',
+                           'fields': {'device': str(self.device), 'backend': self.backend}})
 
     def _tokens_to_text(self, token_sequence):
         """Convert tokens to readable English dream text"""
+        if self.tokenizer is not None:
+            return self.tokenizer.decode(token_sequence) or "silent dream"
+        
+        # Legacy checkpoints without a vocabulary: fixed word list
         dream_words = [
             "pad", "start", "end", "dream", "sleep", "rest", "wake", "night", "day", "mind",
             "brain", "think", "feel", "see", "hear", "touch", "move", "walk", "run", "fly",
@@ -74,136 +85,192 @@ class EEGDreamInference:
         
         return " ".join(words) if words else "silent dream"
 
-    def _calculate_confidence(self, logits, temperature=2.0):
-        """FIXED: Calculate confidence with temperature scaling and multiple methods"""
-        print(f"🔍 DEBUG: Raw logits stats - min: {logits.min().item():.4f}, max: {logits.max().item():.4f}, mean: {logits.mean().item():.4f}")
+    def _calculate_batch_confidence(self, logits, lengths, temperature=2.0):
+        """
+        Per-sample confidence with temperature scaling and multiple methods,
+        computed over each sequence's decoded steps (up to and including END).
+        """
+        steps = logits.size(1)
+        mask = torch.arange(steps, device=logits.device).unsqueeze(0) < lengths.unsqueeze(1)
+        n_steps = lengths.to(logits.dtype)
         
         # Method 1: Temperature-scaled softmax (prevents extreme values)
-        temp_scaled_logits = logits / temperature
-        probabilities = torch.softmax(temp_scaled_logits, dim=-1)
-        max_prob = probabilities.max().item()
-        
-        # Method 2: Raw softmax confidence  
-        raw_probabilities = torch.softmax(logits, dim=-1)
-        raw_max_prob = raw_probabilities.max().item()
+        probabilities = torch.softmax(logits / temperature, dim=-1)
+        max_prob = probabilities.amax(dim=-1).masked_fill(~mask, 0).amax(dim=1)
         
         # Method 3: Entropy-based confidence (lower entropy = higher confidence)
-        entropy = -torch.sum(probabilities * torch.log(probabilities + 1e-8), dim=-1).mean().item()
-        entropy_confidence = np.exp(-entropy)  # Convert to confidence score
+        entropy = -torch.sum(probabilities * torch.log(probabilities + 1e-8), dim=-1)
+        entropy_confidence = torch.exp(-(entropy * mask).sum(dim=1) / n_steps)
         
         # Method 4: Top-2 difference confidence
         top2_probs, _ = torch.topk(probabilities, 2, dim=-1)
-        top2_diff = (top2_probs[:, :, 0] - top2_probs[:, :, 1]).mean().item()
+        top2_diff = ((top2_probs[..., 0] - top2_probs[..., 1]) * mask).sum(dim=1) / n_steps
         
-        print(f"🔍 Confidence Methods:")
-        print(f"   Temperature-scaled: {max_prob:.6f}")
-        print(f"   Raw softmax: {raw_max_prob:.6f}")
-        print(f"   Entropy-based: {entropy_confidence:.6f}")
-        print(f"   Top-2 difference: {top2_diff:.6f}")
+        if logger.isEnabledFor(logging.DEBUG):
+            # Method 2: Raw softmax confidence (diagnostic only, computed if the record is emitted)
+            logits_stats = LazyStats(logits, raw_softmax=lambda t: torch.softmax(t, dim=-1).max().item())
+            methods = {
+                'temperature_scaled': LazyStats(max_prob),
+                'entropy_based': LazyStats(entropy_confidence),
+                'top2_difference': LazyStats(top2_diff),
+            }
+            logger.debug("🔍 Batch logits stats - %s", logits_stats,
+                         extra={'event': 'logits_stats', 'fields': {'logits': logits_stats}})
+            logger.debug("🔍 Confidence methods - %s", methods,
+                         extra={'event': 'confidence_methods', 'fields': methods})
         
         # Return the most reasonable confidence score
-        final_confidence = max(max_prob, entropy_confidence, top2_diff)
-        return final_confidence, probabilities
+        return torch.maximum(torch.maximum(max_prob, entropy_confidence), top2_diff)
 
-    def predict_from_eeg(self, eeg_sample):
-        """Generate dream text from EEG sample with proper confidence"""
-        tensor = self._prepare_eeg_tensor(eeg_sample).to(self.device)
+    def _logits_stats(self, logits, lengths):
+        """Per-sample min/max/mean/std of the logits over the decoded steps"""
+        steps, vocab = logits.size(1), logits.size(2)
+        mask = (torch.arange(steps, device=logits.device).unsqueeze(0) < lengths.unsqueeze(1)).unsqueeze(-1)
+        count = lengths.to(logits.dtype) * vocab
+        
+        mean = (logits * mask).sum(dim=(1, 2)) / count
+        var = (((logits - mean.view(-1, 1, 1)) ** 2) * mask).sum(dim=(1, 2)) / (count - 1).clamp(min=1)
+        return torch.stack([
+            logits.masked_fill(~mask, float('inf')).amin(dim=(1, 2)),
+            logits.masked_fill(~mask, float('-inf')).amax(dim=(1, 2)),
+            mean,
+            var.sqrt(),
+        ], dim=1)
+
+    def _generation_buffers(self, batch_size):
+        """Token/logit buffers reused across batches (grown when a larger batch arrives)"""
+        max_length = self.model.max_seq_len
+        if self._tokens_buffer is None or self._tokens_buffer.size(0) < batch_size:
+            self._tokens_buffer = torch.empty(batch_size, max_length, dtype=torch.long, device=self.device)
+            self._logits_buffer = torch.empty(batch_size, max_length, self.model.vocab_size, device=self.device)
+        return self._tokens_buffer, self._logits_buffer
+
+    def predict_batch(self, samples, out=None):
+        """
+        Generate dream texts for a batch of epochs (epochs, channels, time)
+        with one encoder pass, early-stopping decoding and one device->host transfer.
+        out: optional preallocated float32 (epochs, max_channels, max_timepoints) buffer.
+        """
+        batch = normalize_epochs(samples, self.max_channels, self.max_timepoints, out=out)
+        tensor = torch.from_numpy(batch).to(self.device)
+        tokens_out, logits_out = self._generation_buffers(len(batch))
         
         with torch.no_grad():
-            logits = self.model(tensor)
-            print(f"🔍 DEBUG logits.shape = {logits.shape}")
-            
-            # FIXED: Calculate confidence properly
-            confidence, probabilities = self._calculate_confidence(logits)
-            
-            # Get predictions
-            if logits.dim() == 3:
-                pred_tokens = torch.argmax(logits, dim=-1).squeeze(0)
-            elif logits.dim() == 2:
-                pred_tokens = torch.argmax(logits, dim=-1)
-            else:
-                pred_tokens = torch.argmax(logits.view(-1, logits.size(-1)), dim=-1)
+            pred_tokens, logits = self.model.generate(
+                tensor, tokens_out=tokens_out, logits_out=logits_out, **self.generation
+            )
+            logger.debug("🔍 logits.shape = %s", tuple(logits.shape),
+                         extra={'event': 'logits_shape', 'fields': {'shape': list(logits.shape)}})
             
-            pred_tokens = pred_tokens.cpu().numpy().flatten()
-            dream_text = self._tokens_to_text(pred_tokens)
+            # Decoded length per sample: up to and including the first END token
+            is_end = pred_tokens == END_TOKEN
+            lengths = torch.where(is_end.any(dim=1), is_end.int().argmax(dim=1) + 1,
+                                  torch.full_like(is_end[:, 0], logits.size(1), dtype=torch.long))
             
-            return {
-                "dream_text": dream_text,
-                "tokens": pred_tokens.tolist(),
-                "confidence": confidence,
+            confidence = self._calculate_batch_confidence(logits, lengths)
+            stats = self._logits_stats(logits, lengths)
+        
+        confidence = confidence.cpu().numpy()
+        pred_tokens = pred_tokens.cpu().numpy()
+        stats = stats.cpu().numpy()
+        
+        results = []
+        for i in range(len(batch)):
+            tokens = pred_tokens[i]
+            results.append({
+                "dream_text": self._tokens_to_text(tokens),
+                "tokens": tokens.tolist(),
+                "confidence": float(confidence[i]),
                 "logits_stats": {
-                    "min": logits.min().item(),
-                    "max": logits.max().item(), 
-                    "mean": logits.mean().item(),
-                    "std": logits.std().item()
+                    "min": float(stats[i, 0]),
+                    "max": float(stats[i, 1]),
+                    "mean": float(stats[i, 2]),
+                    "std": float(stats[i, 3])
                 }
-            }
+            })
+        return results
 
-    def predict_from_file(self, feature_file):
-        """Generate predictions from feature file"""
+    def predict_from_eeg(self, eeg_sample):
+        """Generate dream text from one EEG sample (channels, time) with proper confidence"""
+        if isinstance(eeg_sample, tuple):
+            eeg_sample = eeg_sample[0]
+        return self.predict_batch(np.asarray(eeg_sample)[np.newaxis])[0]
+
+    def predict_from_file(self, feature_file, batch_size=None):
+        """Generate predictions from feature file, batch_size epochs per forward pass (default: the engine's)"""
+        batch_size = batch_size or self.batch_size
         file_path = os.path.join(self.feature_dir, feature_file)
-        print(f"📄 Loading EEG data from: {feature_file}")
+        logger.info("📄 Loading EEG data from: %s", feature_file,
+                    extra={'event': 'file_start', 'fields': {'file': feature_file}})
         
         with h5py.File(file_path, 'r') as f:
             if 'raw_signals' not in f:
                 raise KeyError("'raw_signals' dataset not found in HDF5 file")
             raw_signals = f['raw_signals'][:]
-            print(f"🔍 raw_signals type: {type(raw_signals)}")
-            print(f"🔍 raw_signals shape: {raw_signals.shape}")
-            print(f"🔍 raw_signals dtype: {raw_signals.dtype}")
-            print(f" 🧠 Found {raw_signals.shape[0]} epochs")
+            logger.debug("🔍 raw_signals shape: %s, dtype: %s", raw_signals.shape, raw_signals.dtype,
+                         extra={'event': 'raw_signals', 'fields': {
+                             'shape': list(raw_signals.shape), 'dtype': str(raw_signals.dtype)}})
         
         predictions = []
+        n_epochs = int(raw_signals.shape[0])
         
-        # FIXED: Use shape instead of shape
-        for epoch_i in range(int(raw_signals.shape[0])):
-            sample = raw_signals[epoch_i]
-            print(f"🔍 Epoch {epoch_i} sample type: {type(sample)}")
-            
-            if hasattr(sample, 'shape'):
-                print(f"🔍 Epoch {epoch_i} sample shape: {sample.shape}")
-            
+        # One normalization buffer reused by every batch of this file
+        buffer = np.empty((min(batch_size, n_epochs), self.max_channels, self.max_timepoints), dtype=np.float32)
+        
+        for start in range(0, n_epochs, batch_size):
+            stop = min(start + batch_size, n_epochs)
             try:
-                result = self.predict_from_eeg(sample)
+                results = self.predict_batch(raw_signals[start:stop], out=buffer[:stop - start])
+            except Exception as e:
+                logger.error("❌ Error processing epochs %d-%d: %s", start, stop - 1, e,
+                             extra={'event': 'batch_error', 'fields': {
+                                 'file': feature_file, 'start': start, 'stop': stop, 'error': str(e)}})
+                continue
+            
+            for epoch_i, result in enumerate(results, start):
                 result['epoch'] = epoch_i
                 result['file'] = feature_file
                 predictions.append(result)
-                print(f"✅ Epoch {epoch_i} SUCCESS: confidence = {result['confidence']:.6f}")
-            except Exception as e:
-                print(f"❌ Error processing epoch {epoch_i}: {e}")
-                continue
+            logger.debug("✅ Epochs %d-%d SUCCESS", start, stop - 1,
+                         extra={'event': 'batch_done', 'fields': {
+                             'file': feature_file, 'start': start, 'stop': stop}})
         
         return predictions
 
-    def batch_inference(self, max_files=3):
-        """Run inference on multiple files"""
+    def batch_inference(self, max_files=3, batch_size=None):
+        """Run inference on multiple files, batch_size epochs per forward pass (default: the engine's)"""
         feature_files = [f for f in os.listdir(self.feature_dir) if f.endswith('.h5')]
         
         if not feature_files:
-            print("❌ No feature files found!")
+            logger.error("❌ No feature files found!")
             return []
         
         files_to_process = feature_files[:max_files]
-        print(f"🔄 Running batch inference on {len(files_to_process)} files...")
+        logger.info("🔄 Running batch inference on %d files...", len(files_to_process))
         
         all_predictions = []
         
         for i, feature_file in enumerate(files_to_process, 1):
-            print(f"\n📄 [{i}/{len(files_to_process)}] Processing: {feature_file}")
+            logger.info("📄 [%d/%d] Processing: %s", i, len(files_to_process), feature_file)
             
             try:
-                preds = self.predict_from_file(feature_file)
+                preds = self.predict_from_file(feature_file, batch_size)
                 all_predictions.extend(preds)
                 
                 if preds:
-                    print(f" ✅ Generated {len(preds)} predictions")
+                    logger.info(" ✅ Generated %d predictions", len(preds),
+                                extra={'event': 'file_done', 'fields': {
+                                    'file': feature_file, 'predictions': len(preds)}})
                     for p in preds[:2]:
-                        print(f" Epoch {p['epoch']}: '{p['dream_text'][:50]}...' (conf: {p['confidence']:.6f})")
+                        logger.debug(" Epoch %d: '%s...' (conf: %.6f)",
+                                     p['epoch'], p['dream_text'][:50], p['confidence'])
                 else:
-                    print(" ⚠️ No predictions generated")
+                    logger.warning(" ⚠️ No predictions generated for %s", feature_file)
                     
             except Exception as e:
-                print(f" ❌ Error in {feature_file}: {e}")
+                logger.error(" ❌ Error in %s: %s", feature_file, e,
+                             extra={'event': 'file_error', 'fields': {
+                                 'file': feature_file, 'error': str(e)}})
                 continue
         
         return all_predictions
@@ -231,10 +298,29 @@ class EEGDreamInference:
 
 def main():
     """Main inference function"""
+    parser = argparse.ArgumentParser(description="EEG dream decoding inference")
+    parser.add_argument('--log-level', default='INFO',
+                        help="DEBUG adds per-batch diagnostics; WARNING keeps only errors")
+    parser.add_argument('--log-sample', type=int, default=1,
+                        help="Keep one of every N debug records per event")
+    parser.add_argument('--log-json', action='store_true',
+                        help="Emit structured JSON log records")
+    parser.add_argument('--model', default='models/eeg_text_best.pth',
+                        help="Training checkpoint, TorchScript artifact or ONNX directory from model_export.py")
+    parser.add_argument('--backend', choices=['auto'] + BACKENDS, default='auto',
+                        help="Inference engine (auto: chosen from --model)")
+    parser.add_argument('--decoding', choices=['greedy', 'beam', 'top_k'], default='greedy')
+    parser.add_argument('--beam-size', type=int, default=4)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=64,
+                        help="Epochs decoded per forward pass")
+    args = parser.parse_args()
+    configure_inference_logging(args.log_level, args.log_sample, args.log_json)
+    
     print("🌙 EEG Dream Decoding - CONFIDENCE FIXED ENGINE")
     print("=" * 70)
     
-    model_path = 'models/eeg_text_best.pth'
+    model_path = args.model
     feature_dir = 'data/processed/comprehensive_features'
     
     if not os.path.exists(model_path):
@@ -243,7 +329,11 @@ def main():
         return
     
     # Initialize inference engine
-    inference_engine = EEGDreamInference(model_path, feature_dir)
+    inference_engine = EEGDreamInference(
+        model_path, feature_dir,
+        decoding=args.decoding, beam_size=args.beam_size, top_k=args.top_k,
+        backend=args.backend, batch_size=args.batch_size
+    )
     
     # Run batch inference
     predictions = inference_engine.batch_inference(max_files=5)
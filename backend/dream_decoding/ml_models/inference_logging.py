@@ -0,0 +1,94 @@
+import sys
+import json
+import logging
+import itertools
+
+logger = logging.getLogger('dream_decoding.inference')
+
+class LazyStats:
+    """
+    Tensor summary that is only computed when a log record is actually formatted,
+    so disabled or sampled-out debug records never force a device sync.
+    """
+
+    def __init__(self, tensor, **extra_fns):
+        self.tensor = tensor
+        self.extra_fns = extra_fns
+        self._stats = None
+
+    def as_dict(self):
+        if self._stats is None:
+            t = self.tensor.detach()
+            self._stats = {
+                'shape': list(t.shape),
+                'min': t.min().item(),
+                'max': t.max().item(),
+                'mean': t.float().mean().item(),
+            }
+            for name, fn in self.extra_fns.items():
+                self._stats[name] = fn(t)
+        return self._stats
+
+    def __str__(self):
+        return ", ".join(
+            f"{k}: {v:.4f}" if isinstance(v, float) else f"{k}: {v}"
+            for k, v in self.as_dict().items()
+        )
+
+    # Containers of LazyStats format their items with repr
+    __repr__ = __str__
+
+class SamplingFilter(logging.Filter):
+    """Let through one of every `every_n` records per event (records at or above min_level always pass)"""
+
+    def __init__(self, every_n=1, min_level=logging.INFO):
+        super().__init__()
+        self.every_n = max(1, int(every_n))
+        self.min_level = min_level
+        self._counters = {}
+
+    def filter(self, record):
+        if record.levelno >= self.min_level or self.every_n == 1:
+            return True
+        key = getattr(record, 'event', record.msg)
+        counter = self._counters.setdefault(key, itertools.count())
+        return next(counter) % self.every_n == 0
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object per record: time, level, event, message and structured fields"""
+
+    def format(self, record):
+        fields = getattr(record, 'fields', {}) or {}
+        payload = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': getattr(record, 'event', None),
+            'message': record.getMessage(),
+            'fields': {
+                k: v.as_dict() if isinstance(v, LazyStats) else v
+                for k, v in fields.items()
+            },
+        }
+        return json.dumps(payload, default=str)
+
+def configure_inference_logging(level='WARNING', sample_every=1, structured=False, stream=None):
+    """
+    Attach a handler to the inference logger.
+    level: DEBUG shows per-batch diagnostics, INFO progress, WARNING (default) errors only.
+    sample_every: keep one of every N debug records per event.
+    structured: emit JSON lines instead of plain text.
+    """
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.addFilter(SamplingFilter(sample_every))
+    if structured:
+        handler.setFormatter(StructuredFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+
+    for old in list(logger.handlers):
+        logger.removeHandler(old)
+    logger.addHandler(handler)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    logger.propagate = False
+    return logger
@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import inspect
+import zipfile
+import argparse
+import torch
+import torch.nn as nn
+
+from eeg_to_text_model import EEGToTextModel
+
+# Stored inside TorchScript artifacts (torch.jit.save _extra_files)
+METADATA_FILE = 'metadata.json'
+
+def load_training_checkpoint(checkpoint_path):
+    """Rebuild the fp32 model from a training checkpoint, dropping optimizer/scheduler state"""
+    checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    config = checkpoint.get('model_config') or EEGToTextModel().config
+    model = EEGToTextModel(**config)
+    model.load_state_dict(checkpoint['model_state_dict'])
+    model.eval()
+    return model, checkpoint.get('tokenizer')
+
+def fuse_encoder(model):
+    """Fold each Conv1d+BatchNorm1d(+ReLU) of eeg_encoder into one conv (eval mode only)"""
+    layers = list(model.eeg_encoder.named_children())
+    groups = []
+    for i, (name, layer) in enumerate(layers):
+        if isinstance(layer, nn.Conv1d) and i + 1 < len(layers) and isinstance(layers[i + 1][1], nn.BatchNorm1d):
+            group = [name, layers[i + 1][0]]
+            if i + 2 < len(layers) and isinstance(layers[i + 2][1], nn.ReLU):
+                group.append(layers[i + 2][0])
+            groups.append(group)
+    model.eeg_encoder = torch.ao.quantization.fuse_modules(model.eeg_encoder, groups)
+    return model
+
+def quantize_model(model):
+    """int8 dynamic quantization of the LSTM decoder and output_projection (weights int8, activations fp32)"""
+    return torch.ao.quantization.quantize_dynamic(
+        model, {nn.LSTM, nn.Linear}, dtype=torch.qint8
+    )
+
+def prepare_serving_model(checkpoint_path, quantize=True, fuse=True):
+    """Stripped, optionally fused and quantized eval-mode model + metadata for the artifact"""
+    model, tokenizer = load_training_checkpoint(checkpoint_path)
+    if fuse:
+        model = fuse_encoder(model)
+    if quantize:
+        model = quantize_model(model)
+    metadata = {
+        'model_config': model.config,
+        'tokenizer': tokenizer,
+        'quantized': quantize,
+        'fused': fuse,
+    }
+    return model, metadata
+
+def export_torchscript(checkpoint_path, output_path, quantize=True, fuse=True):
+    """Script the serving model (forward, encode, _decode_step, score_tokens) and save it with its metadata"""
+    model, metadata = prepare_serving_model(checkpoint_path, quantize, fuse)
+    scripted = torch.jit.script(model)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    torch.jit.save(scripted, output_path, _extra_files={METADATA_FILE: json.dumps(metadata)})
+    return output_path
+
+class _EncoderGraph(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, eeg):
+        return self.model.encode(eeg)
+
+class _DecodeStepGraph(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_token, h, c):
+        logits, (h, c) = self.model._decode_step(input_token, (h, c))
+        return logits, h, c
+
+class _ScoreTokensGraph(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, h, c, tokens):
+        return self.model.score_tokens((h, c), tokens)
+
+def export_onnx(checkpoint_path, output_dir, fuse=True, opset=17):
+    """
+    Export encoder, single decode step and teacher-forced scoring as three ONNX graphs
+    plus metadata.json (requires the onnx package). ONNX has no dynamic-int8 LSTM,
+    so these graphs stay fp32; onnxruntime can quantize them separately.
+    """
+    model, metadata = prepare_serving_model(checkpoint_path, quantize=False, fuse=fuse)
+    config = model.config
+    os.makedirs(output_dir, exist_ok=True)
+
+    eeg = torch.randn(1, config['input_channels'], config['input_length'])
+    h, c = model.encode(eeg)
+    token = torch.zeros(1, 1, dtype=torch.long)
+    tokens = torch.zeros(1, config['max_seq_len'], dtype=torch.long)
+    batch = {0: 'batch'}
+    state = {1: 'batch'}
+
+    graphs = [
+        ('encoder.onnx', _EncoderGraph(model), (eeg,), ['eeg'], ['h', 'c'],
+         {'eeg': batch, 'h': state, 'c': state}),
+        ('decoder_step.onnx', _DecodeStepGraph(model), (token, h, c),
+         ['input_token', 'h', 'c'], ['logits', 'h_out', 'c_out'],
+         {'input_token': batch, 'h': state, 'c': state, 'logits': batch, 'h_out': state, 'c_out': state}),
+        ('score_tokens.onnx', _ScoreTokensGraph(model), (h, c, tokens),
+         ['h', 'c', 'tokens'], ['logits'],
+         {'h': state, 'c': state, 'tokens': {0: 'batch', 1: 'steps'}, 'logits': {0: 'batch', 1: 'steps'}}),
+    ]
+    # Newer torch defaults to the dynamo exporter; the TorchScript one (torch < 2.5 only has it) is pinned
+    exporter = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    for filename, graph, args, input_names, output_names, dynamic_axes in graphs:
+        torch.onnx.export(graph, args, os.path.join(output_dir, filename),
+                          input_names=input_names, output_names=output_names,
+                          dynamic_axes=dynamic_axes, opset_version=opset, **exporter)
+
+    with open(os.path.join(output_dir, METADATA_FILE), 'w') as f:
+        json.dump(metadata, f)
+    return output_dir
+
+def is_torchscript_artifact(path):
+    """True for files written by export_torchscript (training checkpoints have no metadata entry)"""
+    if not os.path.isfile(path) or not zipfile.is_zipfile(path):
+        return False
+    with zipfile.ZipFile(path) as archive:
+        return any(name.endswith(f'extra/{METADATA_FILE}') for name in archive.namelist())
+
+class ScriptedEEGToTextModel:
+    """
+    Runs EEGToTextModel.generate on top of a TorchScript artifact, so the Python decoding
+    loop (greedy / top-k / beam) is shared with the eager model.
+    """
+
+    generate = EEGToTextModel.generate
+    _beam_search = EEGToTextModel._beam_search
+    _buffer = staticmethod(EEGToTextModel._buffer)
+
+    def __init__(self, module, metadata):
+        self.module = module
+        self.metadata = metadata
+        self.config = metadata['model_config']
+        self.vocab_size = self.config['vocab_size']
+        self.max_seq_len = self.config['max_seq_len']
+
+    @classmethod
+    def load(cls, path, device='cpu'):
+        extra_files = {METADATA_FILE: ''}
+        module = torch.jit.load(path, map_location=device, _extra_files=extra_files)
+        module.eval()
+        return cls(module, json.loads(extra_files[METADATA_FILE]))
+
+    def encode(self, eeg):
+        return self.module.encode(eeg)
+
+    def _decode_step(self, input_token, hidden):
+        return self.module._decode_step(input_token, hidden)
+
+    def score_tokens(self, hidden, tokens):
+        return self.module.score_tokens(hidden, tokens)
+
+    def __call__(self, eeg, target_length=20):
+        return self.module(eeg, target_length)
+
+    def to(self, device):
+        self.module.to(device)
+        return self
+
+    def eval(self):
+        self.module.eval()
+        return self
+
+def compare_with_checkpoint(checkpoint_path, artifact_path, batch_size=16, repeats=5):
+    """Artifact vs. training checkpoint: file size, cold start, greedy latency and token agreement"""
+    def timed(fn):
+        start = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - start
+
+    model, load_time = timed(lambda: load_training_checkpoint(checkpoint_path)[0])
+    exported, export_load_time = timed(lambda: ScriptedEEGToTextModel.load(artifact_path))
+
+    config = model.config
+    eeg = torch.randn(batch_size, config['input_channels'], config['input_length'],
+                      generator=torch.Generator().manual_seed(0))
+
+    def latency(m):
+        m.generate(eeg)  # Warm-up (TorchScript profiling runs)
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            tokens, _ = m.generate(eeg)
+            times.append(time.perf_counter() - start)
+        return tokens, min(times)
+
+    with torch.inference_mode():
+        tokens, eager_time = latency(model)
+        exported_tokens, exported_time = latency(exported)
+
+    steps = min(tokens.size(1), exported_tokens.size(1))
+    agreement = (tokens[:, :steps] == exported_tokens[:, :steps]).float().mean().item()
+
+    print(f"📦 Export comparison (batch {batch_size}, quantized={exported.metadata['quantized']}, "
+          f"fused={exported.metadata['fused']}):")
+    print(f"   File size:  {os.path.getsize(checkpoint_path) / 1e6:.2f} MB -> {os.path.getsize(artifact_path) / 1e6:.2f} MB")
+    print(f"   Cold start: {load_time * 1000:.1f} ms -> {export_load_time * 1000:.1f} ms")
+    print(f"   Generate:   {eager_time * 1000:.1f} ms -> {exported_time * 1000:.1f} ms per batch")
+    print(f"   Greedy token agreement: {agreement:.3f}")
+    return {'agreement': agreement, 'eager_time': eager_time, 'exported_time': exported_time}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export EEGToTextModel for CPU serving")
+    parser.add_argument('--checkpoint', default='models/eeg_text_best.pth')
+    parser.add_argument('--output', default=None,
+                        help="Output file (torchscript) or directory (onnx)")
+    parser.add_argument('--format', choices=['torchscript', 'onnx'], default='torchscript')
+    parser.add_argument('--no-quantize', action='store_true',
+                        help="Keep the LSTM and output projection in fp32")
+    parser.add_argument('--no-fuse', action='store_true',
+                        help="Keep Conv/BatchNorm/ReLU as separate modules")
+    parser.add_argument('--compare', action='store_true',
+                        help="Report size, load time, latency and agreement against the checkpoint")
+    args = parser.parse_args()
+
+    if args.format == 'torchscript':
+        output = args.output or 'models/eeg_text_serving.pt'
+        export_torchscript(args.checkpoint, output, quantize=not args.no_quantize, fuse=not args.no_fuse)
+        print(f"✅ TorchScript model saved to {output}")
+        if args.compare:
+            compare_with_checkpoint(args.checkpoint, output)
+    else:
+        output = args.output or 'models/eeg_text_onnx'
+        export_onnx(args.checkpoint, output, fuse=not args.no_fuse)
+        print(f"✅ ONNX graphs saved to {output}")
@@ -0,0 +1,198 @@
+import time
+import argparse
+from collections import deque
+import numpy as np
+
+from eeg_filters import BANDPASS, NOTCH_FREQ, BlockPreprocessingEngine
+from edf_reader import select_eeg_channels
+from inference_logging import logger, configure_inference_logging
+
+class EEGRingBuffer:
+    """Fixed-size (channels, capacity) ring buffer of the most recent samples"""
+
+    def __init__(self, n_channels, capacity, dtype=np.float32):
+        self.capacity = capacity
+        self._data = np.zeros((n_channels, capacity), dtype=dtype)
+        self._pos = 0  # Next write position
+        self.total = 0  # Samples written since the start
+
+    def write(self, chunk):
+        n = chunk.shape[1]
+        self.total += n
+        if n >= self.capacity:
+            chunk, n = chunk[:, -self.capacity:], self.capacity
+        first = min(n, self.capacity - self._pos)
+        self._data[:, self._pos:self._pos + first] = chunk[:, :first]
+        self._data[:, :n - first] = chunk[:, first:]
+        self._pos = (self._pos + n) % self.capacity
+
+    def read_window(self, end, length, out):
+        """Copy the `length` samples ending at global sample index `end` into out (oldest first)"""
+        if end > self.total or end - length < self.total - self.capacity:
+            raise IndexError("Requested window is no longer (or not yet) in the buffer")
+        start = (self._pos - (self.total - end) - length) % self.capacity
+        first = min(length, self.capacity - start)
+        out[:, :first] = self._data[:, start:start + first]
+        out[:, first:] = self._data[:, :length - first]
+        return out
+
+class StreamingDreamDecoder:
+    """
+    Real-time decoding of raw multichannel EEG pushed in arbitrary chunks.
+    Each chunk goes through the same BlockPreprocessingEngine stages as offline preprocessing
+    (zero-phase legacy FIR bandpass + notch, then polyphase resampling to the model rate)
+    into a ring buffer; every completed epoch_length window (hop = epoch_length * (1 - overlap))
+    is decoded with EEGDreamInference.predict_batch. Zero-phase filtering needs half the FIR
+    kernel of lookahead, so a window is decoded `delay_s` after its last sample arrives;
+    flush() decodes the windows still pending when the stream ends.
+    """
+
+    def __init__(self, engine, sfreq, n_channels, epoch_length=30, overlap=0.5, target_fs=100,
+                 l_freq=BANDPASS[0], h_freq=BANDPASS[1], notch_freq=NOTCH_FREQ,
+                 max_pending=2, latency_budget_ms=None):
+        self.engine = engine
+        self.sfreq = sfreq
+        self.n_channels = n_channels
+        self.target_fs = target_fs
+        self.window = int(round(epoch_length * target_fs))
+        self.hop = max(1, int(round(self.window * (1 - overlap))))
+        # Windows completed by one push beyond max_pending are skipped so latency stays bounded
+        self.max_pending = max_pending
+        self.latency_budget_ms = latency_budget_ms
+
+        self.preprocessing = BlockPreprocessingEngine(sfreq, n_channels, target_fs, l_freq, h_freq, notch_freq)
+        # Fixed decoding latency (s): the zero-phase FIR looks half its kernel ahead
+        self.delay_s = self.preprocessing.filter.delay / sfreq
+        # Room for the current window plus the skipped-window backlog
+        self.buffer = EEGRingBuffer(n_channels, self.window + self.hop * max(1, max_pending))
+        self._windows = np.empty((max(1, max_pending), n_channels, self.window), dtype=np.float32)
+        self._next_end = self.window  # Global (resampled) sample index where the next window ends
+
+        self.windows_decoded = 0
+        self.windows_skipped = 0
+        self.latencies = deque(maxlen=1000)
+
+    def reset(self):
+        self.preprocessing.reset()
+        self.buffer = EEGRingBuffer(self.n_channels, self.buffer.capacity)
+        self._next_end = self.window
+
+    def push(self, chunk):
+        """
+        Feed a (n_channels, samples) chunk at the input rate. Returns one prediction dict
+        per window completed by this chunk, with window timing and latency_ms
+        (time from receiving the chunk to the decoded text).
+        """
+        received = time.perf_counter()
+        chunk = np.asarray(chunk)
+        if chunk.ndim != 2 or chunk.shape[0] != self.n_channels:
+            raise ValueError(f"Expected a ({self.n_channels}, samples) chunk, got shape {chunk.shape}")
+
+        self.buffer.write(self.preprocessing.process(chunk))
+        return self._decode_ready(received)
+
+    def flush(self):
+        """End of stream: filter the remaining lookahead and decode the windows it completes"""
+        received = time.perf_counter()
+        self.buffer.write(self.preprocessing.flush())
+        return self._decode_ready(received)
+
+    def _decode_ready(self, received):
+        """Decode the windows completed in the ring buffer; latency counts from `received`"""
+        ready = []
+        while self._next_end <= self.buffer.total:
+            ready.append(self._next_end)
+            self._next_end += self.hop
+        if not ready:
+            return []
+
+        # Under backlog only the newest windows are decoded
+        if len(ready) > self.max_pending:
+            skipped = len(ready) - self.max_pending
+            self.windows_skipped += skipped
+            logger.warning("⏭️ Skipping %d stale windows to keep up with the stream", skipped,
+                           extra={'event': 'stream_skip', 'fields': {'skipped': skipped}})
+            ready = ready[-self.max_pending:]
+
+        windows = self._windows[:len(ready)]
+        for i, end in enumerate(ready):
+            self.buffer.read_window(end, self.window, windows[i])
+        predictions = self.engine.predict_batch(windows)
+
+        latency_ms = (time.perf_counter() - received) * 1000
+        self.latencies.append(latency_ms)
+        self.windows_decoded += len(ready)
+        if self.latency_budget_ms is not None and latency_ms > self.latency_budget_ms:
+            logger.warning("🐢 Window latency %.1f ms over the %.1f ms budget", latency_ms, self.latency_budget_ms,
+                           extra={'event': 'stream_latency', 'fields': {'latency_ms': latency_ms}})
+
+        for end, prediction in zip(ready, predictions):
+            # Zero-phase output is aligned with the input: the delay_s lookahead is latency, not an offset
+            prediction['window_end_s'] = end / self.target_fs
+            prediction['window_start_s'] = prediction['window_end_s'] - self.window / self.target_fs
+            prediction['latency_ms'] = latency_ms
+        return predictions
+
+    def latency_summary(self):
+        """p50 / p95 / max decode latency (ms) over the most recent windows"""
+        if not self.latencies:
+            return {'windows': 0}
+        latencies = np.asarray(self.latencies)
+        return {
+            'windows': self.windows_decoded,
+            'skipped': self.windows_skipped,
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'max_ms': float(latencies.max()),
+        }
+
+def simulate_stream(decoder, data, chunk_seconds=1.0, realtime=False):
+    """Push a recorded (channels, samples) array through the decoder in chunk_seconds pieces"""
+    chunk = max(1, int(round(chunk_seconds * decoder.sfreq)))
+    predictions = []
+    for start in range(0, data.shape[1] + chunk, chunk):
+        pushed = time.perf_counter()
+        # One step past the data: the end of the stream flushes the filter lookahead
+        batch = decoder.push(data[:, start:start + chunk]) if start < data.shape[1] else decoder.flush()
+        for prediction in batch:
+            print(f"🌙 [{prediction['window_start_s']:7.1f}s - {prediction['window_end_s']:7.1f}s] "
+                  f"\"{prediction['dream_text']}\" (confidence {prediction['confidence']:.3f}, "
+                  f"{prediction['latency_ms']:.1f} ms)")
+            predictions.append(prediction)
+        if realtime:
+            time.sleep(max(0.0, chunk_seconds - (time.perf_counter() - pushed)))
+    return predictions
+
+def main():
+    """Replay an EDF recording as a live stream"""
+    import mne
+    from inference_eeg_text import EEGDreamInference
+
+    parser = argparse.ArgumentParser(description="Streaming EEG dream decoding (EDF replay)")
+    parser.add_argument('edf', help="EDF recording to replay")
+    parser.add_argument('--model', default='models/eeg_text_best.pth')
+    parser.add_argument('--chunk-seconds', type=float, default=1.0)
+    parser.add_argument('--epoch-length', type=float, default=30)
+    parser.add_argument('--overlap', type=float, default=0.5)
+    parser.add_argument('--realtime', action='store_true', help="Pace chunks at the recording rate")
+    parser.add_argument('--latency-budget-ms', type=float, default=None)
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+    configure_inference_logging(args.log_level)
+
+    raw = mne.io.read_raw_edf(args.edf, preload=True, verbose=False)
+    # Same channel-name selection as offline preprocessing, so the model sees its training inputs
+    raw.pick([raw.ch_names[i] for i in select_eeg_channels(raw.ch_names, 19)])
+    data = raw.get_data()
+    print(f"📡 Streaming {args.edf}: {data.shape[0]} ch @ {raw.info['sfreq']} Hz, {data.shape[1] / raw.info['sfreq']:.1f}s")
+
+    engine = EEGDreamInference(args.model)
+    decoder = StreamingDreamDecoder(engine, raw.info['sfreq'], data.shape[0], args.epoch_length,
+                                    args.overlap, latency_budget_ms=args.latency_budget_ms)
+    simulate_stream(decoder, data, args.chunk_seconds, args.realtime)
+
+    summary = decoder.latency_summary()
+    print(f"\n⏱️ Latency: {summary}")
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,21 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 from torch.utils.data import DataLoader
+from torch.utils.data.distributed import DistributedSampler
+from torch.nn.parallel import DistributedDataParallel
 import os
+import sys
 import time
+import argparse
+from contextlib import nullcontext
 from tqdm import tqdm
 
-from eeg_dataset import EEGTextDataset
+from eeg_dataset import EEGTextDataset, collate_eeg_batch, split_by_recording
 from eeg_to_text_model import EEGToTextModel
+from dream_tokenizer import DreamTokenizer
+from checkpointing import CheckpointManager, capture_rng_state, restore_rng_state
+from distributed_utils import (is_distributed, is_main_process, get_world_size, launched_with_torchrun,
+                               setup_distributed, cleanup_distributed, all_reduce_sum, barrier)
 
 class EEGTextTrainer:
     """
@@ -15,10 +24,21 @@ class EEGTextTrainer:
     Optimized for RTX 4050 with small dataset
     """
     
-    def __init__(self, model, dataset, batch_size=4, learning_rate=1e-3, device=None):
+    def __init__(self, model, dataset, batch_size=4, learning_rate=1e-3, device=None,
+                 teacher_forcing=True, sampling_ratio=0.0, tokenizer=None,
+                 num_workers=0, persistent_workers=False, prefetch_factor=None, pin_memory=None,
+                 precision='fp32', accumulation_steps=1, compile_model=False, log_every=10,
+                 checkpoint_dir='models', keep_last=3, val_dataset=None, patience=10, min_delta=0.0,
+                 eval_batch_size=None):
         self.model = model
         self.dataset = dataset
+        self.val_dataset = val_dataset  # Held-out recordings; model selection uses its loss when set
+        self.patience = patience  # Epochs without improvement before stopping (None disables)
+        self.min_delta = min_delta
         self.batch_size = batch_size
+        self.tokenizer = tokenizer  # Saved with checkpoints; dataset yields its token ids
+        self.teacher_forcing = teacher_forcing  # Full-sequence decoder call instead of the step loop
+        self.sampling_ratio = sampling_ratio  # Scheduled sampling: share of inputs taken from predictions
         
         # Setup device
         if device is None:
@@ -28,15 +48,58 @@ class EEGTextTrainer:
         
         self.model.to(self.device)
         
-        # DataLoader
+        # Training modes: bf16 autocast, gradient accumulation, torch.compile
+        if precision not in ('fp32', 'bf16'):
+            raise ValueError(f"Unsupported precision: {precision}")
+        self.precision = precision
+        self.accumulation_steps = max(1, accumulation_steps)
+        self.log_every = max(1, log_every)  # Loss is synced to the host only every N steps
+        
+        # DDP when a process group is up (see setup_distributed); gradients are all-reduced in backward
+        self.ddp_model = None
+        if is_distributed():
+            device_ids = [self.device.index] if self.device.type == 'cuda' else None
+            self.ddp_model = DistributedDataParallel(self.model, device_ids=device_ids)
+        wrapped = self.ddp_model or self.model
+        self.train_model = torch.compile(wrapped) if compile_model else wrapped
+        
+        # DataLoader: worker/prefetch options only apply when num_workers > 0
+        if pin_memory is None:
+            pin_memory = self.device.type == 'cuda'
+        self.pin_memory = pin_memory
+        loader_kwargs = {}
+        if num_workers > 0:
+            loader_kwargs['persistent_workers'] = persistent_workers
+            if prefetch_factor is not None:
+                loader_kwargs['prefetch_factor'] = prefetch_factor
+        
+        # Each rank sees a disjoint 1/world_size slice of the data per epoch
+        self.sampler = DistributedSampler(dataset, shuffle=True) if is_distributed() else None
         self.dataloader = DataLoader(
             dataset, 
             batch_size=batch_size, 
-            shuffle=True,
-            num_workers=0,  # Set to 0 for small dataset
-            pin_memory=True if self.device.type == 'cuda' else False
+            shuffle=self.sampler is None,
+            sampler=self.sampler,
+            num_workers=num_workers,
+            pin_memory=pin_memory,
+            collate_fn=collate_eeg_batch,
+            **loader_kwargs
         )
         
+        # Validation loader: no shuffling, larger batches since there is no backward pass
+        self.val_loader = None
+        if val_dataset is not None and len(val_dataset) > 0:
+            self.val_loader = DataLoader(
+                val_dataset,
+                batch_size=eval_batch_size or batch_size * 2,
+                shuffle=False,
+                sampler=DistributedSampler(val_dataset, shuffle=False) if is_distributed() else None,
+                num_workers=num_workers,
+                pin_memory=pin_memory,
+                collate_fn=collate_eeg_batch,
+                **loader_kwargs
+            )
+        
         # Optimizer and loss
         self.optimizer = optim.AdamW(model.parameters(), lr=learning_rate, weight_decay=0.01)
         self.criterion = nn.CrossEntropyLoss(ignore_index=0)  # 0 is padding token
@@ -46,11 +109,25 @@ class EEGTextTrainer:
             self.optimizer, mode='min', factor=0.5, patience=2
         )
         
+        # Resumable state; checkpoints are serialized on a background thread
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoints = CheckpointManager(os.path.join(checkpoint_dir, 'checkpoints'), keep_last)
+        self.start_epoch = 0
+        self.best_loss = float('inf')
+        self.epochs_without_improvement = 0
+        
         print(f"🎯 Training setup:")
         print(f"   Device: {self.device}")
-        print(f"   Batch size: {batch_size}")
+        print(f"   Batch size: {batch_size} per process x {get_world_size()} processes")
         print(f"   Dataset size: {len(dataset)}")
         print(f"   Batches per epoch: {len(self.dataloader)}")
+        print(f"   Validation size: {len(val_dataset) if self.val_loader else 0} | "
+              f"Early-stopping patience: {patience}")
+        print(f"   Teacher forcing: {teacher_forcing} (sampling ratio: {sampling_ratio})")
+        print(f"   Precision: {precision} | Accumulation steps: {self.accumulation_steps} "
+              f"(effective batch {batch_size * self.accumulation_steps * get_world_size()}) | Compiled: {compile_model}")
+        print(f"   Loader: {num_workers} workers, prefetch {prefetch_factor or 'default'}, "
+              f"persistent={persistent_workers and num_workers > 0}, pin_memory={pin_memory}")
     
     def create_dummy_targets(self, batch_size, seq_len):
         """Create dummy target sequences for unsupervised learning"""
@@ -61,114 +138,351 @@ class EEGTextTrainer:
     def train_epoch(self):
         """Train one epoch"""
         self.model.train()
-        total_loss = 0
+        # Loss is accumulated on the device; .item() only every log_every steps
+        total_loss = torch.zeros((), device=self.device)
         num_batches = 0
+        num_steps = len(self.dataloader)
         
-        progress_bar = tqdm(self.dataloader, desc="Training")
+        # Time spent waiting on the DataLoader vs. running the step (input-bound check)
+        data_time = 0.0
+        compute_time = 0.0
         
+        progress_bar = tqdm(self.dataloader, desc="Training", disable=not is_main_process())
+        self.optimizer.zero_grad()
+        
+        wait_start = time.perf_counter()
         for batch_idx, (eeg_batch, text_batch) in enumerate(progress_bar):
-            eeg_batch = eeg_batch.to(self.device)
-            
-            # Forward pass
-            self.optimizer.zero_grad()
+            step_start = time.perf_counter()
+            data_time += step_start - wait_start
             
-            # Get model predictions
-            outputs = self.model(eeg_batch)  # (batch_size, seq_len, vocab_size)
+            eeg_batch = eeg_batch.to(self.device, non_blocking=self.pin_memory)
             
-            # Create dummy targets (in real implementation, tokenize text_batch)
-            targets = self.create_dummy_targets(eeg_batch.size(0), outputs.size(1))
+            # Pre-tokenized label ids from the dataset, or dummy targets for raw text labels
+            if isinstance(text_batch, torch.Tensor):
+                targets = text_batch.to(self.device, non_blocking=self.pin_memory)
+            else:
+                targets = self.create_dummy_targets(eeg_batch.size(0), self.model.max_seq_len)
             
-            # Calculate loss
-            loss = self.criterion(outputs.reshape(-1, outputs.size(-1)), targets.reshape(-1))
+            # Under DDP, skip the gradient all-reduce on micro-batches that don't step the optimizer
+            is_step = (batch_idx + 1) % self.accumulation_steps == 0 or batch_idx + 1 == num_steps
+            sync_context = self.ddp_model.no_sync() if self.ddp_model is not None and not is_step else nullcontext()
             
-            # Backward pass
-            loss.backward()
+            with sync_context:
+                # Forward pass (bf16 autocast when enabled)
+                with torch.autocast(device_type=self.device.type, dtype=torch.bfloat16,
+                                    enabled=self.precision == 'bf16'):
+                    if self.teacher_forcing:
+                        outputs = self.train_model(eeg_batch, targets=targets, sampling_ratio=self.sampling_ratio)
+                    else:
+                        outputs = self.train_model(eeg_batch, target_length=targets.size(1))
+                    # outputs: (batch_size, seq_len, vocab_size)
+                    
+                    # Calculate loss
+                    loss = self.criterion(outputs.reshape(-1, outputs.size(-1)).float(), targets.reshape(-1))
+                
+                # Backward pass (scaled so accumulated gradients average over micro-batches)
+                (loss / self.accumulation_steps).backward()
             
-            # Gradient clipping
-            torch.nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=1.0)
-            
-            self.optimizer.step()
+            if is_step:
+                # Gradient clipping
+                torch.nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=1.0)
+                
+                self.optimizer.step()
+                self.optimizer.zero_grad()
             
             # Track loss
-            total_loss += loss.item()
+            total_loss += loss.detach()
             num_batches += 1
             
             # Update progress bar
-            progress_bar.set_postfix({
-                'Loss': f"{loss.item():.4f}",
-                'Avg Loss': f"{total_loss/num_batches:.4f}"
-            })
+            if num_batches % self.log_every == 0 or num_batches == num_steps:
+                progress_bar.set_postfix({
+                    'Loss': f"{loss.item():.4f}",
+                    'Avg Loss': f"{total_loss.item()/num_batches:.4f}"
+                })
+            
+            wait_start = time.perf_counter()
+            compute_time += wait_start - step_start
         
-        return total_loss / num_batches
+        self.last_epoch_timing = {'data_wait': data_time, 'compute': compute_time}
+        
+        # Average over every rank so all processes make the same scheduler/stopping decisions
+        all_reduce_sum(total_loss)
+        return total_loss.item() / (num_batches * get_world_size())
+    
+    def evaluate(self):
+        """
+        Validation pass under inference_mode: teacher-forced loss plus batched greedy
+        decoding for token accuracy. Metrics stay on the device until the end.
+        """
+        self.model.eval()
+        total_loss = torch.zeros((), device=self.device)
+        correct = torch.zeros((), device=self.device)
+        num_tokens = torch.zeros((), device=self.device)
+        exact = torch.zeros((), device=self.device)
+        num_samples = torch.zeros((), device=self.device)
+        num_batches = torch.zeros((), device=self.device)
+        
+        with torch.inference_mode(), torch.autocast(device_type=self.device.type, dtype=torch.bfloat16,
+                                                    enabled=self.precision == 'bf16'):
+            for eeg_batch, text_batch in self.val_loader:
+                eeg_batch = eeg_batch.to(self.device, non_blocking=self.pin_memory)
+                if not isinstance(text_batch, torch.Tensor):
+                    raise ValueError("Validation needs token id labels (attach a tokenizer to the dataset)")
+                targets = text_batch.to(self.device, non_blocking=self.pin_memory)
+                
+                outputs = self.model(eeg_batch, targets=targets)
+                total_loss += self.criterion(outputs.reshape(-1, outputs.size(-1)).float(), targets.reshape(-1))
+                
+                # Greedy decode the whole batch; it stops once every sequence has emitted END
+                tokens, _ = self.model.generate(eeg_batch, max_length=targets.size(1))
+                predicted = torch.zeros_like(targets)
+                predicted[:, :tokens.size(1)] = tokens
+                
+                mask = targets != 0
+                matches = (predicted == targets) & mask
+                correct += matches.sum()
+                num_tokens += mask.sum()
+                exact += (matches.sum(dim=1) == mask.sum(dim=1)).sum()
+                num_samples += targets.size(0)
+                num_batches += 1
+        
+        # Sum metrics over ranks (each rank evaluated its slice of the validation set)
+        totals = all_reduce_sum(torch.stack([total_loss, correct, num_tokens, exact, num_samples, num_batches]))
+        total_loss, correct, num_tokens, exact, num_samples, num_batches = totals.tolist()
+        return {
+            'loss': total_loss / max(num_batches, 1),
+            'token_accuracy': correct / max(num_tokens, 1),
+            'exact_match': exact / max(num_samples, 1),
+        }
     
     def train(self, num_epochs=30):
         """Train the model for specified epochs"""
         print(f"\n🚀 Starting training for {num_epochs} epochs...")
         
-        best_loss = float('inf')
+        best_loss = self.best_loss
+        monitor = 'validation' if self.val_loader is not None else 'training'
         
-        for epoch in range(num_epochs):
+        for epoch in range(self.start_epoch, num_epochs):
             print(f"\n📅 Epoch {epoch + 1}/{num_epochs}")
+            if self.sampler is not None:
+                self.sampler.set_epoch(epoch)  # Different shuffle every epoch, identical across ranks
             
             # Train one epoch
             start_time = time.time()
             avg_loss = self.train_epoch()
+            
+            # Model selection, LR schedule and early stopping follow the validation loss when available
+            metrics = self.evaluate() if self.val_loader is not None else None
+            monitored_loss = metrics['loss'] if metrics else avg_loss
             epoch_time = time.time() - start_time
             
             # Update learning rate
-            self.scheduler.step(avg_loss)
+            self.scheduler.step(monitored_loss)
             
             # Print epoch summary
             current_lr = self.optimizer.param_groups[0]['lr']
             print(f"✅ Epoch {epoch + 1} completed:")
             print(f"   Average Loss: {avg_loss:.4f}")
+            if metrics:
+                print(f"   Val Loss: {metrics['loss']:.4f} | Token acc: {metrics['token_accuracy']:.3f}"
+                      f" | Exact match: {metrics['exact_match']:.3f}")
             print(f"   Time: {epoch_time:.2f}s")
+            timing = self.last_epoch_timing
+            busy = timing['data_wait'] + timing['compute']
+            print(f"   Data wait: {timing['data_wait']:.2f}s ({100 * timing['data_wait'] / max(busy, 1e-9):.0f}%)"
+                  f" | Compute: {timing['compute']:.2f}s")
             print(f"   Learning Rate: {current_lr:.6f}")
             
             # Save best model
-            if avg_loss < best_loss:
-                best_loss = avg_loss
-                self.save_model(f"models/eeg_text_best.pth")
-                print(f"   💾 Saved best model (loss: {best_loss:.4f})")
+            if monitored_loss < best_loss - self.min_delta:
+                best_loss = monitored_loss
+                self.epochs_without_improvement = 0
+                self.save_model(os.path.join(self.checkpoint_dir, 'eeg_text_best.pth'))
+                print(f"   💾 Saved best model ({monitor} loss: {best_loss:.4f})")
+            else:
+                self.epochs_without_improvement += 1
+            
+            # Rolling resumable checkpoint
+            self.best_loss = best_loss
+            if is_main_process():
+                self.checkpoints.save_rolling(self.training_state(epoch), epoch + 1)
+            
+            if self.patience is not None and self.epochs_without_improvement >= self.patience:
+                print(f"\n⏹️ Early stopping: no {monitor} improvement for {self.patience} epochs")
+                break
+        
+        # Make sure every background save has reached disk
+        self.checkpoints.wait()
+        barrier()
         
         print(f"\n🎉 Training completed!")
-        print(f"   Best loss: {best_loss:.4f}")
+        print(f"   Best {monitor} loss: {best_loss:.4f}")
     
+    def training_state(self, epoch):
+        """Everything needed to resume after `epoch` (0-based) has finished"""
+        state = {
+            'epoch': epoch,
+            'best_loss': self.best_loss,
+            'epochs_without_improvement': self.epochs_without_improvement,
+            'model_state_dict': self.model.state_dict(),
+            'optimizer_state_dict': self.optimizer.state_dict(),
+            'scheduler_state_dict': self.scheduler.state_dict(),
+            'rng_state': capture_rng_state(),
+            'model_config': self.model.config,
+        }
+        if self.tokenizer is not None:
+            state['tokenizer'] = self.tokenizer.to_dict()
+        return state
+
+    def resume(self, filepath=None):
+        """Restore a rolling checkpoint (latest one by default); training continues after its epoch"""
+        filepath = filepath or self.checkpoints.latest()
+        if filepath is None:
+            print("⚠️ No checkpoint to resume from, starting fresh")
+            return False
+        
+        # Our own checkpoint (contains RNG state), so a full unpickle is fine
+        state = torch.load(filepath, map_location=self.device, weights_only=False)
+        self.model.load_state_dict(state['model_state_dict'])
+        self.optimizer.load_state_dict(state['optimizer_state_dict'])
+        self.scheduler.load_state_dict(state['scheduler_state_dict'])
+        restore_rng_state(state['rng_state'])
+        self.start_epoch = state['epoch'] + 1
+        self.best_loss = state['best_loss']
+        self.epochs_without_improvement = state.get('epochs_without_improvement', 0)
+        
+        print(f"🔁 Resumed from {filepath} (epoch {self.start_epoch}, best loss {self.best_loss:.4f})")
+        return True
+
     def save_model(self, filepath):
-        """Save model checkpoint"""
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        torch.save({
+        """Save model checkpoint (serialized in the background)"""
+        if not is_main_process():
+            return  # Weights are identical on every rank
+        checkpoint = {
             'model_state_dict': self.model.state_dict(),
             'optimizer_state_dict': self.optimizer.state_dict(),
-        }, filepath)
+            'model_config': self.model.config,
+        }
+        if self.tokenizer is not None:
+            checkpoint['tokenizer'] = self.tokenizer.to_dict()
+        self.checkpoints.save_async(checkpoint, filepath)
 
 def main():
-    """Main training function"""
+    """
+    Main training function.
+    Distributed: `torchrun --nproc_per_node=N train_eeg_text.py ...` (add --nnodes/--node_rank/
+    --master_addr for several machines), or `--nproc-per-node N` to launch torchrun from here.
+    """
+    parser = argparse.ArgumentParser(description="Train the EEG-to-text model")
+    parser.add_argument('--no-teacher-forcing', action='store_true',
+                        help="Train through the autoregressive step loop")
+    parser.add_argument('--sampling-ratio', type=float, default=0.0,
+                        help="Scheduled sampling: share of decoder inputs taken from predictions")
+    parser.add_argument('--batch-size', type=int, default=2)
+    parser.add_argument('--num-workers', type=int, default=0,
+                        help="DataLoader worker processes")
+    parser.add_argument('--prefetch-factor', type=int, default=None,
+                        help="Batches prefetched per worker")
+    parser.add_argument('--lazy', action='store_true',
+                        help="Read epochs from HDF5 on demand instead of preloading them")
+    parser.add_argument('--shards-dir', default=None,
+                        help="Train from packed shards written by eeg_shards.py")
+    parser.add_argument('--precision', choices=['fp32', 'bf16'], default='fp32',
+                        help="bf16 enables autocast (CPU or CUDA)")
+    parser.add_argument('--accumulation-steps', type=int, default=1,
+                        help="Micro-batches per optimizer step")
+    parser.add_argument('--compile', action='store_true',
+                        help="Wrap the model with torch.compile")
+    parser.add_argument('--log-every', type=int, default=10,
+                        help="Sync the loss for the progress bar every N steps")
+    parser.add_argument('--resume', nargs='?', const='latest', default=None,
+                        help="Resume from a checkpoint path, or the latest rolling checkpoint")
+    parser.add_argument('--epochs', type=int, default=200)
+    parser.add_argument('--keep-last', type=int, default=3,
+                        help="Rolling checkpoints to keep")
+    parser.add_argument('--val-fraction', type=float, default=0.2,
+                        help="Share of recordings held out for validation (0 disables)")
+    parser.add_argument('--patience', type=int, default=10,
+                        help="Stop after this many epochs without validation improvement")
+    parser.add_argument('--nproc-per-node', type=int, default=None,
+                        help="Launch this many DDP processes on this machine via torchrun")
+    parser.add_argument('--backend', default='gloo',
+                        help="torch.distributed backend (gloo works on CPU-only machines)")
+    args = parser.parse_args()
+    
+    # Launcher: re-run this script under torchrun; the workers see RANK/WORLD_SIZE and skip this
+    if args.nproc_per_node and not launched_with_torchrun():
+        from torch.distributed.run import main as torchrun
+        torchrun([f'--nproc_per_node={args.nproc_per_node}', sys.argv[0]] + sys.argv[1:])
+        return
+    
+    device = None
+    if launched_with_torchrun():
+        _, _, device = setup_distributed(args.backend)
+    
+    try:
+        run_training(args, device)
+    finally:
+        cleanup_distributed()
+
+def run_training(args, device=None):
+    """Load data, build the model and train (on every rank when distributed)"""
+    
     print("🧠 EEG-to-Text Dream Decoding Model Training")
     print("=" * 50)
     
     # Load dataset
     print("📊 Loading dataset...")
-    dataset = EEGTextDataset()
+    dataset = EEGTextDataset(lazy=args.lazy, shards_dir=args.shards_dir)
     
     if len(dataset) == 0:
         print("❌ No data found! Please run preprocessing first.")
         return
     
-    # Create model
+    # Build the vocabulary from the labels and tokenize them once
+    print("🔤 Building vocabulary...")
+    tokenizer = DreamTokenizer.build(dataset.texts())
+    max_seq_len = 20
+    dataset.attach_tokenizer(tokenizer, max_seq_len)
+    if is_main_process():
+        os.makedirs('models', exist_ok=True)
+        tokenizer.save('models/vocab.json')
+    
+    # Hold out whole recordings for validation
+    train_dataset, val_dataset = split_by_recording(dataset, args.val_fraction)
+    
+    # Create model (embedding and projection sized to the vocabulary)
     print("🔧 Creating model...")
-    model = EEGToTextModel()
+    model = EEGToTextModel(vocab_size=len(tokenizer), max_seq_len=max_seq_len)
     
     # Setup trainer
     trainer = EEGTextTrainer(
         model=model,
-        dataset=dataset,
-        batch_size=2,  # Small batch size for RTX 4050
-        learning_rate=1e-4
+        device=device,
+        dataset=train_dataset,
+        val_dataset=val_dataset,
+        patience=args.patience,
+        batch_size=args.batch_size,  # Default 2: small batch size for RTX 4050
+        learning_rate=1e-4,
+        teacher_forcing=not args.no_teacher_forcing,
+        sampling_ratio=args.sampling_ratio,
+        tokenizer=tokenizer,
+        num_workers=args.num_workers,
+        persistent_workers=args.num_workers > 0,
+        prefetch_factor=args.prefetch_factor,
+        precision=args.precision,
+        accumulation_steps=args.accumulation_steps,
+        compile_model=args.compile,
+        log_every=args.log_every,
+        keep_last=args.keep_last
     )
     
+    if args.resume:
+        trainer.resume(None if args.resume == 'latest' else args.resume)
+    
     # Train model
-    trainer.train(num_epochs=200)
+    trainer.train(num_epochs=args.epochs)
     
     print("\n✅ Training completed successfully!")
     print("🚀 Ready for inference and evaluation!")
@@ -1,118 +1,314 @@
 import os
-import wget
-from tqdm import tqdm
-
-def download_comprehensive_1gb_dataset():
-    """Download comprehensive EEG dataset (~1GB) with all categories"""
-    
-    samples = [
-        # Sleep-EDF Database (Overnight Sleep Recordings) - ~300MB total
-        {"name": "SC4001E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4001E0-PSG.edf", "size": "15MB", "category": "Sleep"},
-        {"name": "SC4002E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4002E0-PSG.edf", "size": "15MB", "category": "Sleep"},
-        {"name": "SC4003E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4003E0-PSG.edf", "size": "15MB", "category": "Sleep"},
-        {"name": "SC4004E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4004E0-PSG.edf", "size": "16MB", "category": "Sleep"},
-        {"name": "SC4005E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4005E0-PSG.edf", "size": "15MB", "category": "Sleep"},
-        {"name": "SC4006E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4006E0-PSG.edf", "size": "16MB", "category": "Sleep"},
-        {"name": "SC4007E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4007E0-PSG.edf", "size": "16MB", "category": "Sleep"},
-        {"name": "SC4008E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4008E0-PSG.edf", "size": "15MB", "category": "Sleep"},
-        {"name": "SC4009E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4009E0-PSG.edf", "size": "15MB", "category": "Sleep"},
-        {"name": "SC4010E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4010E0-PSG.edf", "size": "16MB", "category": "Sleep"},
-        {"name": "SC4011E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4011E0-PSG.edf", "size": "15MB", "category": "Sleep"},
-        {"name": "SC4012E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4012E0-PSG.edf", "size": "16MB", "category": "Sleep"},
-        {"name": "SC4013E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4013E0-PSG.edf", "size": "15MB", "category": "Sleep"},
-        {"name": "SC4014E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4014E0-PSG.edf", "size": "16MB", "category": "Sleep"},
-        {"name": "SC4015E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4015E0-PSG.edf", "size": "15MB", "category": "Sleep"},
-        {"name": "SC4016E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4016E0-PSG.edf", "size": "16MB", "category": "Sleep"},
-        {"name": "SC4017E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4017E0-PSG.edf", "size": "15MB", "category": "Sleep"},
-        {"name": "SC4018E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4018E0-PSG.edf", "size": "16MB", "category": "Sleep"},
-        {"name": "SC4019E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4019E0-PSG.edf", "size": "15MB", "category": "Sleep"},
-        {"name": "SC4020E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4020E0-PSG.edf", "size": "16MB", "category": "Sleep"},
-
-        # EEG Motor Movement/Imagery Dataset (Multiple Subjects) - ~500MB total
-        {"name": "S001R01.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S001/S001R01.edf", "size": "25MB", "category": "Motor Imagery"},
-        {"name": "S001R02.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S001/S001R02.edf", "size": "25MB", "category": "Motor Imagery"},
-        {"name": "S001R03.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S001/S001R03.edf", "size": "25MB", "category": "Motor Movement"},
-        {"name": "S001R04.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S001/S001R04.edf", "size": "25MB", "category": "Motor Movement"},
-        {"name": "S002R01.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S002/S002R01.edf", "size": "25MB", "category": "Motor Imagery"},
-        {"name": "S002R02.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S002/S002R02.edf", "size": "25MB", "category": "Motor Imagery"},
-        {"name": "S002R03.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S002/S002R03.edf", "size": "25MB", "category": "Motor Movement"},
-        {"name": "S002R04.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S002/S002R04.edf", "size": "25MB", "category": "Motor Movement"},
-        {"name": "S003R01.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S003/S003R01.edf", "size": "25MB", "category": "Motor Imagery"},
-        {"name": "S003R02.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S003/S003R02.edf", "size": "25MB", "category": "Motor Imagery"},
-        {"name": "S003R03.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S003/S003R03.edf", "size": "25MB", "category": "Motor Movement"},
-        {"name": "S003R04.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S003/S003R04.edf", "size": "25MB", "category": "Motor Movement"},
-        {"name": "S004R01.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S004/S004R01.edf", "size": "25MB", "category": "Motor Imagery"},
-        {"name": "S004R02.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S004/S004R02.edf", "size": "25MB", "category": "Motor Imagery"},
-        {"name": "S004R03.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S004/S004R03.edf", "size": "25MB", "category": "Motor Movement"},
-        {"name": "S004R04.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S004/S004R04.edf", "size": "25MB", "category": "Motor Movement"},
-        {"name": "S005R01.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S005/S005R01.edf", "size": "25MB", "category": "Motor Imagery"},
-        {"name": "S005R02.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S005/S005R02.edf", "size": "25MB", "category": "Motor Imagery"},
-        {"name": "S005R03.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S005/S005R03.edf", "size": "25MB", "category": "Motor Movement"},
-        {"name": "S005R04.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S005/S005R04.edf", "size": "25MB", "category": "Motor Movement"},
-
-        # Additional Sleep Database Files - ~200MB more
-        {"name": "ST7011J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7011J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
-        {"name": "ST7012J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7012J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
-        {"name": "ST7021J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7021J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
-        {"name": "ST7022J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7022J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
-        {"name": "ST7031J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7031J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
-        {"name": "ST7041J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7041J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
-        {"name": "ST7051J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7051J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
-        {"name": "ST7061J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7061J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
-        {"name": "ST7071J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7071J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
-        {"name": "ST7081J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7081J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"}
-    ]
-    
-    os.makedirs('data/raw/comprehensive_1gb', exist_ok=True)
+import re
+import sys
+import time
+import random
+import argparse
+import http.client
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError, URLError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Hashing and manifest helpers shared with the preprocessing cache
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'backend', 'dream_decoding', 'ml_models'))
+from file_manifest import file_sha256, load_manifest, save_manifest
+
+# Verified {name: {url, size, sha256, mtime_ns}} of every downloaded file, kept next to the recordings
+MANIFEST_FILE = 'download_manifest.json'
+# PhysioNet publishes one checksum list per database version
+CHECKSUMS_FILE = 'SHA256SUMS.txt'
+PHYSIONET_FILES = 'https://physionet.org/files'
+# Worth another try; other HTTP errors (404, 403, ...) fail immediately
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+SAMPLES = [
+    # Sleep-EDF Database (Overnight Sleep Recordings) - ~300MB total
+    {"name": "SC4001E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4001E0-PSG.edf", "size": "15MB", "category": "Sleep"},
+    {"name": "SC4002E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4002E0-PSG.edf", "size": "15MB", "category": "Sleep"},
+    {"name": "SC4003E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4003E0-PSG.edf", "size": "15MB", "category": "Sleep"},
+    {"name": "SC4004E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4004E0-PSG.edf", "size": "16MB", "category": "Sleep"},
+    {"name": "SC4005E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4005E0-PSG.edf", "size": "15MB", "category": "Sleep"},
+    {"name": "SC4006E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4006E0-PSG.edf", "size": "16MB", "category": "Sleep"},
+    {"name": "SC4007E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4007E0-PSG.edf", "size": "16MB", "category": "Sleep"},
+    {"name": "SC4008E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4008E0-PSG.edf", "size": "15MB", "category": "Sleep"},
+    {"name": "SC4009E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4009E0-PSG.edf", "size": "15MB", "category": "Sleep"},
+    {"name": "SC4010E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4010E0-PSG.edf", "size": "16MB", "category": "Sleep"},
+    {"name": "SC4011E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4011E0-PSG.edf", "size": "15MB", "category": "Sleep"},
+    {"name": "SC4012E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4012E0-PSG.edf", "size": "16MB", "category": "Sleep"},
+    {"name": "SC4013E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4013E0-PSG.edf", "size": "15MB", "category": "Sleep"},
+    {"name": "SC4014E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4014E0-PSG.edf", "size": "16MB", "category": "Sleep"},
+    {"name": "SC4015E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4015E0-PSG.edf", "size": "15MB", "category": "Sleep"},
+    {"name": "SC4016E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4016E0-PSG.edf", "size": "16MB", "category": "Sleep"},
+    {"name": "SC4017E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4017E0-PSG.edf", "size": "15MB", "category": "Sleep"},
+    {"name": "SC4018E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4018E0-PSG.edf", "size": "16MB", "category": "Sleep"},
+    {"name": "SC4019E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4019E0-PSG.edf", "size": "15MB", "category": "Sleep"},
+    {"name": "SC4020E0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-cassette/SC4020E0-PSG.edf", "size": "16MB", "category": "Sleep"},
+
+    # EEG Motor Movement/Imagery Dataset (Multiple Subjects) - ~500MB total
+    {"name": "S001R01.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S001/S001R01.edf", "size": "25MB", "category": "Motor Imagery"},
+    {"name": "S001R02.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S001/S001R02.edf", "size": "25MB", "category": "Motor Imagery"},
+    {"name": "S001R03.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S001/S001R03.edf", "size": "25MB", "category": "Motor Movement"},
+    {"name": "S001R04.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S001/S001R04.edf", "size": "25MB", "category": "Motor Movement"},
+    {"name": "S002R01.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S002/S002R01.edf", "size": "25MB", "category": "Motor Imagery"},
+    {"name": "S002R02.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S002/S002R02.edf", "size": "25MB", "category": "Motor Imagery"},
+    {"name": "S002R03.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S002/S002R03.edf", "size": "25MB", "category": "Motor Movement"},
+    {"name": "S002R04.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S002/S002R04.edf", "size": "25MB", "category": "Motor Movement"},
+    {"name": "S003R01.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S003/S003R01.edf", "size": "25MB", "category": "Motor Imagery"},
+    {"name": "S003R02.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S003/S003R02.edf", "size": "25MB", "category": "Motor Imagery"},
+    {"name": "S003R03.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S003/S003R03.edf", "size": "25MB", "category": "Motor Movement"},
+    {"name": "S003R04.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S003/S003R04.edf", "size": "25MB", "category": "Motor Movement"},
+    {"name": "S004R01.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S004/S004R01.edf", "size": "25MB", "category": "Motor Imagery"},
+    {"name": "S004R02.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S004/S004R02.edf", "size": "25MB", "category": "Motor Imagery"},
+    {"name": "S004R03.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S004/S004R03.edf", "size": "25MB", "category": "Motor Movement"},
+    {"name": "S004R04.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S004/S004R04.edf", "size": "25MB", "category": "Motor Movement"},
+    {"name": "S005R01.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S005/S005R01.edf", "size": "25MB", "category": "Motor Imagery"},
+    {"name": "S005R02.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S005/S005R02.edf", "size": "25MB", "category": "Motor Imagery"},
+    {"name": "S005R03.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S005/S005R03.edf", "size": "25MB", "category": "Motor Movement"},
+    {"name": "S005R04.edf", "url": "https://physionet.org/files/eegmmidb/1.0.0/S005/S005R04.edf", "size": "25MB", "category": "Motor Movement"},
+
+    # Additional Sleep Database Files - ~200MB more
+    {"name": "ST7011J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7011J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
+    {"name": "ST7012J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7012J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
+    {"name": "ST7021J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7021J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
+    {"name": "ST7022J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7022J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
+    {"name": "ST7031J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7031J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
+    {"name": "ST7041J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7041J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
+    {"name": "ST7051J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7051J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
+    {"name": "ST7061J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7061J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
+    {"name": "ST7071J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7071J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"},
+    {"name": "ST7081J0-PSG.edf", "url": "https://physionet.org/files/sleep-edfx/1.0.0/sleep-telemetry/ST7081J0-PSG.edf", "size": "10MB", "category": "Sleep Telemetry"}
+]
+
+class DownloadError(Exception):
+    """A download attempt that may succeed if retried"""
+
+class ChecksumMismatch(DownloadError):
+    """Downloaded bytes do not match the expected size or SHA-256"""
+
+def with_mirror(url, mirror=None):
+    """Point a physionet.org/files URL at a mirror (e.g. a local test server)"""
+    if mirror and url.startswith(PHYSIONET_FILES):
+        return mirror.rstrip('/') + url[len(PHYSIONET_FILES):]
+    return url
+
+def split_database_url(url):
+    """https://.../files/<db>/<version>/<path> -> (database root URL, path within it)"""
+    match = re.match(r'^(.*/files/[^/]+/[^/]+/)(.+)$', url)
+    return (match.group(1), match.group(2)) if match else (None, None)
+
+def fetch_remote_checksums(samples, mirror=None, timeout=30, retries=3, backoff=1.0):
+    """{name: sha256} from each database's SHA256SUMS.txt (databases that fail are skipped)"""
+    checksums = {}
+    by_root = {}
+    for sample in samples:
+        root, path = split_database_url(sample['url'])
+        if root:
+            by_root.setdefault(with_mirror(root, mirror), {})[path] = sample['name']
+    
+    for root, names in by_root.items():
+        for attempt in range(retries + 1):
+            try:
+                with urlopen(root + CHECKSUMS_FILE, timeout=timeout) as response:
+                    lines = response.read().decode('utf-8', errors='replace').splitlines()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                error = e
+                if attempt < retries:
+                    time.sleep(backoff * 2 ** attempt)
+        else:
+            print(f"   ⚠️ No checksums from {root} ({error}); verifying by size only")
+            continue
+        for line in lines:
+            parts = line.split()
+            if len(parts) == 2 and parts[1].lstrip('*') in names:
+                checksums[names[parts[1].lstrip('*')]] = parts[0].lower()
+    return checksums
+
+def verify_file(file_path, expected):
+    """Raise ChecksumMismatch unless the file has the expected size and SHA-256 (when known)"""
+    size = os.path.getsize(file_path)
+    if expected.get('size') is not None and size != expected['size']:
+        raise ChecksumMismatch(f"size {size} != expected {expected['size']}")
+    sha256 = file_sha256(file_path)
+    if expected.get('sha256') and sha256 != expected['sha256']:
+        raise ChecksumMismatch(f"sha256 {sha256[:12]}... != expected {expected['sha256'][:12]}...")
+    return size, sha256
+
+def fetch_to_part(url, part_path, timeout=30, chunk_size=1 << 20):
+    """
+    Download url into part_path, resuming from its current size with an HTTP Range request.
+    A part file the server rejects (416) that is not exactly the remote size is discarded
+    and fetched again. Returns the total size reported by the server (None if unknown).
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {'User-Agent': 'DreamCrafter-downloader'}
+    if offset:
+        headers['Range'] = f'bytes={offset}-'
+    
+    try:
+        response = urlopen(Request(url, headers=headers), timeout=timeout)
+    except HTTPError as e:
+        if e.code == 416 and offset:
+            # Nothing left to fetch only if the part file is exactly the remote size
+            match = re.match(r'bytes \*/(\d+)$', e.headers.get('Content-Range', ''))
+            e.close()
+            if match and int(match.group(1)) == offset:
+                return offset
+            os.remove(part_path)  # Longer than the file or of unknown size: start over
+            return fetch_to_part(url, part_path, timeout, chunk_size)
+        if e.code in RETRYABLE_STATUS:
+            raise DownloadError(f"HTTP {e.code}") from e
+        raise
+    
+    with response:
+        content_range = response.headers.get('Content-Range')
+        if offset and response.status == 206 and content_range:
+            match = re.match(r'bytes (\d+)-\d+/(\d+|\*)', content_range)
+            if not match or int(match.group(1)) != offset:
+                raise DownloadError(f"Unexpected Content-Range: {content_range}")
+            total = None if match.group(2) == '*' else int(match.group(2))
+            mode = 'ab'
+        else:
+            # Fresh download, or a server that ignored the Range header
+            length = response.headers.get('Content-Length')
+            total = int(length) if length is not None else None
+            mode = 'wb'
+        
+        with open(part_path, mode) as f:
+            for chunk in iter(lambda: response.read(chunk_size), b''):
+                f.write(chunk)
+    
+    size = os.path.getsize(part_path)
+    if total is not None and size != total:
+        raise DownloadError(f"Connection closed after {size} of {total} bytes")
+    return total
+
+def download_file(sample, dest_dir, expected, retries=5, backoff=1.0, timeout=30, mirror=None):
+    """
+    Fetch one file to <name>.part (resumable), verify it, then rename it into place.
+    An existing file is kept only if it verifies; otherwise it is resumed like a partial download.
+    Returns a result dict with status 'cached', 'downloaded' or 'failed'.
+    """
+    name = sample['name']
+    final_path = os.path.join(dest_dir, name)
+    part_path = final_path + '.part'
+    url = with_mirror(sample['url'], mirror)
+    result = {'name': name, 'url': sample['url']}
+    
+    if os.path.exists(final_path):
+        stat = os.stat(final_path)
+        # Unchanged since it was verified: skip hashing it again
+        if (expected.get('sha256') and expected.get('size') == stat.st_size
+                and expected.get('mtime_ns') == stat.st_mtime_ns):
+            return dict(result, status='cached', size=stat.st_size, sha256=expected['sha256'],
+                        mtime_ns=stat.st_mtime_ns)
+        if expected.get('sha256'):
+            try:
+                size, sha256 = verify_file(final_path, dict(expected, size=None))
+                return dict(result, status='cached', size=size, sha256=sha256, mtime_ns=stat.st_mtime_ns)
+            except ChecksumMismatch:
+                pass
+        if expected.get('size') is not None and stat.st_size >= expected['size']:
+            os.remove(final_path)  # Full length but wrong bytes: nothing to resume
+        else:
+            # Unverified or short (e.g. truncated by a killed run): continue it from where it stopped
+            os.replace(final_path, part_path)
+    
+    resumed_from = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    for attempt in range(retries + 1):
+        try:
+            total = fetch_to_part(url, part_path, timeout)
+            size, sha256 = verify_file(part_path, dict(expected, size=total if total is not None
+                                                       else expected.get('size')))
+            os.replace(part_path, final_path)
+            return dict(result, status='downloaded', size=size, sha256=sha256, resumed_from=resumed_from,
+                        attempts=attempt + 1, mtime_ns=os.stat(final_path).st_mtime_ns)
+        except ChecksumMismatch as e:
+            # Corrupt bytes cannot be resumed: start over
+            os.remove(part_path)
+            error = str(e)
+        except (DownloadError, URLError, OSError, http.client.HTTPException) as e:
+            if isinstance(e, HTTPError):  # Not retryable (404, 403, ...)
+                return dict(result, status='failed', error=f"HTTP {e.code}")
+            error = str(e) or type(e).__name__
+        if attempt < retries:
+            time.sleep(min(60.0, backoff * 2 ** attempt) * random.uniform(0.5, 1.5))
+    return dict(result, status='failed', error=error)
+
+def download_comprehensive_1gb_dataset(dest_dir='data/raw/comprehensive_1gb', workers=4, retries=5,
+                                       backoff=1.0, timeout=30, mirror=None, remote_checksums=True,
+                                       samples=None):
+    """
+    Download the comprehensive EEG dataset (~1GB) with all categories, `workers` files at a time.
+    Files are resumable, verified against the download manifest and PhysioNet's SHA256SUMS,
+    and only renamed into place once complete.
+    """
+    samples = SAMPLES if samples is None else samples
+    os.makedirs(dest_dir, exist_ok=True)
     
     print("📥 Downloading comprehensive 1GB EEG dataset...")
     print("🧠 Categories: Sleep EEG + Motor Imagery + Motor Movement + Sleep Telemetry")
-    print("📊 Total files: 50 | Estimated size: ~1GB")
+    print(f"📊 Total files: {len(samples)} | Estimated size: ~1GB | {workers} parallel downloads")
     print("🎯 Optimized for RTX 4050 dream decoding research\n")
     
+    # The old wget-based downloader left <name><random>.tmp files behind when interrupted
+    names = [sample['name'] for sample in samples]
+    for filename in os.listdir(dest_dir):
+        if filename.endswith('.tmp') and any(filename.startswith(name) for name in names):
+            os.remove(os.path.join(dest_dir, filename))
+            print(f"🧹 Removed stale temp file: {filename}")
+    
+    manifest_path = os.path.join(dest_dir, MANIFEST_FILE)
+    manifest = load_manifest(manifest_path)
+    checksums = fetch_remote_checksums(samples, mirror, timeout, retries, backoff) if remote_checksums else {}
+    print(f"🔐 Checksums: {len(checksums)} from {CHECKSUMS_FILE}, "
+          f"{sum(1 for s in samples if s['name'] in manifest)} in {MANIFEST_FILE}")
+    
+    def expected_for(sample):
+        entry = manifest.get(sample['name'], {})
+        expected = {key: entry.get(key) for key in ('size', 'sha256', 'mtime_ns')}
+        if sample['name'] in checksums:
+            if checksums[sample['name']] != expected['sha256']:
+                expected = {'sha256': checksums[sample['name']]}  # Published checksum wins
+        return expected
+    
     downloaded_count = 0
     total_size_mb = 0
     failed_downloads = []
     
-    # Group by category for organized downloading
-    categories = {}
-    for sample in samples:
-        cat = sample['category']
-        if cat not in categories:
-            categories[cat] = []
-        categories[cat].append(sample)
-    
-    for category, cat_samples in categories.items():
-        print(f"\n🔄 Downloading {category} samples ({len(cat_samples)} files)...")
-        
-        for i, sample in enumerate(cat_samples, 1):
-            filepath = os.path.join('data/raw/comprehensive_1gb', sample['name'])
-            
-            print(f"   ⬇️ [{i}/{len(cat_samples)}] {sample['name']} ({sample['size']})")
-            
-            if os.path.exists(filepath):
-                file_size = os.path.getsize(filepath) / (1024*1024)
-                print(f"      ✅ Already exists: {file_size:.1f}MB")
-                downloaded_count += 1
-                total_size_mb += file_size
-                continue
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(download_file, sample, dest_dir, expected_for(sample),
+                            retries, backoff, timeout, mirror): sample
+            for sample in samples
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            sample = futures[future]
+            result = future.result()
+            prefix = f"   [{i}/{len(samples)}] {sample['name']}"
             
-            try:
-                wget.download(sample['url'], filepath)
-                file_size = os.path.getsize(filepath) / (1024*1024)
-                print(f"\n      ✅ Downloaded: {file_size:.1f}MB")
-                downloaded_count += 1
-                total_size_mb += file_size
-                
-            except Exception as e:
-                print(f"\n      ❌ Failed: {str(e)}")
+            if result['status'] == 'failed':
+                print(f"{prefix} ❌ Failed: {result['error']}")
                 failed_downloads.append(sample['name'])
                 continue
+            
+            size_mb = result['size'] / (1024*1024)
+            if result['status'] == 'cached':
+                print(f"{prefix} ✅ Already verified: {size_mb:.1f}MB")
+            else:
+                resumed = f", resumed at {result['resumed_from'] / (1024*1024):.1f}MB" if result['resumed_from'] else ""
+                print(f"{prefix} ✅ Downloaded: {size_mb:.1f}MB ({result['attempts']} attempt(s){resumed})")
+            downloaded_count += 1
+            total_size_mb += size_mb
+            manifest[sample['name']] = {key: result[key] for key in ('url', 'size', 'sha256', 'mtime_ns')}
+            # Saved after every file so a killed run keeps what it verified
+            save_manifest(manifest, manifest_path)
     
     print(f"\n🎉 Comprehensive Dataset Download Summary:")
     print(f"   📊 Files downloaded: {downloaded_count}/{len(samples)}")
     print(f"   💾 Total size: {total_size_mb:.1f}MB")
-    print(f"   📁 Location: data/raw/comprehensive_1gb/")
+    print(f"   📁 Location: {dest_dir}/")
     
     if failed_downloads:
         print(f"   ⚠️ Failed downloads: {len(failed_downloads)}")
@@ -122,6 +318,9 @@ def download_comprehensive_1gb_dataset():
             print(f"      ... and {len(failed_downloads)-5} more")
     
     # Summary by category
+    categories = {}
+    for sample in samples:
+        categories.setdefault(sample['category'], []).append(sample)
     print(f"\n📊 Dataset Composition:")
     for category, cat_samples in categories.items():
         cat_count = sum(1 for s in cat_samples if s['name'] not in failed_downloads)
@@ -132,9 +331,8 @@ def download_comprehensive_1gb_dataset():
     
     return downloaded_count, total_size_mb
 
-def verify_comprehensive_dataset():
+def verify_comprehensive_dataset(dataset_dir='data/raw/comprehensive_1gb'):
     """Verify the comprehensive dataset"""
-    dataset_dir = 'data/raw/comprehensive_1gb'
     
     if not os.path.exists(dataset_dir):
         print("❌ Comprehensive dataset directory not found!")
@@ -161,8 +359,23 @@ def verify_comprehensive_dataset():
     return len(edf_files) >= 40
 
 if __name__ == '__main__':
-    downloaded, size_mb = download_comprehensive_1gb_dataset()
-    verify_comprehensive_dataset()
+    parser = argparse.ArgumentParser(description="Download the comprehensive EEG dataset from PhysioNet")
+    parser.add_argument('--dest', default='data/raw/comprehensive_1gb')
+    parser.add_argument('--workers', type=int, default=4, help="Parallel downloads")
+    parser.add_argument('--retries', type=int, default=5, help="Retries per file (exponential backoff)")
+    parser.add_argument('--backoff', type=float, default=1.0, help="Initial retry delay in seconds")
+    parser.add_argument('--timeout', type=float, default=30, help="Socket timeout in seconds")
+    parser.add_argument('--mirror', default=None,
+                        help=f"Base URL replacing {PHYSIONET_FILES} (e.g. a local test server)")
+    parser.add_argument('--no-remote-checksums', action='store_true',
+                        help=f"Do not fetch {CHECKSUMS_FILE}; verify against the manifest and sizes only")
+    args = parser.parse_args()
+    
+    downloaded, size_mb = download_comprehensive_1gb_dataset(
+        args.dest, args.workers, args.retries, args.backoff, args.timeout,
+        args.mirror, not args.no_remote_checksums
+    )
+    verify_comprehensive_dataset(args.dest)
     
     print(f"\n✅ Comprehensive 1GB dataset ready!")
     print(f"📊 {downloaded} files, {size_mb:.1f}MB total")
@@ -0,0 +1,168 @@
+import os
+import re
+import shutil
+import hashlib
+import http.client
+import argparse
+import tempfile
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Static file handler with single-range 'Range: bytes=N-' support (206 / 416), standing in
+    for physionet.org in downloader tests. The first `flaky` responses for each path send
+    half the body and drop the connection, to exercise resume and retry.
+    """
+
+    def __init__(self, *args, flaky=0, failures=None, **kwargs):
+        self.flaky = flaky
+        self.failures = failures if failures is not None else {}
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return None
+        size = os.path.getsize(path)
+        start = 0
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.end_headers()
+                return None
+
+        f = open(path, 'rb')
+        f.seek(start)
+        self.send_response(206 if match else 200)
+        if match:
+            self.send_header('Content-Range', f'bytes {start}-{size - 1}/{size}')
+        self.send_header('Content-Length', str(size - start))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        self._remaining = size - start
+        return f
+
+    def copyfile(self, source, outputfile):
+        failed = self.failures.get(self.path, 0)
+        if failed < self.flaky:
+            self.failures[self.path] = failed + 1
+            outputfile.write(source.read(max(1, self._remaining // 2)))
+            self.close_connection = True
+            return
+        shutil.copyfileobj(source, outputfile)
+
+def serve_mirror(directory, port=0, flaky=0):
+    """Serve `directory` on localhost in a background thread; returns (server, base_url)"""
+    handler = partial(RangeRequestHandler, directory=directory, flaky=flaky, failures={})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+def build_mirror(mirror_dir, sources, database='eegmmidb/1.0.0'):
+    """Lay out local EDFs like a PhysioNet database (with SHA256SUMS.txt); returns download samples"""
+    samples = []
+    sums = []
+    for source in sources:
+        name = os.path.basename(source)
+        relative = f'{name[:4]}/{name}'
+        target = os.path.join(mirror_dir, database, relative)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(source, target)
+        with open(target, 'rb') as f:
+            sums.append(f'{hashlib.sha256(f.read()).hexdigest()}  {relative}')
+        samples.append({'name': name, 'url': f'https://physionet.org/files/{database}/{relative}',
+                        'size': f'{os.path.getsize(target) / (1024*1024):.0f}MB', 'category': 'Mirror test'})
+    with open(os.path.join(mirror_dir, database, 'SHA256SUMS.txt'), 'w') as f:
+        f.write('\n'.join(sums) + '\n')
+    return samples
+
+def check_downloader(sources, flaky=1):
+    """
+    End-to-end downloader check against a flaky local mirror: a truncated file left by a
+    killed run, a stale .part and a clean download must all end up byte-identical; then a
+    corrupted file must be detected and fetched again, and a .part longer than the remote
+    file (rejected with 416) must be restarted rather than promoted.
+    """
+    from download_datasets import download_comprehensive_1gb_dataset, fetch_to_part, with_mirror, DownloadError
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        mirror_dir = os.path.join(tmp_dir, 'mirror')
+        dest_dir = os.path.join(tmp_dir, 'dest')
+        samples = build_mirror(mirror_dir, sources)
+        server, base_url = serve_mirror(mirror_dir, flaky=flaky)
+        try:
+            os.makedirs(dest_dir)
+            # Killed-run leftovers: a truncated final file and a partial .part file
+            for sample, suffix in zip(samples, ['', '.part']):
+                with open(sources[samples.index(sample)], 'rb') as f:
+                    data = f.read()
+                with open(os.path.join(dest_dir, sample['name'] + suffix), 'wb') as f:
+                    f.write(data[:len(data) // 3])
+
+            def run():
+                downloaded, _ = download_comprehensive_1gb_dataset(
+                    dest_dir, workers=2, retries=3, backoff=0.01, mirror=base_url + '/', samples=samples)
+                return downloaded
+
+            ok = run() == len(samples)
+            # Corrupt one verified file in place (same size): it must be re-downloaded
+            victim = os.path.join(dest_dir, samples[0]['name'])
+            with open(victim, 'r+b') as f:
+                f.seek(100)
+                f.write(b'\x00' * 16)
+            ok = run() == len(samples) and ok
+
+            for source, sample in zip(sources, samples):
+                with open(source, 'rb') as a, open(os.path.join(dest_dir, sample['name']), 'rb') as b:
+                    ok = ok and a.read() == b.read()
+            leftovers = [f for f in os.listdir(dest_dir) if f.endswith('.part')]
+            ok = ok and not leftovers
+
+            # Oversized .part: the 416 reply's total size must not match, forcing a fresh fetch
+            part_path = os.path.join(tmp_dir, 'oversized.part')
+            with open(sources[0], 'rb') as f:
+                data = f.read()
+            with open(part_path, 'wb') as f:
+                f.write(data + b'\x00' * 1024)
+            url = with_mirror(samples[0]['url'], base_url + '/')
+            for _ in range(flaky + 1):  # The flaky server drops the first attempts half-way
+                try:
+                    total = fetch_to_part(url, part_path)
+                    break
+                except (DownloadError, OSError, http.client.HTTPException):
+                    total = None
+            with open(part_path, 'rb') as f:
+                ok = ok and total == len(data) and f.read() == data
+        finally:
+            server.shutdown()
+
+    print(f"\n{'✅ Downloader check passed' if ok else '❌ Downloader check failed'}")
+    return ok
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local PhysioNet stand-in (HTTP Range, optional faults)")
+    parser.add_argument('directory', nargs='?', default='.', help="Directory to serve")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--flaky', type=int, default=0,
+                        help="Drop the connection half-way for the first N requests per file")
+    parser.add_argument('--check', nargs='+', metavar='EDF', default=None,
+                        help="Instead of serving, run the downloader check with these EDF files")
+    args = parser.parse_args()
+
+    if args.check:
+        raise SystemExit(0 if check_downloader(args.check, max(1, args.flaky)) else 1)
+    server, base_url = serve_mirror(args.directory, args.port, args.flaky)
+    print(f"🌐 Serving {args.directory} at {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()